@@ -53,8 +53,7 @@ for version in "${PYTHON_VERSIONS[@]}"; do
   checksum_before_mix=$(md5sum "pytests/requirements/3_${minor_version}/requirements_mix_updated.txt" | cut -d ' ' -f 1)
 
   # Run pru to update requirements within the virtual environment
-  pru -r "pytests/requirements/3_${minor_version}/requirements_single_updated.txt"
-  pru -r "pytests/requirements/3_${minor_version}/requirements_mix_updated.txt"
+  pru -r "pytests/requirements/3_${minor_version}/requirements_*_updated.txt"
 
   # Calculate checksums after running pru
   checksum_after_single=$(md5sum "pytests/requirements/3_${minor_version}/requirements_single_updated.txt" | cut -d ' ' -f 1)
@@ -0,0 +1,495 @@
+"""Benchmarks of pru on synthetic environments and requirements files.
+
+Synthetic site-packages trees of fake `*.dist-info` directories, and
+requirements files mixing extras, markers, comments, options and hashes as
+in `pytests/requirements/*/requirements_mix.txt`, are generated in a
+temporary directory. Each benchmark reports the best of a few runs, in
+seconds.
+
+Results are compared with a JSON baseline. A benchmark regresses when it is
+slower than its baseline by more than the threshold ratio. Scaling factors,
+the time of the largest size over the time of the smallest one, are
+compared the same way, which catches complexity regressions independently
+of the speed of the machine.
+
+Usage:
+    # compare with benchmarks/baseline.json, exit with 1 on regressions
+    $ python benchmarks/run.py
+
+    # record a new baseline
+    $ python benchmarks/run.py --update-baseline
+
+    # small sizes only, e.g. on CI
+    $ python benchmarks/run.py --quick --output results.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC = os.path.join(ROOT, "src")
+# benchmark the working tree, not an installed release
+sys.path.insert(0, SRC)
+
+from pru.core import (  # noqa: E402
+    get_installed_packages_name_and_version,
+    get_requirements_packages_name,
+    replace_requirements_packages_versions,
+)
+from pru.snapshot import scan_installed_packages  # noqa: E402
+
+BASELINE_VERSION = 1
+
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmarks", "baseline.json")
+
+DEFAULT_THRESHOLD = 2.0
+
+# slowdowns below this many seconds are noise, whatever the ratio
+MIN_DELTA = 0.005
+
+ENVIRONMENT_SIZES = (1000, 5000, 20000)
+REQUIREMENTS_SIZES = (100, 1000, 10000, 50000)
+QUICK_ENVIRONMENT_SIZES = (1000,)
+QUICK_REQUIREMENTS_SIZES = (100, 1000)
+
+# size of the environment requirements files are pinned against
+PINNING_ENVIRONMENT_SIZE = 1000
+
+_MARKERS = (
+    'python_version >= "3.8"',
+    'sys_platform == "win32"',
+    'platform_machine == "x86_64" and python_version < "3.14"',
+)
+
+
+# mixed separators and case, as found in real names
+_NAME_FORMATS = ("pkg-{:05d}", "Pkg_{:05d}", "pkg.name.{:05d}", "PKG-Name-{:05d}")
+
+
+def get_package_name(i):
+    return _NAME_FORMATS[i % len(_NAME_FORMATS)].format(i)
+
+
+def make_site_packages(directory, count, seed=0):
+    """
+    Create a synthetic site-packages directory.
+
+    Parameters
+    ----------
+    directory : str
+        Directory to create.
+    count : int
+        Number of distributions, one in 20 being a legacy `.egg-info` file.
+    seed : int, optional
+        Seed of the dependencies and markers.
+
+    Returns
+    -------
+    list of tuple
+        `(name, version)` of the distributions.
+    """
+
+    rng = random.Random(seed)
+    os.makedirs(directory)
+    packages = []
+    for i in range(count):
+        name = get_package_name(i)
+        version = f"{i % 7}.{i % 13}.{i % 5}"
+        packages.append((name, version))
+        filename = f"{name.replace('-', '_')}-{version}"
+        if i % 20 == 19:
+            with open(os.path.join(directory, f"{filename}.egg-info"), "w") as f:
+                f.write(f"Metadata-Version: 1.0\nName: {name}\nVersion: {version}\n")
+            continue
+        dist_info = os.path.join(directory, f"{filename}.dist-info")
+        os.mkdir(dist_info)
+        requires = []
+        for _ in range(rng.randrange(4)):
+            requirement = get_package_name(rng.randrange(count))
+            if rng.random() < 0.3:
+                requirement += f" ; {rng.choice(_MARKERS)}"
+            requires.append(f"Requires-Dist: {requirement}\n")
+        with open(os.path.join(dist_info, "METADATA"), "w") as f:
+            f.write(f"Metadata-Version: 2.1\nName: {name}\nVersion: {version}\n")
+            f.writelines(requires)
+            f.write("\nLong description.\n")
+        with open(os.path.join(dist_info, "top_level.txt"), "w") as f:
+            f.write(f"{name.lower().replace('-', '_').replace('.', '_')}\n")
+
+    # installed a while ago, so the snapshot trusts the timestamps
+    past = time.time() - 3600
+    for root, _, files in os.walk(directory, topdown=False):
+        for filename in files:
+            os.utime(os.path.join(root, filename), (past, past))
+        os.utime(root, (past, past))
+    return packages
+
+
+def _format_requirement(rng, name, i):
+    kind = i % 10
+    if kind == 0:
+        return f"{name}>=1.0\n"
+    if kind == 1:
+        return f"{name}[socks,security]=={i % 7}.0\n"
+    if kind == 2:
+        return f"{name} ; {rng.choice(_MARKERS)}\n"
+    if kind == 3:
+        return f"{name}<=99  # keep below 100\n"
+    if kind == 4:
+        digest = f"{i:064x}"
+        return f"{name}==0.1 \\\n    --hash=sha256:{digest}\n"
+    if kind == 5:
+        return f"# {name} is optional\n{name}\n"
+    if kind == 6:
+        return f"not-installed-{i}==99.99.99\n"
+    return f"{name}\n"
+
+
+def make_requirements(path, packages, count, seed=0):
+    """
+    Create a synthetic requirements file.
+
+    Parameters
+    ----------
+    path : str
+        Path of the file to write.
+    packages : list of tuple
+        `(name, version)` of the installed distributions to require.
+    count : int
+        Number of requirements.
+    seed : int, optional
+        Seed of the markers.
+    """
+
+    rng = random.Random(seed)
+    with open(path, "w") as f:
+        f.write("--index-url https://pypi.org/simple\n\n")
+        for i in range(count):
+            name = packages[i % len(packages)][0]
+            f.write(_format_requirement(rng, name, i))
+
+
+def measure(function, setup=None, repeat=5):
+    """
+    Time a function.
+
+    Parameters
+    ----------
+    function : callable
+        Function to time, called without arguments.
+    setup : callable or None, optional
+        Called before each run, outside of the timing.
+    repeat : int, optional
+        Number of runs.
+
+    Returns
+    -------
+    float
+        Best time, in seconds.
+    """
+
+    best = float("inf")
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_environment(directory, sizes, repeat):
+    results = {}
+    for size in sizes:
+        site_packages = os.path.join(directory, f"site-packages-{size}")
+        make_site_packages(site_packages, size)
+        snapshot_path = os.path.join(directory, f"snapshot-{size}.json")
+
+        def cold(site_packages=site_packages):
+            index = scan_installed_packages([site_packages], use_cache=False)
+            get_installed_packages_name_and_version(index=index)
+
+        def warm(site_packages=site_packages, snapshot_path=snapshot_path):
+            index = scan_installed_packages([site_packages], snapshot_path)
+            get_installed_packages_name_and_version(index=index)
+
+        results[f"installed_cold/{size}"] = measure(cold, repeat=repeat)
+        warm()
+        results[f"installed_warm/{size}"] = measure(warm, repeat=repeat)
+    return results
+
+
+def bench_requirements(directory, sizes, repeat):
+    site_packages = os.path.join(directory, "site-packages-pinning")
+    packages = make_site_packages(site_packages, PINNING_ENVIRONMENT_SIZE)
+    index = scan_installed_packages([site_packages], use_cache=False)
+
+    results = {}
+    for size in sizes:
+        path = os.path.join(directory, f"requirements-{size}.txt")
+        output_path = os.path.join(directory, f"pinned-{size}.txt")
+        make_requirements(path, packages, size)
+
+        def remove_output(output_path=output_path):
+            if os.path.exists(output_path):
+                os.remove(output_path)
+
+        results[f"requirements_names/{size}"] = measure(
+            lambda path=path: get_requirements_packages_name(path), repeat=repeat
+        )
+        results[f"replace_versions/{size}"] = measure(
+            lambda path=path, output_path=output_path: (
+                replace_requirements_packages_versions(path, output_path, index=index)
+            ),
+            setup=remove_output,
+            repeat=repeat,
+        )
+    return results
+
+
+def bench_cli(directory, repeat):
+    site_packages = os.path.join(directory, "site-packages-cli")
+    packages = make_site_packages(site_packages, PINNING_ENVIRONMENT_SIZE)
+    path = os.path.join(directory, "requirements-cli.txt")
+    output_path = os.path.join(directory, "pinned-cli.txt")
+    make_requirements(path, packages, 100)
+
+    environment = dict(os.environ)
+    environment["PYTHONPATH"] = os.pathsep.join([SRC, site_packages])
+    environment["PRU_CACHE_DIR"] = os.path.join(directory, "cache")
+    # a stub installer, receiving the package names as ignored arguments
+    stub = f'"{sys.executable}" -c pass'
+
+    def run(*args):
+        subprocess.run(
+            [sys.executable, "-m", "pru", *args],
+            env=environment,
+            stdout=subprocess.DEVNULL,
+            check=True,
+        )
+
+    return {
+        "cli_version": measure(lambda: run("--version"), repeat=repeat),
+        "cli_upgrade_requirements": measure(
+            lambda: run("-r", path, "-o", output_path, "--cmd", stub), repeat=repeat
+        ),
+    }
+
+
+def get_scaling(results):
+    """
+    Get the scaling factor of each benchmark measured at many sizes.
+
+    Parameters
+    ----------
+    results : dict
+        Dictionary of {name: seconds}, where names of sized benchmarks are
+        `<family>/<size>`.
+
+    Returns
+    -------
+    dict
+        Dictionary of {family/smallest-largest: ratio} of the time of the
+        largest size over the time of the smallest one.
+    """
+
+    sizes = {}
+    for name in results:
+        family, _, size = name.rpartition("/")
+        if family:
+            sizes.setdefault(family, []).append(int(size))
+    scaling = {}
+    for family, family_sizes in sizes.items():
+        if len(family_sizes) < 2:
+            continue
+        smallest, largest = min(family_sizes), max(family_sizes)
+        ratio = results[f"{family}/{largest}"] / results[f"{family}/{smallest}"]
+        scaling[f"{family}/{smallest}-{largest}"] = ratio
+    return scaling
+
+
+def run_benchmarks(quick=False, repeat=5, cli=True):
+    """
+    Run every benchmark.
+
+    Parameters
+    ----------
+    quick : bool, optional
+        If True, only use the smallest sizes.
+    repeat : int, optional
+        Number of runs of each benchmark.
+    cli : bool, optional
+        If False, skip the command line benchmarks.
+
+    Returns
+    -------
+    dict
+        Results, with `benchmarks` of {name: seconds} and `scaling` of
+        {name: ratio}, see `get_scaling`.
+    """
+
+    directory = tempfile.mkdtemp(prefix="pru-benchmarks-")
+    try:
+        results = bench_environment(
+            directory,
+            QUICK_ENVIRONMENT_SIZES if quick else ENVIRONMENT_SIZES,
+            repeat,
+        )
+        results.update(
+            bench_requirements(
+                directory,
+                QUICK_REQUIREMENTS_SIZES if quick else REQUIREMENTS_SIZES,
+                repeat,
+            )
+        )
+        if cli:
+            results.update(bench_cli(directory, repeat))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return {
+        "version": BASELINE_VERSION,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "benchmarks": results,
+        "scaling": get_scaling(results),
+    }
+
+
+def compare(results, baseline, threshold=None):
+    """
+    Compare results with a baseline.
+
+    Parameters
+    ----------
+    results : dict
+        Results of `run_benchmarks`.
+    baseline : dict
+        Baseline results. Its `threshold` is the default maximum ratio of a
+        result over its baseline, and its `thresholds` dictionary of
+        {name: ratio} overrides it per benchmark or scaling factor.
+    threshold : float or None, optional
+        Maximum ratio overriding every threshold of the baseline.
+
+    Returns
+    -------
+    list of tuple
+        `(name, baseline, result, ratio, regressed)` rows, for every result
+        found in the baseline.
+    """
+
+    default = baseline.get("threshold", DEFAULT_THRESHOLD)
+    thresholds = {} if threshold is not None else baseline.get("thresholds", {})
+    rows = []
+    for section in ("benchmarks", "scaling"):
+        for name, value in sorted(results.get(section, {}).items()):
+            reference = baseline.get(section, {}).get(name)
+            if reference is None:
+                continue
+            ratio = value / reference if reference else float("inf")
+            regressed = ratio > thresholds.get(name, threshold or default)
+            if section == "benchmarks":
+                regressed = regressed and value - reference > MIN_DELTA
+            rows.append((name, reference, value, ratio, regressed))
+    return rows
+
+
+def print_comparison(rows, file=None):
+    """
+    Print the rows of `compare` as a table.
+
+    Parameters
+    ----------
+    rows : list of tuple
+        Rows of `compare`.
+    file : file-like or None, optional
+        Output stream. If None, uses stdout.
+    """
+
+    width = max([len(row[0]) for row in rows] + [9])
+    print(
+        f"{'Benchmark':<{width}}  {'Baseline':>10}  {'Current':>10}  {'Ratio':>6}",
+        file=file,
+    )
+    for name, reference, value, ratio, regressed in rows:
+        status = "  REGRESSION" if regressed else ""
+        print(
+            f"{name:<{width}}  {reference:>10.4f}  {value:>10.4f}  {ratio:>6.2f}"
+            f"{status}",
+            file=file,
+        )
+
+
+def main():
+    """
+    Run the benchmarks and compare them with the baseline.
+
+    Returns
+    -------
+    int
+        1 if a benchmark regressed, 0 otherwise.
+    """
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--quick", action="store_true", help="Smallest sizes only.")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per benchmark.")
+    parser.add_argument("--no-cli", action="store_true", help="Skip CLI benchmarks.")
+    parser.add_argument("--output", help="Write the results to this JSON file.")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline file.")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=None,
+        help=(
+            "Maximum ratio over the baseline before a regression is reported, "
+            "overriding the thresholds of the baseline."
+        ),
+    )
+    parser.add_argument(
+        "--update-baseline",
+        action="store_true",
+        help="Write the results to the baseline file instead of comparing.",
+    )
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.quick, args.repeat, not args.no_cli)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+
+    try:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        baseline = None
+
+    if args.update_baseline:
+        # thresholds are tuned by hand, and kept across updates
+        previous = baseline or {}
+        results["threshold"] = previous.get("threshold", DEFAULT_THRESHOLD)
+        results["thresholds"] = previous.get("thresholds", {})
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if baseline is None:
+        print(json.dumps(results, indent=2))
+        print(f"No baseline at {args.baseline}, use --update-baseline to create it.")
+        return 0
+    rows = compare(results, baseline, args.threshold)
+    print_comparison(rows)
+    return 1 if any(row[-1] for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,58 @@
+import os
+import stat
+
+import pytest
+
+from pru import backend
+from pru.backend import get_upgrade_command, is_uv_available, resolve_backend
+
+
+@pytest.fixture
+def fake_uv(tmp_path, monkeypatch):
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    calls = tmp_path / "calls.txt"
+    uv = bin_dir / "uv"
+    uv.write_text(f'#!/bin/sh\necho called >> "{calls}"\n')
+    uv.chmod(uv.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv("PATH", str(bin_dir))
+    monkeypatch.setenv("PRU_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(backend, "_UV_PROBES", {})
+    return calls
+
+
+def test_resolve_backend_explicit():
+    assert resolve_backend("pip") == "pip"
+    assert resolve_backend("uv") == "uv"
+    assert get_upgrade_command("pip") == "pip install --upgrade --user"
+    assert get_upgrade_command("uv") == "uv pip install --upgrade"
+
+
+def test_resolve_backend_unknown():
+    with pytest.raises(ValueError):
+        resolve_backend("conda")
+
+
+def test_resolve_backend_without_uv(tmp_path, monkeypatch):
+    monkeypatch.setenv("PATH", str(tmp_path))
+    assert not is_uv_available()
+    assert resolve_backend() == "pip"
+
+
+@pytest.mark.skipif(os.name == "nt", reason="uses a shell script as fake uv")
+def test_is_uv_available_cached(fake_uv, monkeypatch):
+    assert is_uv_available()
+    assert is_uv_available()
+    assert fake_uv.read_text().count("called") == 1
+
+    # a new process reuses the on-disk cache
+    monkeypatch.setattr(backend, "_UV_PROBES", {})
+    assert is_uv_available()
+    assert fake_uv.read_text().count("called") == 1
+
+
+def test_import_does_not_probe_uv():
+    import pru.core
+
+    assert "IS_UV" not in vars(pru.core)
+    assert pru.core.IS_UV in (True, False)
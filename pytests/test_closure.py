@@ -0,0 +1,45 @@
+from pru.closure import get_dependency_closure
+from pru.snapshot import InstalledPackage
+
+
+def make_index(*packages):
+    return {
+        name.lower(): InstalledPackage(name, "1.0", None, tuple(requires))
+        for name, requires in packages
+    }
+
+
+def test_get_dependency_closure():
+    index = make_index(
+        ("app", ["Lib_A>=1", "lib-b (<2) ; python_version < '3'", "missing"]),
+        ("lib-a", ["lib-c[fast]", "lib-d ; extra == 'never'"]),
+        ("lib-b", []),
+        ("lib-c", ["lib-e ; extra == 'fast'", "lib-a"]),
+        ("lib-d", []),
+        ("lib-e", []),
+        ("unrelated", ["lib-a"]),
+    )
+    closure = get_dependency_closure([("app", ())], index)
+    assert closure == {
+        "app": set(),
+        "lib-a": {"app", "lib-c"},
+        "lib-c": {"lib-a"},
+        "lib-e": {"lib-c"},
+    }
+
+
+def test_get_dependency_closure_extras():
+    index = make_index(
+        ("requests", ["urllib3", "pysocks ; extra == 'socks'"]),
+        ("urllib3", []),
+        ("pysocks", []),
+        ("client", ["requests[socks]"]),
+    )
+    assert list(get_dependency_closure([("requests", ())], index)) == [
+        "requests",
+        "urllib3",
+    ]
+    # extras requested later expand the package again, only for the extra
+    closure = get_dependency_closure([("requests", ()), ("client", ())], index)
+    assert closure["pysocks"] == {"requests"}
+    assert closure["requests"] == {"client"}
@@ -1,21 +1,41 @@
+import hashlib
+import json
 import os
+import shlex
+import subprocess
 import sys
 
 import pytest
 from pytest_dependency import depends
 
+from pru import core
+from pru.cache import load_json_cache
+from pru.cli import main, print_installed_packages
 from pru.core import (
+    ConstraintViolation,
+    PruSession,
+    expand_requirements_paths,
+    get_installed_packages_index,
     get_installed_packages_name,
     get_installed_packages_name_and_version,
     get_installed_requirements_packages_and_version,
     get_package_version,
     get_requirements_packages_name,
+    iter_installed_packages,
+    load_requirements_graph,
+    plan_requirements_versions,
     read_requirements,
     replace_requirements_packages_versions,
+    run_subprocesses,
     upgrade_installed,
     upgrade_requirements,
     verbose_subprocess,
+    write_requirements_plans,
 )
+from pru.parser import parse_requirements
+from pru.snapshot import InstalledPackage, get_snapshot_path
+from pru.textio import read_lines
+from pru.utils import atomic_write, canonicalize_name
 
 
 # TODO: revert file back after success test
@@ -47,6 +67,26 @@ def test_get_installed_packages_name_and_version():
     assert packages["pip"] is not None
 
 
+def test_get_installed_packages_index():
+    index = get_installed_packages_index()
+    assert "pip" in index
+    assert index["pip"].name == "pip"
+    assert index["pip"].version == get_package_version("pip")
+
+
+@pytest.mark.parametrize(
+    "name, expected",
+    [
+        ("requests", "requests"),
+        ("pre_commit", "pre-commit"),
+        ("Zope.Interface", "zope-interface"),
+        ("webio--jupyter__extension", "webio-jupyter-extension"),
+    ],
+)
+def test_canonicalize_name(name, expected):
+    assert canonicalize_name(name) == expected
+
+
 @pytest.mark.parametrize(
     "file_name, expected",
     [
@@ -101,6 +141,160 @@ def test_verbose_subprocess():
     verbose_subprocess(command)  # This should print "test" to stdout
 
 
+def test_verbose_subprocess_streams_and_log(tmp_path, capfd):
+    log_path = str(tmp_path / "log.jsonl")
+    command = [
+        sys.executable,
+        "-c",
+        "import sys; print('out'); print('err', file=sys.stderr); sys.exit(3)",
+    ]
+    assert verbose_subprocess(command, log_path=log_path) == 3
+    captured = capfd.readouterr()
+    assert captured.out == "out\n"
+    assert captured.err == "err\n"
+
+    with open(log_path) as f:
+        events = [json.loads(line) for line in f]
+    assert events[0]["event"] == "start"
+    assert sorted((e["stream"], e["line"]) for e in events[1:-1]) == [
+        ("stderr", "err"),
+        ("stdout", "out"),
+    ]
+    assert events[-1]["event"] == "exit"
+    assert events[-1]["returncode"] == 3
+
+    with pytest.raises(subprocess.CalledProcessError):
+        verbose_subprocess(command, check=True)
+
+
+def test_verbose_subprocess_timeout():
+    command = [sys.executable, "-c", "import time; time.sleep(10)"]
+    with pytest.raises(subprocess.TimeoutExpired):
+        verbose_subprocess(command, timeout=0.5)
+
+
+@pytest.mark.parametrize("module", ["pru", "pru.cli"])
+def test_import_is_lazy(module):
+    # the subprocess runner and the modules of other commands are only
+    # imported when used
+    modules = [
+        "asyncio",
+        "ctypes",
+        "concurrent.futures",
+        "difflib",
+        "http.client",
+        "multiprocessing",
+        "pru.imports",
+        "pru.index",
+        "pru.matrix",
+        "pru.watch",
+        "shlex",
+    ]
+    code = f"import sys, {module}; print([m for m in {modules!r} if m in sys.modules])"
+    output = subprocess.check_output([sys.executable, "-c", code], text=True)
+    assert output.strip() == "[]"
+
+
+def test_lazy_attributes():
+    import pru
+    from pru.imports import audit_imports
+
+    assert pru.audit_imports is audit_imports
+    with pytest.raises(ImportError):
+        from pru import missing_attribute  # noqa: F401
+
+
+def test_run_subprocesses():
+    commands = [
+        [sys.executable, "-c", f"import sys; sys.exit({code})"] for code in range(3)
+    ]
+    assert run_subprocesses(commands, max_workers=2, on_line=None) == [0, 1, 2]
+
+
+def test_upgrade_requirements_failed_installer(tmp_path):
+    requirements_path = tmp_path / "requirements.txt"
+    requirements_path.write_text("pip>=1\n")
+    with pytest.raises(subprocess.CalledProcessError):
+        upgrade_requirements(str(requirements_path), command="false")
+    assert requirements_path.read_text() == "pip>=1\n"
+
+
+@pytest.fixture
+def failing_installer(tmp_path):
+    # records its arguments, and fails when one of them starts with "bad"
+    calls = tmp_path / "calls.txt"
+    script = tmp_path / "install.py"
+    script.write_text(
+        "import sys\n"
+        "with open(sys.argv[1], 'a') as f:\n"
+        "    f.write(' '.join(sys.argv[2:]) + '\\n')\n"
+        "sys.exit(any(name.startswith('bad') for name in sys.argv[2:]))\n"
+    )
+    command = " ".join(shlex.quote(str(arg)) for arg in (sys.executable, script, calls))
+    return command, calls
+
+
+@pytest.mark.parametrize("concurrent", [False, True])
+def test_upgrade_installed_bisect_failures(
+    tmp_path, monkeypatch, failing_installer, concurrent
+):
+    command, calls = failing_installer
+    names = [f"pkg{i}" for i in range(16)]
+    names[3] = "bad-a"
+    names[12] = "bad-b"
+    path = tmp_path / "requirements.txt"
+    path.write_text("".join(f"{name}\n" for name in names))
+    monkeypatch.setattr(core, "_is_uv_command", lambda command: concurrent)
+
+    with pytest.raises(subprocess.CalledProcessError):
+        upgrade_installed(str(path), command=command)
+    calls.unlink()
+    held_back = upgrade_installed(str(path), command=command, bisect_failures=True)
+    assert held_back == ["bad-a", "bad-b"]
+    runs = calls.read_text().splitlines()
+    assert runs[0] == " ".join(names)
+    # halves of 16 packages with 2 failures: 1 + 2 + 4 + 4 + 4 runs
+    assert len(runs) == 15
+    assert "bad-a" in runs and "bad-b" in runs
+    assert upgrade_installed(str(path), command="true", bisect_failures=True) == []
+
+
+def test_upgrade_requirements_bisect_failures(tmp_path, failing_installer):
+    command, calls = failing_installer
+    path = tmp_path / "requirements.txt"
+    path.write_text("pip\nbad-a\n")
+    result = upgrade_requirements(str(path), command=command, bisect_failures=True)
+    assert result.held_back == ["bad-a"]
+    assert result.report == {str(path): 1}
+    assert path.read_text() == f"pip=={get_package_version('pip')}\nbad-a\n"
+
+
+def test_is_uv_command():
+    assert core._is_uv_command("uv pip install --upgrade")
+    assert core._is_uv_command("/usr/local/bin/uv pip install")
+    assert not core._is_uv_command("pip install --upgrade --user")
+    assert not core._is_uv_command("python -m pip install")
+
+
+def test_cli_bisect_failures(tmp_path, monkeypatch, capsys, failing_installer):
+    command, _ = failing_installer
+    path = tmp_path / "requirements.txt"
+    path.write_text("pip>=1\nbad-package\n")
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        ["pru", "-r", str(path), "--cmd", command, "--bisect-failures"],
+    )
+    assert main() == 1
+    captured = capsys.readouterr()
+    assert captured.out.splitlines()[-1] == f"Upgraded packages in {path}"
+    assert captured.err.splitlines()[-1] == (
+        "Held back 1 package(s) whose upgrade failed: bad-package"
+    )
+    version = get_package_version("pip")
+    assert path.read_text() == f"pip=={version}\nbad-package\n"
+
+
 def test_upgrade_installed(requirements_dir):
     requirements_path = os.path.join(requirements_dir, "requirements_single.txt")
     upgrade_installed(requirements_path, command="pip install --upgrade")
@@ -165,3 +359,521 @@ def test_replace_requirements_packages_versions(
         f.truncate()
 
     assert result == expected
+
+
+@pytest.fixture
+def requirements_tree(tmp_path):
+    (tmp_path / "requirements").mkdir()
+    (tmp_path / "requirements.txt").write_text(
+        "-r requirements/base.txt\n-c constraints.txt\nrequests>=2\n"
+    )
+    (tmp_path / "requirements" / "base.txt").write_text(
+        "-r common.txt\nnumpy<=1.26.3\n"
+    )
+    (tmp_path / "requirements" / "common.txt").write_text("scipy\n")
+    (tmp_path / "constraints.txt").write_text("-r requirements/common.txt\nnumpy<2\n")
+    return tmp_path
+
+
+def test_load_requirements_graph(requirements_tree):
+    files = load_requirements_graph(str(requirements_tree / "requirements.txt"))
+    paths = [os.path.relpath(path, requirements_tree) for path in files]
+    assert paths == [
+        "requirements.txt",
+        os.path.join("requirements", "base.txt"),
+        os.path.join("requirements", "common.txt"),
+        "constraints.txt",
+    ]
+    assert [f.constraint for f in files.values()] == [False, False, False, True]
+
+
+def test_load_requirements_graph_cycle(requirements_tree):
+    with open(requirements_tree / "requirements" / "common.txt", "a") as f:
+        f.write("-r base.txt\n")
+    with pytest.raises(ValueError, match="Circular"):
+        load_requirements_graph(str(requirements_tree / "requirements.txt"))
+
+
+def test_replace_requirements_packages_versions_recursive(requirements_tree):
+    index = {
+        "numpy": InstalledPackage("numpy", "2.4.1", None),
+        "scipy": InstalledPackage("scipy", "1.17.0", None),
+    }
+    report = replace_requirements_packages_versions(
+        str(requirements_tree / "requirements.txt"), index=index, recursive=True
+    )
+    assert sorted(report.values()) == [0, 1, 1, 1]
+    assert (requirements_tree / "requirements" / "base.txt").read_text() == (
+        "-r common.txt\nnumpy==2.4.1\n"
+    )
+    assert (requirements_tree / "constraints.txt").read_text() == (
+        "-r requirements/common.txt\nnumpy==2.4.1\n"
+    )
+    assert (requirements_tree / "requirements.txt").read_text() == (
+        "-r requirements/base.txt\n-c constraints.txt\nrequests>=2\n"
+    )
+
+
+@pytest.fixture
+def services_tree(tmp_path):
+    for service, content in [("a", "pip>=1\nsetuptools\n"), ("b", "pip\n")]:
+        (tmp_path / "services" / service).mkdir(parents=True)
+        (tmp_path / "services" / service / "requirements.txt").write_text(content)
+    return tmp_path
+
+
+def test_expand_requirements_paths(services_tree):
+    pattern = str(services_tree / "services" / "*" / "requirements.txt")
+    paths = expand_requirements_paths([pattern, pattern])
+    assert paths == [
+        str(services_tree / "services" / "a" / "requirements.txt"),
+        str(services_tree / "services" / "b" / "requirements.txt"),
+    ]
+    with pytest.raises(FileNotFoundError):
+        expand_requirements_paths(str(services_tree / "missing" / "*.txt"))
+
+
+def test_upgrade_requirements_many_files(services_tree, capfd):
+    pattern = str(services_tree / "services" / "*" / "requirements.txt")
+    report, held_back = upgrade_requirements(pattern, command="echo upgrading")
+    assert held_back == []
+    assert capfd.readouterr().out.splitlines() == ["upgrading pip setuptools"]
+    assert list(report.values()) == [2, 1]
+    pip_version = get_package_version("pip")
+    assert (services_tree / "services" / "b" / "requirements.txt").read_text() == (
+        f"pip=={pip_version}\n"
+    )
+
+
+def test_plan_requirements_versions(requirements_tree):
+    index = {"numpy": InstalledPackage("numpy", "2.4.1", None)}
+    plans = plan_requirements_versions(
+        str(requirements_tree / "requirements.txt"), index=index, recursive=True
+    )
+    assert [plan.pending for plan in plans] == [False, True, False, True]
+    assert plans[1].diff()[2:] == [
+        "@@ -1,2 +1,2 @@\n",
+        " -r common.txt\n",
+        "-numpy<=1.26.3\n",
+        "+numpy==2.4.1\n",
+    ]
+    assert (requirements_tree / "requirements" / "base.txt").read_text() == (
+        "-r common.txt\nnumpy<=1.26.3\n"
+    )
+
+
+def test_write_requirements_plans(requirements_tree):
+    index = {"numpy": InstalledPackage("numpy", "2.4.1", None)}
+    unchanged = requirements_tree / "requirements.txt"
+    changed = requirements_tree / "constraints.txt"
+    os.utime(unchanged, ns=(0, 0))
+    os.chmod(changed, 0o640)
+    plans = plan_requirements_versions(str(unchanged), index=index, recursive=True)
+    report = write_requirements_plans(plans)
+    assert list(report.values()) == [0, 1, 0, 1]
+    assert os.stat(unchanged).st_mtime_ns == 0
+    assert changed.read_text() == "-r requirements/common.txt\nnumpy==2.4.1\n"
+    assert os.stat(changed).st_mode & 0o777 == 0o640
+    assert not plan_requirements_versions(str(changed), index=index)[0].pending
+
+
+def test_atomic_write_new_file_umask(tmp_path):
+    path = tmp_path / "requirements.txt"
+    umask = os.umask(0o027)
+    try:
+        atomic_write(str(path), "numpy\n")
+    finally:
+        os.umask(umask)
+    assert path.read_text() == "numpy\n"
+    assert os.stat(path).st_mode & 0o777 == 0o640
+    assert os.listdir(tmp_path) == ["requirements.txt"]
+
+
+@pytest.mark.parametrize(
+    "args, expected_code, expected_out",
+    [
+        (["--dry-run"], 1, ["Would update {path} (1 pin(s) changed)"]),
+        (
+            ["--diff"],
+            1,
+            ["--- {path}", "+++ {path}", "@@ -1 +1 @@", "-pip", "+pip=={version}"],
+        ),
+        ([], None, ["Replaced versions in {path}"]),
+        (["--dry-run"], 0, ["Requirements are up to date."]),
+    ],
+)
+def test_cli_dry_run(tmp_path, monkeypatch, capsys, args, expected_code, expected_out):
+    path = tmp_path / "requirements.txt"
+    path.write_text("pip\n")
+    if expected_code == 0:
+        replace_requirements_packages_versions(str(path))
+    mtime = os.stat(path).st_mtime_ns
+    monkeypatch.setattr(
+        sys, "argv", ["pru", "-r", str(path), "replace_versions", *args]
+    )
+    assert main() == expected_code
+    version = get_package_version("pip")
+    assert capsys.readouterr().out.splitlines() == [
+        line.format(path=path, version=version) for line in expected_out
+    ]
+    if args:
+        assert os.stat(path).st_mtime_ns == mtime
+
+
+def test_cli_upgrade_dry_run(tmp_path, monkeypatch, capsys):
+    path = tmp_path / "requirements.txt"
+    path.write_text("pip\n")
+    commands = []
+
+    def run_installer(self, command, files, **kwargs):
+        commands.append(command)
+
+    monkeypatch.setattr(PruSession, "_run_installer", run_installer)
+    monkeypatch.setattr(PruSession, "resolve_versions", lambda self, *a, **k: None)
+    monkeypatch.setattr(sys, "argv", ["pru", "-r", str(path), "--dry-run"])
+    with pytest.raises(SystemExit):
+        main()
+    assert "--dry-run or --diff with --resolve-only" in capsys.readouterr().err
+
+    monkeypatch.setattr(
+        sys, "argv", ["pru", "-r", str(path), "--resolve-only", "--diff"]
+    )
+    assert main() == 1
+    assert "+pip==" in capsys.readouterr().out
+    assert commands == []
+    assert path.read_text() == "pip\n"
+
+
+def test_plan_requirements_versions_respect_constraints(tmp_path):
+    path = tmp_path / "requirements.txt"
+    path.write_text(
+        "requests>=2.32.1\nnumpy<=1.26.3\npandas==2.2.1\nscipy~=1.17\nsix!=1.*\n"
+    )
+    index = {
+        "requests": InstalledPackage("requests", "2.32.3", None),
+        "numpy": InstalledPackage("numpy", "2.4.1", None),
+        "pandas": InstalledPackage("pandas", "2.3.0", None),
+        "scipy": InstalledPackage("scipy", "1.17.0", None),
+        "six": InstalledPackage("six", "1.17.0", None),
+    }
+    (plan,) = plan_requirements_versions(
+        str(path), index=index, respect_constraints=True
+    )
+    assert plan.lines == [
+        "requests==2.32.3\n",
+        "numpy<=1.26.3\n",
+        "pandas==2.3.0\n",
+        "scipy==1.17.0\n",
+        "six!=1.*\n",
+    ]
+    assert plan.changed == 3
+    assert plan.violations == (
+        ConstraintViolation(str(path), 2, "numpy", "<=1.26.3", "2.4.1"),
+        ConstraintViolation(str(path), 5, "six", "!=1.*", "1.17.0"),
+    )
+    # without it, every specifier is replaced
+    (plan,) = plan_requirements_versions(str(path), index=index)
+    assert "numpy==2.4.1\n" in plan.lines
+    assert plan.violations == ()
+
+
+def test_cli_respect_constraints(tmp_path, monkeypatch, capsys):
+    path = tmp_path / "requirements.txt"
+    path.write_text("pip>=1\npip<1\n")
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        ["pru", "-r", str(path), "replace_versions", "--respect-constraints"],
+    )
+    assert main() == 1
+    version = get_package_version("pip")
+    captured = capsys.readouterr()
+    assert captured.out == f"Replaced versions in {path}\n"
+    assert captured.err == (
+        f"{path}:2: pip {version} is installed, which violates '<1', "
+        "line kept unchanged\n"
+    )
+    assert path.read_text() == f"pip=={version}\npip<1\n"
+
+
+def test_get_install_names_respect_constraints():
+    requirements = parse_requirements(
+        ["numpy<=1.26.3\n", "pandas==2.2.1\n", "requests[socks]>=2,!=2.1\n"]
+    )
+    assert core._get_install_names(requirements, constraints=True) == [
+        "numpy<=1.26.3",
+        "pandas",
+        "requests[socks]>=2,!=2.1",
+    ]
+
+
+def test_iter_installed_packages():
+    index = get_installed_packages_index()
+    assert sorted(iter_installed_packages()) == sorted(index.values())
+    packages = list(iter_installed_packages(patterns=["PIP", "pytest_*"]))
+    names = {canonicalize_name(package.name) for package in packages}
+    assert "pip" in names
+    assert "pytest-dependency" in names
+    assert all(name == "pip" or name.startswith("pytest-") for name in names)
+
+
+@pytest.mark.parametrize(
+    "output_format, expected",
+    [
+        (
+            "jsonl",
+            '{"name": "foo", "version": "1.0", "path": "a"}\n'
+            '{"name": "Bar", "version": "2.0", "path": "b,c"}\n',
+        ),
+        ("csv", 'name,version,path\nfoo,1.0,a\nBar,2.0,"b,c"\n'),
+        (
+            "json",
+            '[\n{"name": "foo", "version": "1.0", "path": "a"},\n'
+            '{"name": "Bar", "version": "2.0", "path": "b,c"}\n]\n',
+        ),
+    ],
+)
+def test_print_installed_packages(capsys, output_format, expected):
+    packages = [
+        InstalledPackage("foo", "1.0", "a"),
+        InstalledPackage("Bar", "2.0", "b,c"),
+    ]
+    assert print_installed_packages(iter(packages), output_format) == 2
+    assert capsys.readouterr().out == expected
+    assert print_installed_packages(iter([]), output_format) == 0
+    if output_format == "json":
+        assert json.loads(capsys.readouterr().out) == []
+
+
+def test_cli_print_installed_format(monkeypatch, capsys):
+    monkeypatch.setattr(
+        sys, "argv", ["pru", "print_installed", "--format", "jsonl", "--match", "pip"]
+    )
+    assert main() is None
+    records = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert records == [
+        {
+            "name": "pip",
+            "version": get_package_version("pip"),
+            "path": get_installed_packages_index()["pip"].path,
+        }
+    ]
+
+
+@pytest.fixture
+def venv(tmp_path):
+    path = tmp_path / "venv"
+    site_packages = path / "lib" / "python3.12" / "site-packages"
+    site_packages.mkdir(parents=True)
+    dist_info = site_packages / "foo_bar-1.0.dist-info"
+    dist_info.mkdir()
+    (dist_info / "METADATA").write_text("Name: foo-bar\nVersion: 1.0\n")
+    return path
+
+
+def test_cli_env(tmp_path, monkeypatch, capsys, venv):
+    path = tmp_path / "requirements.txt"
+    path.write_text("Foo_Bar>=0.1\npip\n")
+    monkeypatch.setattr(
+        sys, "argv", ["pru", "-r", str(path), "replace_versions", "--env", str(venv)]
+    )
+    assert main() is None
+    assert path.read_text() == "Foo_Bar==1.0\npip\n"
+    capsys.readouterr()
+
+    # the snapshot of the scanned environment is kept in it
+    site_packages = venv / "lib" / "python3.12" / "site-packages"
+    snapshot = json.loads((venv / ".pru" / "snapshot.json").read_text())
+    assert list(snapshot["dirs"]) == [str(site_packages)]
+    host_snapshot = load_json_cache(get_snapshot_path(), {"dirs": {}})
+    assert str(site_packages) not in host_snapshot["dirs"]
+
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        ["pru", "print_installed", "--site-packages", str(site_packages)]
+        + ["--format", "csv"],
+    )
+    assert main() is None
+    assert capsys.readouterr().out == (
+        f"name,version,path\nfoo-bar,1.0,{site_packages / 'foo_bar-1.0.dist-info'}\n"
+    )
+
+
+def test_cli_print_installed_match(tmp_path, monkeypatch, capsys, venv):
+    path = tmp_path / "requirements.txt"
+    path.write_text("Foo_Bar\npip\n")
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        ["pru", "-r", str(path), "print_installed", "--env", str(venv)]
+        + ["--match", "FOO_*"],
+    )
+    assert main() is None
+    assert capsys.readouterr().out.splitlines() == [
+        "{'Foo_Bar': '1.0'}",
+        "{'foo-bar': '1.0'}",
+    ]
+
+
+def test_cli_env_upgrade_command(tmp_path, monkeypatch, capsys, venv):
+    path = tmp_path / "requirements.txt"
+    path.write_text("foo-bar\n")
+    commands = []
+
+    def run_installer(self, command, files, **kwargs):
+        commands.append(command)
+
+    monkeypatch.setattr(PruSession, "_run_installer", run_installer)
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        ["pru", "-r", str(path), "--env", str(venv), "--backend", "pip"],
+    )
+    assert main() is None
+    assert commands == [f"{venv / 'bin' / 'python'} -m pip install --upgrade"]
+    assert path.read_text() == "foo-bar==1.0\n"
+
+    monkeypatch.setattr(
+        sys, "argv", ["pru", "-r", str(path), "--env", str(venv), "--env", str(venv)]
+    )
+    with pytest.raises(SystemExit):
+        main()
+    assert "single --env" in capsys.readouterr().err
+
+    # markers of the closure would be evaluated against the running Python
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        ["pru", "-r", str(path), "--closure", "replace_versions", "--env", str(venv)],
+    )
+    with pytest.raises(SystemExit):
+        main()
+    assert "--closure cannot be used with --env" in capsys.readouterr().err
+
+
+def test_replace_requirements_packages_versions_hashes(tmp_path, monkeypatch):
+    monkeypatch.setenv("PRU_CACHE_DIR", str(tmp_path / "cache"))
+    dists = tmp_path / "dists"
+    dists.mkdir()
+    (dists / "numpy-2.4.1-py3-none-any.whl").write_bytes(b"wheel")
+    digest = hashlib.sha256(b"wheel").hexdigest()
+    path = tmp_path / "requirements.txt"
+    path.write_text("numpy \\\n    --hash=sha256:old\nscipy\n")
+    index = {
+        "numpy": InstalledPackage("numpy", "2.4.1", None),
+        "scipy": InstalledPackage("scipy", "1.17.0", None),
+    }
+    report = replace_requirements_packages_versions(
+        str(path), index=index, hash_dirs=[str(dists)]
+    )
+    assert report == {str(path): 2}
+    assert path.read_text() == (
+        f"numpy==2.4.1 \\\n    --hash=sha256:{digest}\nscipy==1.17.0\n"
+    )
+    report = replace_requirements_packages_versions(
+        str(path), index=index, hash_dirs=[str(dists)]
+    )
+    assert report == {str(path): 0}
+
+
+def test_replace_requirements_packages_versions_stale_hashes(tmp_path):
+    path = tmp_path / "requirements.txt"
+    path.write_text(
+        "pytest==1.0 --hash=sha256:aaaa\nnumpy==2.4.1 \\\n    --hash=sha256:bbbb\n"
+    )
+    index = {
+        "pytest": InstalledPackage("pytest", "9.1.1", None),
+        "numpy": InstalledPackage("numpy", "2.4.1", None),
+    }
+    report = replace_requirements_packages_versions(str(path), index=index)
+    assert report == {str(path): 1}
+    assert path.read_text() == (
+        "pytest==9.1.1\nnumpy==2.4.1 \\\n    --hash=sha256:bbbb\n"
+    )
+
+
+def test_replace_requirements_packages_versions_closure(tmp_path):
+    index = {
+        "app": InstalledPackage("app", "1.0", None, ("lib-a", "numpy")),
+        "lib-a": InstalledPackage("Lib_A", "2.0", None, ("lib-b ; extra == 'x'",)),
+        "numpy": InstalledPackage("numpy", "2.4.1", None),
+    }
+    path = tmp_path / "requirements.txt"
+    path.write_text("app\nnumpy")
+    report = replace_requirements_packages_versions(
+        str(path), index=index, closure=True
+    )
+    assert report == {str(path): 3}
+    assert path.read_text() == (
+        "app==1.0\nnumpy==2.4.1\n\n"
+        "# Transitive dependencies, pinned by pru --closure\n"
+        "Lib_A==2.0\n    # via app\n"
+    )
+    # the generated section is replaced, not duplicated
+    index["lib-a"] = InstalledPackage("Lib_A", "2.1", None)
+    report = replace_requirements_packages_versions(
+        str(path), index=index, closure=True
+    )
+    assert report == {str(path): 1}
+    assert path.read_text().count("Lib_A") == 1
+    assert "Lib_A==2.1\n" in path.read_text()
+
+
+def test_replace_requirements_packages_versions_utf16(tmp_path):
+    path = tmp_path / "requirements.txt"
+    data = "\ufeffpip>=1  # café\r\n\r\n".encode("utf-16-le")
+    path.write_bytes(data)
+    assert read_requirements(str(path)) == ["pip>=1  # café\n", "\n"]
+    replace_requirements_packages_versions(str(path))
+    version = get_package_version("pip")
+    assert path.read_bytes() == data.replace(
+        ">=1".encode("utf-16-le"), f"=={version}".encode("utf-16-le")
+    )
+
+
+def test_empty_requirements_file(tmp_path):
+    path = tmp_path / "requirements.txt"
+    path.write_text("")
+    assert read_requirements(str(path)) == []
+    assert get_requirements_packages_name(str(path)) == []
+    assert replace_requirements_packages_versions(str(path)) == {str(path): 0}
+
+
+def test_pru_session(requirements_tree, monkeypatch):
+    reads = []
+    scans = []
+    monkeypatch.setattr(
+        core,
+        "read_lines",
+        lambda path: reads.append(path) or read_lines(path),
+    )
+    monkeypatch.setattr(
+        core,
+        "get_installed_packages_index",
+        lambda paths, use_cache, snapshot_path=None: (
+            scans.append(paths) or {"numpy": InstalledPackage("numpy", "2.4.1", None)}
+        ),
+    )
+    path = str(requirements_tree / "requirements" / "base.txt")
+    session = PruSession()
+    assert session.get_installed_requirements_packages_and_version(path) == {
+        "numpy": "2.4.1"
+    }
+    plans = session.plan_requirements_versions(path)
+    assert (len(reads), len(scans)) == (1, 1)
+
+    # written files are read again, the index is kept
+    assert session.write_requirements_plans(plans) == {path: 1}
+    assert session.get_installed_requirements_packages_and_version(path) == {
+        "numpy": "2.4.1"
+    }
+    assert (len(reads), len(scans)) == (2, 1)
+
+    # an upgrade invalidates the index, but not the parsed files
+    assert session.upgrade_requirements(path, command="echo") == ({path: 0}, [])
+    assert (len(reads), len(scans)) == (2, 2)
+
+    session.refresh()
+    session.get_installed_requirements_packages_and_version(path)
+    assert (len(reads), len(scans)) == (3, 3)
@@ -0,0 +1,96 @@
+import hashlib
+import json
+import os
+
+import pytest
+
+from pru import hashes
+from pru.hashes import (
+    find_distribution_files,
+    get_file_digests,
+    get_package_hashes,
+    hash_file,
+)
+
+# older than the racy window, so digests are cached
+OLD_NS = 10**18
+
+
+@pytest.fixture
+def distributions(tmp_path):
+    directory = tmp_path / "dists"
+    directory.mkdir()
+    for filename in [
+        "foo_bar-1.0-py3-none-any.whl",
+        "foo_bar-1.0-cp313-cp313-manylinux_2_28_x86_64.whl",
+        "foo-bar-1.0.tar.gz",
+        "foo_bar-2.0.tar.gz",
+        "README.txt",
+    ]:
+        path = directory / filename
+        path.write_bytes(filename.encode())
+        os.utime(path, ns=(OLD_NS, OLD_NS))
+    return directory
+
+
+def test_hash_file(tmp_path):
+    path = tmp_path / "data"
+    path.write_bytes(b"x" * (3 * 2**20 + 1))
+    assert hash_file(str(path)) == hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def test_get_file_digests_cache(distributions, tmp_path, monkeypatch):
+    paths = [str(path) for path in sorted(distributions.iterdir())]
+    cache_path = str(tmp_path / "hashes.json")
+    digests = get_file_digests(paths, max_workers=4, cache_path=cache_path)
+    assert digests == {path: hash_file(path) for path in paths}
+
+    def fail(path):
+        raise AssertionError(f"{path} hashed again")
+
+    monkeypatch.setattr(hashes, "hash_file", fail)
+    assert get_file_digests(paths, cache_path=cache_path) == digests
+
+    # a changed file is hashed again
+    monkeypatch.setattr(hashes, "hash_file", lambda path: "changed")
+    with open(paths[0], "ab") as f:
+        f.write(b"!")
+    assert get_file_digests(paths, cache_path=cache_path)[paths[0]] == "changed"
+
+
+def test_get_file_digests_cache_lru(distributions, tmp_path, monkeypatch):
+    paths = [str(path) for path in sorted(distributions.iterdir())]
+    cache_path = tmp_path / "hashes.json"
+    get_file_digests(paths, cache_path=str(cache_path))
+
+    # digests of other projects are kept, until unused for a while
+    get_file_digests(paths[:2], cache_path=str(cache_path))
+    data = json.loads(cache_path.read_text())
+    assert sorted(data["files"]) == paths
+    data["used"] = dict.fromkeys(data["used"], 0)
+    cache_path.write_text(json.dumps(data))
+    get_file_digests(paths[:2], cache_path=str(cache_path))
+    assert sorted(json.loads(cache_path.read_text())["files"]) == paths[:2]
+
+    # or when the cache holds too many
+    monkeypatch.setattr(hashes, "MAX_CACHED_FILES", 3)
+    get_file_digests(paths, cache_path=str(cache_path))
+    assert len(json.loads(cache_path.read_text())["files"]) == 3
+
+
+def test_find_distribution_files(distributions):
+    files = find_distribution_files([str(distributions), str(distributions / "x")])
+    assert sorted(key[0] for key in files) == ["foo-bar", "foo-bar"]
+    assert len(files[("foo-bar", (0, (1,), (3, 0), -1, float("inf"), ()))]) == 3
+
+
+def test_get_package_hashes(distributions, monkeypatch):
+    monkeypatch.setenv("PRU_CACHE_DIR", str(distributions.parent / "cache"))
+    result = get_package_hashes(
+        [("Foo.Bar", "1.0"), ("foo-bar", "2.0"), ("other", "1.0")], [str(distributions)]
+    )
+    assert sorted(result) == [("foo-bar", "1.0"), ("foo-bar", "2.0")]
+    assert result[("foo-bar", "2.0")] == [
+        hash_file(str(distributions / "foo_bar-2.0.tar.gz"))
+    ]
+    assert len(result[("foo-bar", "1.0")]) == 3
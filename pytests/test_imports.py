@@ -0,0 +1,160 @@
+import json
+import os
+
+import pytest
+
+from pru import imports
+from pru.imports import (
+    ImportAudit,
+    audit_imports,
+    find_python_files,
+    get_local_modules,
+    get_module_imports,
+    get_stdlib_modules,
+    scan_imports,
+)
+from pru.snapshot import InstalledPackage
+
+# older than the racy window, so imports are cached
+OLD_NS = 10**18
+
+
+@pytest.fixture
+def project(tmp_path):
+    directory = tmp_path / "project"
+    (directory / "app").mkdir(parents=True)
+    (directory / "app" / "__init__.py").write_text("from . import core\n")
+    (directory / "app" / "core.py").write_text(
+        "import os, yaml.loader\n"
+        "from app import helpers\n"
+        "from .helpers import x\n"
+        "try:\n"
+        "    import ujson as json\n"
+        "except ImportError:\n"
+        "    import json\n"
+        "def f():\n"
+        "    from dateutil import parser\n"
+    )
+    (directory / "app" / "helpers.py").write_text("import numpy\nimport unknown\n")
+    (directory / "broken.py").write_text("import (\n")
+    (directory / ".venv").mkdir()
+    (directory / ".venv" / "lib.py").write_text("import hidden\n")
+    (directory / "env").mkdir()
+    (directory / "env" / "pyvenv.cfg").write_text("")
+    (directory / "env" / "lib.py").write_text("import venv_only\n")
+    for path in directory.rglob("*.py"):
+        os.utime(path, ns=(OLD_NS, OLD_NS))
+    return directory
+
+
+@pytest.fixture
+def index():
+    packages = [
+        InstalledPackage("PyYAML", "6.0", None, (), ("_yaml", "yaml")),
+        InstalledPackage("numpy", "2.4.1", None, (), ("numpy",)),
+        InstalledPackage("python-dateutil", "2.9", None, (), ("dateutil",)),
+        InstalledPackage("requests", "2.32", None, (), ("requests",)),
+    ]
+    return {package.name.lower(): package for package in packages}
+
+
+def test_find_python_files(project):
+    assert find_python_files(str(project)) == [
+        str(project / "app" / "__init__.py"),
+        str(project / "app" / "core.py"),
+        str(project / "app" / "helpers.py"),
+        str(project / "broken.py"),
+    ]
+
+
+def test_get_module_imports(project):
+    assert get_module_imports(str(project / "app" / "core.py")) == [
+        "app",
+        "dateutil",
+        "json",
+        "os",
+        "ujson",
+        "yaml",
+    ]
+    assert get_module_imports(str(project / "app" / "__init__.py")) == []
+    assert get_module_imports(str(project / "broken.py")) is None
+    assert get_module_imports(str(project / "missing.py")) is None
+
+
+def test_get_stdlib_modules():
+    modules = get_stdlib_modules()
+    assert {"os", "sys", "json", "asyncio"} <= modules
+    assert "pytest" not in modules
+
+
+@pytest.mark.parametrize("parallel", [False, True])
+def test_scan_imports_cache(project, tmp_path, monkeypatch, parallel):
+    if parallel:
+        monkeypatch.setattr(imports, "_MIN_PARALLEL_FILES", 0)
+    paths = find_python_files(str(project))
+    cache_path = str(tmp_path / "imports.json")
+    result = scan_imports(paths, max_workers=2, cache_path=cache_path)
+    assert result == {path: get_module_imports(path) for path in paths}
+
+    def fail(path):
+        raise AssertionError(f"{path} parsed again")
+
+    monkeypatch.setattr(imports, "_MIN_PARALLEL_FILES", 64)
+    monkeypatch.setattr(imports, "get_module_imports", fail)
+    # files that do not parse are parsed again, they are likely being edited
+    assert scan_imports(paths[:-1], cache_path=cache_path) == {
+        path: result[path] for path in paths[:-1]
+    }
+
+    monkeypatch.setattr(imports, "get_module_imports", lambda path: ["changed"])
+    with open(paths[0], "a") as f:
+        f.write("import changed\n")
+    assert scan_imports(paths, cache_path=cache_path)[paths[0]] == ["changed"]
+
+
+def test_scan_imports_cache_lru(project, tmp_path):
+    paths = find_python_files(str(project))
+    cache_path = tmp_path / "imports.json"
+    scan_imports(paths, max_workers=1, cache_path=str(cache_path))
+    cached = json.loads(cache_path.read_text())["files"]
+    assert paths[0] in cached
+
+    # files of other projects are kept, deleted files are dropped
+    scan_imports(paths[1:2], max_workers=1, cache_path=str(cache_path))
+    os.remove(paths[0])
+    scan_imports(paths[:1], max_workers=1, cache_path=str(cache_path))
+    assert sorted(json.loads(cache_path.read_text())["files"]) == sorted(
+        path for path in cached if path != paths[0]
+    )
+
+
+def test_get_local_modules(project):
+    (project / "app" / "requests.py").write_text("")
+    (project / "src" / "lib").mkdir(parents=True)
+    (project / "src" / "lib" / "__init__.py").write_text("")
+    (project / "src" / "tool.py").write_text("")
+    assert get_local_modules(str(project)) == {
+        "app",
+        "broken",
+        "env",
+        "lib",
+        "src",
+        "tool",
+    }
+
+
+def test_audit_imports(project, index, tmp_path, monkeypatch):
+    monkeypatch.setenv("PRU_CACHE_DIR", str(tmp_path / "cache"))
+    path = tmp_path / "requirements.txt"
+    path.write_text("PyYAML==6.0\nrequests\nujson ; sys_platform == 'win32'\n")
+    audit = audit_imports(str(project), str(path), index=index)
+    assert audit == ImportAudit(
+        unused=["requests"],
+        missing={"numpy": ["numpy"], "python-dateutil": ["dateutil"]},
+        unresolved=["unknown"],
+    )
+
+    # a nested module does not hide the distribution of the same name
+    (project / "app" / "requests.py").write_text("import requests\n")
+    audit = audit_imports(str(project), str(path), index=index)
+    assert audit.unused == []
@@ -0,0 +1,127 @@
+import functools
+import json
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from pru.index import (
+    SimpleIndexClient,
+    get_filename_version,
+    get_outdated_packages,
+    parse_simple_html,
+    parse_simple_json,
+)
+from pru.snapshot import InstalledPackage
+
+
+@pytest.mark.parametrize(
+    "filename, expected",
+    [
+        ("numpy-2.4.1-cp313-cp313-manylinux_2_28_x86_64.whl", "2.4.1"),
+        ("Foo_Bar-1.0.tar.gz", "1.0"),
+        ("foo-bar-1.0rc1.zip", "1.0rc1"),
+        ("other-1.0.tar.gz", None),
+        ("foo_bar-1.0.exe", None),
+    ],
+)
+def test_get_filename_version(filename, expected):
+    project = "numpy" if filename.startswith("numpy") else "foo-bar"
+    assert get_filename_version(filename, project) == expected
+
+
+def test_parse_simple_json():
+    page = {
+        "meta": {"api-version": "1.1"},
+        "name": "foo",
+        "files": [
+            {"filename": "foo-1.0.tar.gz", "url": "foo-1.0.tar.gz"},
+            {"filename": "foo-1.1-py3-none-any.whl", "url": "x"},
+            {"filename": "foo-1.2.tar.gz", "url": "y", "yanked": "broken"},
+        ],
+    }
+    assert parse_simple_json(json.dumps(page), "foo") == ["1.0", "1.1"]
+
+
+def test_parse_simple_html():
+    page = (
+        '<html><body><a href="../../files/foo-1.10.tar.gz#sha256=00">foo</a>'
+        '<a href="foo-1.9-py3-none-any.whl">foo-1.9-py3-none-any.whl</a>'
+        '<a href="foo-2.0.tar.gz" data-yanked="">foo-2.0.tar.gz</a></body></html>'
+    )
+    assert parse_simple_html(page.encode(), "foo") == ["1.9", "1.10"]
+
+
+class _Handler(SimpleHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def log_request(self, code="-", size="-"):
+        self.server.requests.append((self.path, int(code)))
+
+
+@pytest.fixture
+def index_server(tmp_path, monkeypatch):
+    monkeypatch.setenv("PRU_CACHE_DIR", str(tmp_path / "cache"))
+    root = tmp_path / "root"
+    for filename in [
+        "foo_bar-1.0.tar.gz",
+        "foo_bar-2.0-py3-none-any.whl",
+        "foo_bar-3.0rc1.tar.gz",
+    ]:
+        (root / "simple" / "foo-bar").mkdir(parents=True, exist_ok=True)
+        (root / "simple" / "foo-bar" / filename).write_bytes(b"")
+    # a PEP 503 page, served with Last-Modified unlike directory listings
+    (root / "simple" / "baz").mkdir()
+    (root / "simple" / "baz" / "index.html").write_text(
+        '<a href="/files/baz-0.5.tar.gz#sha256=00">baz-0.5.tar.gz</a>'
+    )
+
+    handler = functools.partial(_Handler, directory=str(root))
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server, f"http://127.0.0.1:{server.server_address[1]}/simple"
+    server.shutdown()
+    server.server_close()
+
+
+def test_simple_index_client(index_server):
+    server, index_url = index_server
+    with SimpleIndexClient(index_url) as client:
+        assert client.get_project_versions("Foo.Bar") == ["1.0", "2.0", "3.0rc1"]
+        assert client.get_project_versions("missing") is None
+        assert client.get_latest_versions(["foo-bar", "baz"], max_workers=2) == {
+            "foo-bar": "2.0",
+            "baz": "0.5",
+        }
+        assert client.get_project_versions("baz") == ["0.5"]
+    # cached pages are revalidated with If-Modified-Since
+    assert [code for path, code in server.requests if path == "/simple/baz/"] == [
+        200,
+        304,
+    ]
+
+
+def test_get_outdated_packages(index_server, tmp_path):
+    _, index_url = index_server
+    path = tmp_path / "requirements.txt"
+    path.write_text(f"--index-url {index_url}\nfoo-bar==1.0\nbaz\nmissing==1\n")
+    index = {"baz": InstalledPackage("baz", "0.5", None)}
+    outdated = get_outdated_packages(str(path), index=index)
+    assert [tuple(package) for package in outdated] == [("foo-bar", "1.0", "2.0")]
+    outdated = get_outdated_packages(str(path), index=index, prereleases=True)
+    assert [tuple(package) for package in outdated] == [("foo-bar", "1.0", "3.0rc1")]
+    # the latest version satisfying the specifiers
+    path.write_text(f"--index-url {index_url}\nfoo-bar>=1.0,<2\nbaz\n")
+    index["foo-bar"] = InstalledPackage("foo-bar", "1.0", None)
+    outdated = get_outdated_packages(str(path), index=index, respect_constraints=True)
+    assert outdated == []
+    path.write_text(f"--index-url {index_url}\nfoo-bar!=3.*\n")
+    outdated = get_outdated_packages(
+        str(path), index=index, prereleases=True, respect_constraints=True
+    )
+    assert [tuple(package) for package in outdated] == [("foo-bar", "1.0", "2.0")]
@@ -0,0 +1,138 @@
+import json
+import pstats
+import sys
+import threading
+
+import pytest
+
+from pru import instrument
+from pru.cli import main
+from pru.core import replace_requirements_packages_versions
+from pru.instrument import PhaseTimer, add_hook, phase, remove_hook
+
+
+def test_phase_without_hooks():
+    assert instrument._HOOKS == ()
+    with phase("scan") as scan:
+        pass
+    assert scan is instrument._NULL_PHASE
+
+
+def test_hooks():
+    events = []
+
+    def hook(event, name, timestamp, details):
+        events.append((event, name, details))
+
+    add_hook(hook)
+    try:
+        with pytest.raises(RuntimeError):
+            with phase("install", command="pip install"):
+                with phase("parse"):
+                    raise RuntimeError
+    finally:
+        remove_hook(hook)
+    with phase("scan"):
+        pass
+
+    assert events == [
+        ("start", "install", {"command": "pip install"}),
+        ("start", "parse", {}),
+        ("end", "parse", {}),
+        ("end", "install", {"command": "pip install"}),
+    ]
+    with pytest.raises(ValueError):
+        remove_hook(hook)
+
+
+def test_phase_timer(tmp_path):
+    def run():
+        with phase("parse", path="b.txt"):
+            pass
+
+    with PhaseTimer() as timer:
+        with phase("scan"):
+            with phase("parse", path="a.txt"):
+                pass
+        thread = threading.Thread(target=run)
+        thread.start()
+        thread.join()
+    assert instrument._HOOKS == ()
+
+    assert [record.name for record in timer.records] == ["parse", "scan", "parse"]
+    summary = timer.summary()
+    assert [(name, count) for name, count, _ in summary] == [("scan", 1), ("parse", 2)]
+    assert all(total >= 0 for _, _, total in summary)
+
+    table = timer.format_table().splitlines()
+    assert table[0].split() == ["Phase", "Count", "Seconds"]
+    assert [line.split()[:2] for line in table[1:3]] == [["scan", "1"], ["parse", "2"]]
+    assert table[-1].startswith("total")
+
+    result = timer.to_json()
+    assert [phase["name"] for phase in result["phases"]] == ["scan", "parse"]
+    assert result["total"] >= sum(phase["seconds"] for phase in result["phases"]) / 2
+
+    path = tmp_path / "trace.json"
+    timer.write_chrome_trace(str(path))
+    events = json.loads(path.read_text())["traceEvents"]
+    assert [(event["name"], event["ph"]) for event in events] == [
+        ("parse", "X"),
+        ("scan", "X"),
+        ("parse", "X"),
+    ]
+    assert events[0]["args"] == {"path": "a.txt"}
+    assert events[0]["tid"] != events[2]["tid"]
+    assert events[1]["ts"] <= events[0]["ts"]
+    assert events[1]["dur"] >= events[0]["dur"]
+
+
+def test_replace_requirements_packages_versions_phases(tmp_path):
+    path = tmp_path / "requirements.txt"
+    path.write_text("pip\n")
+    with PhaseTimer() as timer:
+        replace_requirements_packages_versions(str(path))
+    assert [name for name, _, _ in timer.summary()] == [
+        "parse",
+        "scan",
+        "plan",
+        "write",
+    ]
+
+
+@pytest.mark.parametrize("timings", ["table", "json"])
+def test_cli_timings(tmp_path, monkeypatch, capsys, timings):
+    path = tmp_path / "requirements.txt"
+    path.write_text("pip\n")
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        ["pru", "-r", str(path), "replace_versions", "--timings", timings],
+    )
+    assert main() is None
+    captured = capsys.readouterr()
+    assert captured.out == f"Replaced versions in {path}\n"
+    if timings == "json":
+        result = json.loads(captured.err)
+        assert [phase["name"] for phase in result["phases"]][-1] == "write"
+    else:
+        assert captured.err.splitlines()[0].split() == ["Phase", "Count", "Seconds"]
+
+
+def test_cli_profile(tmp_path, monkeypatch):
+    path = tmp_path / "requirements.txt"
+    path.write_text("pip\n")
+    trace = tmp_path / "trace.json"
+    stats = tmp_path / "pru.prof"
+    for profile in (trace, stats):
+        monkeypatch.setattr(
+            sys,
+            "argv",
+            ["pru", "-r", str(path), "replace_versions", "--profile", str(profile)],
+        )
+        assert main() is None
+
+    events = json.loads(trace.read_text())["traceEvents"]
+    assert {event["name"] for event in events} == {"parse", "scan", "plan", "write"}
+    functions = pstats.Stats(str(stats)).stats
+    assert any(name == "scan_installed_packages" for _, _, name in functions)
@@ -0,0 +1,47 @@
+import pytest
+
+from pru.markers import compile_marker, default_environment, evaluate_marker
+
+ENVIRONMENT = dict(
+    default_environment(),
+    python_version="3.12",
+    python_full_version="3.12.4",
+    sys_platform="linux",
+    os_name="posix",
+)
+
+
+@pytest.mark.parametrize(
+    "marker, extra, expected",
+    [
+        ('python_version < "3.11"', "", False),
+        ('python_version >= "3.9" and sys_platform == "linux"', "", True),
+        ('sys_platform == "win32" or (os_name == "posix")', "", True),
+        ("python_full_version ~= '3.12.0'", "", True),
+        ('python_version ~= "3.10"', "", True),
+        ('python_version == "3.*"', "", True),
+        ('python_version != "3.12.*"', "", False),
+        ('"linux" in sys_platform', "", True),
+        ('sys_platform not in "win32 cygwin"', "", True),
+        ('extra == "socks"', "", False),
+        ('extra == "Socks_Proxy"', "socks-proxy", True),
+        ('python_version > "3.8" and extra == "test"', "test", True),
+        ('os.name == "posix"', "", True),
+    ],
+)
+def test_evaluate_marker(marker, extra, expected):
+    assert evaluate_marker(marker, extra, ENVIRONMENT) is expected
+
+
+@pytest.mark.parametrize(
+    "marker", ["python_version <", 'unknown == "1"', '(python_version > "3"', "a b"]
+)
+def test_evaluate_marker_invalid(marker):
+    with pytest.raises(ValueError, match="Invalid marker"):
+        compile_marker(marker)
+
+
+def test_evaluate_marker_default_environment():
+    assert evaluate_marker('python_version >= "3"')
+    assert evaluate_marker('extra == "dev"', "dev")
+    assert not evaluate_marker('extra == "dev"')
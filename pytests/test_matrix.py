@@ -0,0 +1,75 @@
+import os
+import shutil
+import sys
+
+from pru import matrix
+from pru.matrix import (
+    format_requirements_paths,
+    print_matrix_summary,
+    run_matrix,
+)
+
+
+def test_format_requirements_paths():
+    patterns = ["3_{minor}/requirements.txt", "py{version}/requirements.txt"]
+    assert format_requirements_paths(patterns, (3, 12)) == [
+        "3_12/requirements.txt",
+        "py3.12/requirements.txt",
+    ]
+
+
+def test_run_matrix(tmp_path, capsys):
+    minor = sys.version_info.minor
+    (tmp_path / f"3_{minor}").mkdir()
+    requirements_path = tmp_path / f"3_{minor}" / "requirements.txt"
+    requirements_path.write_text("pip\n")
+
+    missing = str(tmp_path / "missing" / "python")
+    finished = []
+    results = run_matrix(
+        [sys.executable, missing],
+        [str(tmp_path / "3_{minor}" / "requirements.txt")],
+        command="echo {python} upgrading",
+        max_workers=2,
+        callback=finished.append,
+    )
+
+    assert sorted(result.interpreter for result in finished) == sorted(
+        [sys.executable, missing]
+    )
+    ok, failed = results
+    assert ok.returncode == 0
+    assert ok.version == sys.version_info[:2]
+    assert f"{sys.executable} upgrading pip" in ok.output
+    assert ok.changed == [str(requirements_path)]
+    assert requirements_path.read_text().startswith("pip==")
+    assert failed.returncode != 0
+    assert failed.changed == []
+
+    print_matrix_summary(results)
+    out = capsys.readouterr().out
+    assert f"Requirements updated:\n{requirements_path}\n" in out
+    assert f"Failed:\n{missing}" in out
+
+
+def test_run_matrix_isolates_parent_site_packages(tmp_path, monkeypatch):
+    # pru installed in a site-packages directory of the parent interpreter
+    parent_site = tmp_path / "parent-site"
+    shutil.copytree(
+        os.path.dirname(matrix.__file__),
+        str(parent_site / "pru"),
+        ignore=shutil.ignore_patterns("__pycache__"),
+    )
+    dist_info = parent_site / "parentonly-0.0.1.dist-info"
+    dist_info.mkdir()
+    (dist_info / "METADATA").write_text("Name: parentonly\nVersion: 0.0.1\n")
+    monkeypatch.setattr(matrix, "_PRU_PACKAGE", str(parent_site / "pru"))
+
+    requirements_path = tmp_path / "requirements.txt"
+    requirements_path.write_text("parentonly\n")
+    (result,) = run_matrix(
+        [sys.executable], [str(requirements_path)], command="echo {python}"
+    )
+    assert result.returncode == 0, result.output
+    assert requirements_path.read_text() == "parentonly\n"
+    assert result.changed == []
@@ -0,0 +1,159 @@
+import pytest
+
+from pru.parser import Requirement, parse_requirements, pin_requirements
+
+
+@pytest.mark.parametrize(
+    "line, expected",
+    [
+        ("scipy\n", Requirement(name="scipy", span=(0, 1), version_span=(5, 5))),
+        (
+            "numpy<=1.26.3\n",
+            Requirement(
+                name="numpy",
+                specifiers=(("<=", "1.26.3"),),
+                span=(0, 1),
+                version_span=(5, 13),
+            ),
+        ),
+        (
+            "requests[socks, security] ~=2.31, !=2.31.1 ; python_version>'3.7'\n",
+            Requirement(
+                name="requests",
+                extras=("socks", "security"),
+                specifiers=(("~=", "2.31"), ("!=", "2.31.1")),
+                markers="python_version>'3.7'",
+                span=(0, 1),
+                version_span=(26, 42),
+            ),
+        ),
+        (
+            "pandas==2.2.* --hash=sha256:abc  # data\n",
+            Requirement(
+                name="pandas",
+                specifiers=(("==", "2.2.*"),),
+                options=(("--hash", "sha256:abc"),),
+                comment="# data",
+                span=(0, 1),
+                version_span=(6, 13),
+            ),
+        ),
+        (
+            "pip @ https://example.com/pip.whl\n",
+            Requirement(name="pip", url="https://example.com/pip.whl", span=(0, 1)),
+        ),
+        ("-r base.txt\n", Requirement(options=(("-r", "base.txt"),), span=(0, 1))),
+        (
+            "-e git+https://example.com/repo.git#egg=repo\n",
+            Requirement(
+                options=(("-e", "git+https://example.com/repo.git#egg=repo"),),
+                span=(0, 1),
+            ),
+        ),
+        ("./local/package\n", Requirement(url="./local/package", span=(0, 1))),
+    ],
+)
+def test_parse_requirements(line, expected):
+    assert parse_requirements([line]) == [expected]
+
+
+def test_parse_requirements_skips_comments_and_blank_lines():
+    lines = ["# header\n", "\n", "   \n", "requests  # http\n"]
+    requirements = parse_requirements(lines)
+    assert [r.name for r in requirements] == ["requests"]
+    assert requirements[0].span == (3, 4)
+
+
+def test_parse_requirements_line_continuation():
+    lines = [
+        "requests>=2.0 \\\n",
+        "    --hash=sha256:aaa \\\n",
+        "    --hash=sha256:bbb\n",
+        "numpy\n",
+    ]
+    requirements = parse_requirements(lines)
+    assert [r.name for r in requirements] == ["requests", "numpy"]
+    assert requirements[0].span == (0, 3)
+    assert requirements[0].options == (
+        ("--hash", "sha256:aaa"),
+        ("--hash", "sha256:bbb"),
+    )
+    assert requirements[1].span == (3, 4)
+
+
+def test_parse_requirements_streamed():
+    lines = ["# comment \\\n", "requests \\\n", "    --hash=sha256:aaa\n", "numpy \\\n"]
+    requirements = parse_requirements(iter(lines))
+    assert requirements == parse_requirements(lines)
+    assert [(r.name, r.span) for r in requirements] == [
+        ("requests", (1, 3)),
+        ("numpy", (3, 4)),
+    ]
+
+
+def test_pin_requirements_keeps_formatting():
+    lines = [
+        "# pinned\n",
+        "requests[socks]>=2.0 ; python_version > '3.7'  # http\r\n",
+        "numpy \\\n",
+        "    --hash=sha256:aaa\n",
+        "unknown\n",
+        "-r base.txt\n",
+        "scipy",
+    ]
+    versions = {"requests": "2.32.5", "numpy": "2.4.1", "scipy": "1.17.0"}
+    requirements = parse_requirements(lines)
+    result = pin_requirements(
+        lines, requirements, lambda requirement: versions.get(requirement.name)
+    )
+    assert result == [
+        "# pinned\n",
+        "requests[socks]==2.32.5 ; python_version > '3.7'  # http\r\n",
+        "numpy==2.4.1\n",
+        "unknown\n",
+        "-r base.txt\n",
+        "scipy==1.17.0",
+    ]
+
+
+def test_pin_requirements_stale_hashes():
+    lines = [
+        "pytest==1.0 --hash=sha256:aaaa  # test\n",
+        "numpy==2.4.1 \\\n",
+        "    --hash=sha256:bbbb\n",
+    ]
+    requirements = parse_requirements(lines)
+    result = pin_requirements(
+        lines,
+        requirements,
+        lambda requirement: "9.1.1" if requirement.name == "pytest" else "2.4.1",
+    )
+    # digests of the previous version are dropped, those of a kept pin kept
+    assert result == [
+        "pytest==9.1.1  # test\n",
+        "numpy==2.4.1 \\\n    --hash=sha256:bbbb\n",
+    ]
+
+
+def test_pin_requirements_hashes():
+    lines = [
+        "requests[socks]>=2.0 ; python_version > '3.7'  # http\r\n",
+        "numpy \\\n",
+        "    --hash=sha256:aaa --no-binary numpy\n",
+        "scipy",
+    ]
+    hashes = {"requests": ["bbb", "ccc"], "numpy": [], "scipy": None}
+    requirements = parse_requirements(lines)
+    result = pin_requirements(
+        lines,
+        requirements,
+        lambda requirement: "1.0",
+        lambda requirement, version: hashes[requirement.name],
+    )
+    assert result == [
+        "requests[socks]==1.0 ; python_version > '3.7' \\\r\n"
+        "    --hash=sha256:bbb \\\r\n"
+        "    --hash=sha256:ccc  # http\r\n",
+        "numpy==1.0 \\\n    --no-binary numpy\n",
+        "scipy==1.0",
+    ]
@@ -0,0 +1,117 @@
+import pytest
+
+from pru.parser import parse_requirements
+from pru.pep440 import (
+    compile_specifiers,
+    filter_versions,
+    get_latest_version,
+    is_prerelease,
+    parse_version,
+)
+
+
+def test_parse_version_order():
+    versions = [
+        "1.0.dev1",
+        "1.0a1",
+        "1.0a2.dev1",
+        "1.0b1",
+        "1.0rc1",
+        "1.0",
+        "1.0+local.1",
+        "1.0.post1.dev1",
+        "1.0.post1",
+        "1.1",
+        "1!0.1",
+    ]
+    assert sorted(versions[5:] + versions[:5], key=parse_version) == versions
+
+
+@pytest.mark.parametrize(
+    "left, right",
+    [("1.0", "1.0.0"), ("1.0RC1", "1.0rc1"), ("1.0-1", "1.0.post1"), ("v2", "2")],
+)
+def test_parse_version_equal(left, right):
+    assert parse_version(left) == parse_version(right)
+
+
+def test_parse_version_invalid():
+    assert parse_version("not a version") is None
+    assert not is_prerelease("not a version")
+
+
+def test_get_latest_version():
+    assert is_prerelease("2.0rc1")
+    assert is_prerelease("2.0.dev0")
+    assert not is_prerelease("2.0.post1")
+    assert get_latest_version(["1.9", "1.10", "2.0rc1", "bad"]) == "1.10"
+    assert get_latest_version(["1.9", "2.0rc1"], prereleases=True) == "2.0rc1"
+    assert get_latest_version(["2.0b1", "2.0a1"]) == "2.0b1"
+    assert get_latest_version([]) is None
+
+
+@pytest.mark.parametrize(
+    "specifier, matching, not_matching",
+    [
+        ("<=1.26.3", ["1.26.3", "1.26", "1.0"], ["1.26.4", "2.0", "1.26.3.post1"]),
+        (">=2.32.1", ["2.32.1", "2.33", "3"], ["2.32.0", "2.32.1rc1"]),
+        ("~=2.2", ["2.2", "2.9.1"], ["2.1", "3.0"]),
+        ("~=2.2.0", ["2.2.0", "2.2.9"], ["2.3", "2.1.9"]),
+        ("!=1.4.*", ["1.3", "1.5", "1.40"], ["1.4", "1.4.2"]),
+        ("==1.4.*", ["1.4", "1.4.2", "1.4.2.post1"], ["1.40", "1.5"]),
+        ("==1.0", ["1.0.0", "1.0+local"], ["1.0.post1"]),
+        ("==1.0+local", ["1.0+local"], ["1.0", "1.0+other"]),
+        ("<2.0", ["1.9", "1.9.post1"], ["2.0", "2.0.dev1", "2.0rc1"]),
+        ("<2.0rc1", ["1.9", "2.0b1"], ["2.0rc1", "2.0"]),
+        (">1.0", ["1.1", "1.0.1"], ["1.0", "1.0.post1", "1.0+local"]),
+        (">1.0.post1", ["1.0.post2"], ["1.0.post1", "1.0.post1+local"]),
+        ("===1.0", ["1.0"], ["1.0.0"]),
+        (">=1.0,!=1.5,<2", ["1.0", "1.9"], ["1.5", "2.0", "0.9"]),
+    ],
+)
+def test_compile_specifiers(specifier, matching, not_matching):
+    matches = compile_specifiers(parse_requirements([f"pkg{specifier}"])[0].specifiers)
+    for version in matching:
+        assert matches(version, prereleases=True), version
+    for version in not_matching + ["not a version"]:
+        assert not matches(version, prereleases=True), version
+
+
+def test_compile_specifiers_prereleases():
+    matches = compile_specifiers(((">=", "1.0"),))
+    assert not matches("2.0rc1")
+    assert matches("2.0rc1", prereleases=True)
+    # specifiers naming a pre-release allow them
+    assert compile_specifiers(((">=", "2.0rc1"),))("2.0rc2")
+
+
+@pytest.mark.parametrize(
+    "specifiers",
+    [
+        ((">=", "1.0.*"),),
+        (("~=", "1"),),
+        (("<", "1.0+local"),),
+        (("==", "bad"),),
+    ],
+)
+def test_compile_specifiers_invalid(specifiers):
+    with pytest.raises(ValueError):
+        compile_specifiers(specifiers)
+
+
+def test_compile_specifiers_cached():
+    specifiers = (("~=", "1.4"), ("!=", "1.4.2"))
+    assert compile_specifiers(specifiers) is compile_specifiers(specifiers)
+
+
+def test_filter_versions():
+    versions = ["1.0", "1.5rc1", "1.5", "2.0", "2.1a1", "bad"]
+    assert filter_versions((("<", "2"),), versions) == ["1.0", "1.5"]
+    assert filter_versions((("<", "2"),), versions, prereleases=True) == [
+        "1.0",
+        "1.5rc1",
+        "1.5",
+    ]
+    # pre-releases are only picked when nothing else matches
+    assert filter_versions(((">", "2.0"),), versions) == ["2.1a1"]
+    assert filter_versions((), versions[:3]) == ["1.0", "1.5"]
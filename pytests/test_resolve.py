@@ -0,0 +1,125 @@
+import io
+import json
+import subprocess
+import sys
+
+import pytest
+from test_wheelhouse import make_wheel
+
+from pru.cli import main
+from pru.core import resolve_requirements
+from pru.resolve import iter_report_packages, resolve_versions
+from pru.snapshot import InstalledPackage
+
+
+@pytest.fixture
+def find_links(tmp_path):
+    directory = tmp_path / "find-links"
+    directory.mkdir()
+    make_wheel(str(directory), "demo-pkg", "1.0")
+    make_wheel(str(directory), "demo-pkg", "1.1")
+    make_wheel(str(directory), "demo-app", "2.0", requires=["demo-pkg>=1.0"])
+    return str(directory)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 2**16])
+def test_iter_report_packages(chunk_size):
+    report = {
+        "version": "1",
+        "pip_version": "24.0",
+        "install": [
+            {
+                "download_info": {"url": "file:///a]b,c}.whl"},
+                "metadata": {
+                    "name": "Demo_App",
+                    "version": "2.0",
+                    "requires_dist": ["demo-pkg>=1.0"],
+                    "description": "x" * 100,
+                },
+            },
+            {"metadata": {"name": "demo-pkg", "version": "1.1"}},
+        ],
+        "environment": {"python_version": "3.12", "weight": 12345},
+    }
+    packages = list(
+        iter_report_packages(io.StringIO(json.dumps(report, indent=2)), chunk_size)
+    )
+    assert packages == [
+        InstalledPackage("Demo_App", "2.0", None, ("demo-pkg>=1.0",)),
+        InstalledPackage("demo-pkg", "1.1", None),
+    ]
+    assert list(iter_report_packages(io.StringIO('{"install": []}'), 3)) == []
+    assert list(iter_report_packages(io.StringIO("{}"))) == []
+
+
+@pytest.mark.parametrize("text", ["", "[]", '{"install": [{"metadata": {}', '{"a" 1}'])
+def test_iter_report_packages_invalid(text):
+    with pytest.raises(ValueError):
+        list(iter_report_packages(io.StringIO(text), 4))
+
+
+def test_resolve_versions(find_links):
+    index = resolve_versions(
+        ["demo-app", "demo-pkg<1.1"],
+        backend="pip",
+        find_links=[find_links],
+        no_index=True,
+    )
+    assert index == {
+        "demo-app": InstalledPackage("demo-app", "2.0", None, ("demo-pkg>=1.0",)),
+        "demo-pkg": InstalledPackage("demo-pkg", "1.0", None),
+    }
+    with pytest.raises(subprocess.CalledProcessError):
+        resolve_versions(
+            ["missing-pkg"], backend="pip", find_links=[find_links], no_index=True
+        )
+
+
+def test_resolve_requirements(tmp_path, find_links):
+    path = tmp_path / "requirements.txt"
+    path.write_text("demo-app>=1\n")
+    report = resolve_requirements(
+        str(path), backend="pip", find_links=[find_links], no_index=True, closure=True
+    )
+    assert report == {str(path): 2}
+    assert path.read_text().splitlines() == [
+        "demo-app==2.0",
+        "",
+        "# Transitive dependencies, pinned by pru --closure",
+        "demo-pkg==1.1",
+        "    # via demo-app",
+    ]
+
+
+def test_cli_resolve_only(tmp_path, monkeypatch, capsys, find_links):
+    path = tmp_path / "requirements.txt"
+    path.write_text("demo-app\ndemo-pkg~=1.0.0\n")
+    argv = ["pru", "-r", str(path), "--resolve-only", "--backend", "pip"]
+    argv += ["--no-index", "--find-links", find_links, "--respect-constraints"]
+    monkeypatch.setattr(sys, "argv", argv)
+    assert main() is None
+    assert capsys.readouterr().out.splitlines()[-1] == (
+        f"Pinned resolved versions in {path}"
+    )
+    assert path.read_text() == "demo-app==2.0\ndemo-pkg==1.0\n"
+
+    path.write_text("missing-pkg\n")
+    assert main() == 1
+    assert capsys.readouterr().err.splitlines()[-1] == (
+        "Resolver failed with exit code 1, requirements were not updated."
+    )
+    assert path.read_text() == "missing-pkg\n"
+
+
+def test_resolve_closure_with_uv(tmp_path, monkeypatch, capsys):
+    path = tmp_path / "requirements.txt"
+    path.write_text("demo-app\n")
+    with pytest.raises(ValueError, match="^closure cannot be used"):
+        resolve_requirements(str(path), backend="uv", closure=True)
+
+    argv = ["pru", "-r", str(path), "--resolve-only", "--backend", "uv"]
+    monkeypatch.setattr(sys, "argv", [*argv, "--closure"])
+    assert main() == 1
+    err = capsys.readouterr().err
+    assert "--closure cannot be used" in err and "--backend pip" in err
+    assert path.read_text() == "demo-app\n"
@@ -0,0 +1,275 @@
+import json
+import os
+import site
+import sys
+import threading
+
+import pytest
+
+from pru import snapshot
+from pru.snapshot import (
+    get_environment_site_packages,
+    invalidate_snapshot,
+    iter_installed_packages,
+    read_distribution_metadata,
+    refresh_environment_paths,
+    scan_installed_packages,
+)
+
+
+def make_dist_info(site_packages, name, version):
+    path = site_packages / f"{name.replace('-', '_')}-{version}.dist-info"
+    path.mkdir()
+    (path / "METADATA").write_text(
+        f"Metadata-Version: 2.1\nName: {name}\nVersion: {version}\n\nName: nope\n"
+    )
+    return path
+
+
+@pytest.fixture
+def site_packages(tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshot, "RACY_NS", 0)
+    path = tmp_path / "site-packages"
+    path.mkdir()
+    make_dist_info(path, "foo", "1.0")
+    make_dist_info(path, "Bar.Baz", "2.0")
+    (path / "legacy-0.1.egg-info").write_text("Name: legacy\nVersion: 0.1\n")
+    (path / "not_metadata").mkdir()
+    return path
+
+
+@pytest.fixture
+def read_calls(monkeypatch):
+    calls = []
+    read_metadata = snapshot._read_metadata
+
+    def counting_read_metadata(metadata_path):
+        calls.append(metadata_path)
+        return read_metadata(metadata_path)
+
+    monkeypatch.setattr(snapshot, "_read_metadata", counting_read_metadata)
+    return calls
+
+
+def test_read_distribution_metadata(site_packages):
+    path = site_packages / "foo-1.0.dist-info"
+    assert read_distribution_metadata(str(path)) == ("foo", "1.0")
+    path = site_packages / "legacy-0.1.egg-info"
+    assert read_distribution_metadata(str(path)) == ("legacy", "0.1")
+
+
+def test_scan_installed_packages(site_packages, tmp_path):
+    snapshot_path = str(tmp_path / "snapshot.json")
+    index = scan_installed_packages([str(site_packages)], snapshot_path)
+    assert sorted(index) == ["bar-baz", "foo", "legacy"]
+    assert index["bar-baz"].name == "Bar.Baz"
+    assert index["bar-baz"].version == "2.0"
+    assert index["foo"].path == str(site_packages / "foo-1.0.dist-info")
+
+
+def test_scan_installed_packages_incremental(site_packages, tmp_path, read_calls):
+    snapshot_path = str(tmp_path / "snapshot.json")
+    scan_installed_packages([str(site_packages)], snapshot_path)
+    assert len(read_calls) == 3
+
+    # unchanged directory is reused without reading metadata
+    del read_calls[:]
+    scan_installed_packages([str(site_packages)], snapshot_path)
+    assert read_calls == []
+
+    # only added entries are read, removed entries are dropped
+    make_dist_info(site_packages, "qux", "3.0")
+    os.remove(site_packages / "legacy-0.1.egg-info")
+    index = scan_installed_packages([str(site_packages)], snapshot_path)
+    assert [os.path.basename(os.path.dirname(p)) for p in read_calls] == [
+        "qux-3.0.dist-info"
+    ]
+    assert sorted(index) == ["bar-baz", "foo", "qux"]
+
+
+def test_iter_installed_packages(site_packages, tmp_path, read_calls):
+    snapshot_path = str(tmp_path / "snapshot.json")
+    other = tmp_path / "other"
+    other.mkdir()
+    make_dist_info(other, "foo", "0.1")
+    make_dist_info(other, "extra", "1.0")
+    paths = [str(site_packages), str(other)]
+
+    # packages are yielded as they are read, the snapshot on completion
+    iterator = iter_installed_packages(paths, snapshot_path)
+    next(iterator)
+    assert len(read_calls) == 1
+    iterator.close()
+    assert not os.path.exists(snapshot_path)
+
+    packages = list(iter_installed_packages(paths, snapshot_path))
+    assert sorted(package.name for package in packages) == [
+        "Bar.Baz",
+        "extra",
+        "foo",
+        "legacy",
+    ]
+    index = scan_installed_packages(paths, snapshot_path)
+    assert sorted(packages) == sorted(index.values())
+
+    del read_calls[:]
+    assert list(iter_installed_packages(paths, snapshot_path)) == packages
+    assert read_calls == []
+
+
+def test_scan_installed_packages_threads(site_packages, tmp_path, monkeypatch):
+    # every chunk of entries is considered slow, so read in the thread pool
+    monkeypatch.setattr(snapshot, "_CHUNK_SIZE", 1)
+    monkeypatch.setattr(snapshot, "_SLOW_ENTRY_SECONDS", 0)
+    threads = set()
+    read_metadata = snapshot._read_metadata
+
+    def recording_read_metadata(metadata_path):
+        threads.add(threading.get_ident())
+        return read_metadata(metadata_path)
+
+    monkeypatch.setattr(snapshot, "_read_metadata", recording_read_metadata)
+    other = tmp_path / "other"
+    other.mkdir()
+    make_dist_info(other, "foo", "0.1")
+    make_dist_info(other, "extra", "1.0")
+    paths = [str(site_packages), str(tmp_path / "missing"), str(other)]
+
+    index = scan_installed_packages(paths, use_cache=False, max_workers=4)
+    assert threading.get_ident() not in threads
+    threads.clear()
+    assert scan_installed_packages(paths, use_cache=False, max_workers=1) == index
+    assert threads == {threading.get_ident()}
+    assert sorted(index) == ["bar-baz", "extra", "foo", "legacy"]
+    assert index["foo"].version == "1.0"
+
+
+def test_get_environment_site_packages(tmp_path):
+    venv = tmp_path / "venv"
+    path = venv / "lib" / "python3.12" / "site-packages"
+    path.mkdir(parents=True)
+    (venv / "lib64").symlink_to("lib")
+    assert get_environment_site_packages(str(venv)) == [str(path)]
+
+    windows = tmp_path / "windows"
+    (windows / "Lib" / "site-packages").mkdir(parents=True)
+    assert get_environment_site_packages(str(windows)) == [
+        str(windows / "Lib" / "site-packages")
+    ]
+    with pytest.raises(ValueError, match="No site-packages"):
+        get_environment_site_packages(str(tmp_path / "missing"))
+
+
+def test_invalidate_snapshot(site_packages, tmp_path, read_calls):
+    snapshot_path = str(tmp_path / "snapshot.json")
+    scan_installed_packages([str(site_packages)], snapshot_path)
+
+    # an in-place metadata rewrite does not change the directory mtime
+    stat = os.stat(site_packages)
+    metadata = site_packages / "foo-1.0.dist-info" / "METADATA"
+    metadata.write_text("Name: foo\nVersion: 1.1\n")
+    os.utime(metadata, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    os.utime(site_packages, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+    del read_calls[:]
+    invalidate_snapshot(snapshot_path)
+    index = scan_installed_packages([str(site_packages)], snapshot_path)
+    assert index["foo"].version == "1.1"
+    assert len(read_calls) == 1
+
+
+def test_scan_installed_packages_keeps_directories(site_packages, tmp_path):
+    snapshot_path = tmp_path / "snapshot.json"
+    other = tmp_path / "other"
+    other.mkdir()
+    make_dist_info(other, "qux", "3.0")
+    scan_installed_packages([str(site_packages), str(other)], str(snapshot_path))
+
+    # e.g. a scan of the previous working directory, or of another --env
+    scan_installed_packages([str(site_packages)], str(snapshot_path))
+    list(iter_installed_packages([str(site_packages)], str(snapshot_path)))
+    data = json.loads(snapshot_path.read_text())
+    assert sorted(data["dirs"]) == [str(other), str(site_packages)]
+
+    # directories unused for a while are dropped on the next write
+    data["used"] = dict.fromkeys(data["used"], 0)
+    snapshot_path.write_text(json.dumps(data))
+    scan_installed_packages([str(site_packages)], str(snapshot_path))
+    data = json.loads(snapshot_path.read_text())
+    assert list(data["dirs"]) == [str(site_packages)]
+    assert list(data["used"]) == [str(site_packages)]
+
+
+def test_scan_installed_packages_requires(site_packages, tmp_path):
+    path = site_packages / "app-1.0.dist-info"
+    path.mkdir()
+    (path / "METADATA").write_text(
+        "Name: app\nVersion: 1.0\nRequires-Dist: foo>=1.0\n"
+        "Requires-Dist: bar ; extra == 'x'\n\nRequires-Dist: nope\n"
+    )
+    path = site_packages / "old-1.0.egg-info"
+    path.mkdir()
+    (path / "PKG-INFO").write_text("Name: old\nVersion: 1.0\n")
+    (path / "requires.txt").write_text(
+        "foo\n\n[x]\nbar\n\n[:python_version < '3']\nbaz\n"
+    )
+    index = scan_installed_packages([str(site_packages)], str(tmp_path / "s.json"))
+    assert index["app"].requires == ("foo>=1.0", "bar ; extra == 'x'")
+    assert index["old"].requires == (
+        "foo",
+        'bar ; extra == "x"',
+        "baz ; (python_version < '3')",
+    )
+    assert index["foo"].requires == ()
+    cached = scan_installed_packages([str(site_packages)], str(tmp_path / "s.json"))
+    assert cached == index
+
+
+def test_scan_installed_packages_folded_headers(site_packages, tmp_path):
+    path = site_packages / "folded-1.0.dist-info"
+    path.mkdir()
+    (path / "METADATA").write_text(
+        "Name: folded\nVersion: 1.0\nLicense: BSD 3-Clause License\n"
+        "        \n        Copyright (c) 2008\n        \t\n"
+        "Requires-Dist: numpy>=1.22\nRequires-Dist: python-dateutil\n"
+        "\nRequires-Dist: nope\n"
+    )
+    index = scan_installed_packages([str(site_packages)], str(tmp_path / "s.json"))
+    assert index["folded"].requires == ("numpy>=1.22", "python-dateutil")
+
+
+def test_read_top_level(site_packages, tmp_path):
+    path = site_packages / "pkg-1.0.dist-info"
+    path.mkdir()
+    (path / "METADATA").write_text("Name: pkg\nVersion: 1.0\n")
+    (path / "RECORD").write_text(
+        "pkg/__init__.py,,\n_pkg_c.cpython-313-x86_64-linux-gnu.so,,\n"
+        "single.py,,\npkg-1.0.dist-info/RECORD,,\n../../bin/pkg,,\n"
+    )
+    assert snapshot.read_top_level(str(path)) == ["_pkg_c", "pkg", "single"]
+    (path / "top_level.txt").write_text("pkg\nnot-a-module\n")
+    assert snapshot.read_top_level(str(path)) == ["pkg"]
+
+    index = scan_installed_packages([str(site_packages)], str(tmp_path / "s.json"))
+    assert index["pkg"].top_level == ("pkg",)
+    assert index["foo"].top_level == ()
+
+
+def test_refresh_environment_paths(tmp_path, monkeypatch):
+    user_site = tmp_path / "user-site"
+    monkeypatch.setattr(sys, "path", list(sys.path))
+    monkeypatch.setattr(site, "ENABLE_USER_SITE", True)
+    monkeypatch.setattr(site, "USER_SITE", str(user_site))
+    monkeypatch.setattr(site, "getsitepackages", lambda: [])
+    assert refresh_environment_paths() == []
+
+    # created by a first `pip install --user`, with an editable install
+    user_site.mkdir()
+    (tmp_path / "src").mkdir()
+    (user_site / "editable.pth").write_text(
+        "# comment\n../src\nimport sys; sys.exit(1)\nmissing\n"
+    )
+    added = refresh_environment_paths()
+    assert added == [str(user_site), str(user_site / ".." / "src")]
+    assert sys.path[-2:] == added
+    assert refresh_environment_paths() == []
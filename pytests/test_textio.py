@@ -0,0 +1,77 @@
+import codecs
+
+import pytest
+
+from pru.textio import (
+    DEFAULT_FORMAT,
+    TextFormat,
+    iter_lines,
+    read_lines,
+    sniff_encoding,
+    write_lines,
+)
+
+
+@pytest.mark.parametrize(
+    "head, expected",
+    [
+        (b"", ("utf-8", 0)),
+        (b"n", ("utf-8", 0)),
+        (b"numpy", ("utf-8", 0)),
+        (codecs.BOM_UTF8 + b"nu", ("utf-8", 3)),
+        (codecs.BOM_UTF16_LE + b"n\x00", ("utf-16-le", 2)),
+        (codecs.BOM_UTF16_BE + b"\x00n", ("utf-16-be", 2)),
+        (codecs.BOM_UTF32_LE, ("utf-32-le", 4)),
+        (codecs.BOM_UTF32_BE, ("utf-32-be", 4)),
+        (b"n\x00u\x00", ("utf-16-le", 0)),
+        (b"\x00n\x00u", ("utf-16-be", 0)),
+    ],
+)
+def test_sniff_encoding(head, expected):
+    assert sniff_encoding(head) == expected
+
+
+@pytest.mark.parametrize("encoding", ["utf-8", "utf-16-le", "utf-16-be", "utf-32-le"])
+@pytest.mark.parametrize("bom", [True, False])
+@pytest.mark.parametrize("newline", ["\n", "\r\n"])
+def test_round_trip(tmp_path, encoding, bom, newline):
+    if encoding == "utf-32-le" and not bom:
+        pytest.skip("UTF-32 is only detected with a BOM")
+    path = tmp_path / "requirements.txt"
+    text = f"numpy==2.0{newline}# café €{newline}pandas"
+    data = text.encode(encoding)
+    if bom:
+        data = "\ufeff".encode(encoding) + data
+    path.write_bytes(data)
+
+    lines, text_format = read_lines(str(path))
+    assert lines == ["numpy==2.0\n", "# café €\n", "pandas"]
+    assert text_format == TextFormat(encoding, bom, newline)
+    assert list(iter_lines(str(path))) == lines
+
+    lines[0] = "numpy==2.1\n"
+    write_lines(str(path), lines, text_format)
+    assert path.read_bytes() == data.replace(
+        "2.0".encode(encoding), "2.1".encode(encoding)
+    )
+
+
+def test_invalid_utf8_is_kept(tmp_path):
+    path = tmp_path / "requirements.txt"
+    data = b"numpy  # caf\xe9\r\nscipy\r\n"
+    path.write_bytes(data)
+    lines, text_format = read_lines(str(path))
+    assert lines[1] == "scipy\n"
+    write_lines(str(path), lines, text_format)
+    assert path.read_bytes() == data
+
+
+def test_empty_and_new_files(tmp_path):
+    path = tmp_path / "requirements.txt"
+    path.write_bytes(b"")
+    assert read_lines(str(path)) == ([], DEFAULT_FORMAT)
+    assert list(iter_lines(str(path))) == []
+
+    path = tmp_path / "new.txt"
+    write_lines(str(path), ["numpy==2.0\n"])
+    assert path.read_bytes() == b"numpy==2.0\n"
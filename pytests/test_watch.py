@@ -0,0 +1,140 @@
+import queue
+import shutil
+import threading
+
+import pytest
+
+from pru import snapshot
+from pru.parser import RequirementsFile
+from pru.snapshot import InstalledPackage
+from pru.watch import (
+    InotifyWatcher,
+    PollingWatcher,
+    create_watcher,
+    get_changed_packages,
+    get_edited_packages,
+    get_site_packages_dirs,
+    wait_for_changes,
+    watch_requirements,
+)
+
+
+def has_inotify():
+    try:
+        InotifyWatcher().close()
+    except OSError:
+        return False
+    return True
+
+
+def install(site_packages, name, version):
+    path = site_packages / f"{name}-{version}.dist-info"
+    path.mkdir()
+    (path / "METADATA").write_text(f"Name: {name}\nVersion: {version}\n")
+    return path
+
+
+@pytest.fixture(
+    params=[
+        True,
+        pytest.param(
+            False,
+            marks=pytest.mark.skipif(not has_inotify(), reason="no inotify"),
+        ),
+    ],
+    ids=["polling", "inotify"],
+)
+def polling(request):
+    return request.param
+
+
+@pytest.fixture
+def site_packages(tmp_path, monkeypatch):
+    snapshot_path = str(tmp_path / "snapshot.json")
+    monkeypatch.setattr(snapshot, "get_snapshot_path", lambda: snapshot_path)
+    path = tmp_path / "site-packages"
+    path.mkdir()
+    install(path, "foo", "1.0")
+    return path
+
+
+def test_get_site_packages_dirs(site_packages, tmp_path):
+    (tmp_path / "src").mkdir()
+    paths = [str(site_packages), str(tmp_path / "src"), str(tmp_path / "missing")]
+    assert get_site_packages_dirs(paths) == [str(site_packages)]
+
+
+def test_get_changed_packages():
+    previous = {
+        "foo": InstalledPackage("foo", "1.0", None),
+        "bar": InstalledPackage("bar", "1.0", None),
+    }
+    current = {
+        "foo": InstalledPackage("foo", "2.0", None),
+        "baz": InstalledPackage("baz", "1.0", None),
+    }
+    assert get_changed_packages(previous, current) == {"foo", "bar", "baz"}
+    assert get_changed_packages(previous, previous) == set()
+
+
+def test_get_edited_packages():
+    previous = {"r.txt": ["foo==1.0\n", "bar\n"]}
+    current = {"r.txt": RequirementsFile("r.txt", ["bar\n", "Foo_Baz\n", "-e .\n"])}
+    assert get_edited_packages(previous, current) == {"foo-baz"}
+
+
+def test_wait_for_changes(tmp_path, polling):
+    path = tmp_path / "requirements.txt"
+    path.write_text("foo\n")
+    with create_watcher(polling, interval=0.01) as watcher:
+        assert isinstance(watcher, PollingWatcher) == polling
+        watcher.add_directory(str(tmp_path))
+        watcher.add_file(str(path))
+        stop_event = threading.Event()
+        stop_event.set()
+        assert wait_for_changes(watcher, 0.1, stop_event) is None
+
+        path.write_text("foo\nbar\n")
+        (tmp_path / "foo-1.0.dist-info").mkdir()
+        assert wait_for_changes(watcher, 0.1) == {str(tmp_path), str(path)}
+
+
+def test_watch_requirements(site_packages, tmp_path, polling):
+    path = tmp_path / "requirements.txt"
+    path.write_text("foo\nbar==0.1  # pinned by hand\n")
+    reports = queue.Queue()
+    stop_event = threading.Event()
+    thread = threading.Thread(
+        target=watch_requirements,
+        args=(str(path),),
+        kwargs={
+            "paths": [str(site_packages)],
+            "debounce": 0.2,
+            "polling": polling,
+            "interval": 0.01,
+            "callback": reports.put,
+            "stop_event": stop_event,
+        },
+    )
+    thread.start()
+    try:
+        assert reports.get(timeout=10) == {str(path): 1}
+        assert path.read_text() == "foo==1.0\nbar==0.1  # pinned by hand\n"
+
+        # a bulk install is pinned once
+        shutil.rmtree(site_packages / "foo-1.0.dist-info")
+        install(site_packages, "foo", "2.0")
+        install(site_packages, "bar", "0.2")
+        install(site_packages, "baz", "3.0")
+        assert reports.get(timeout=10) == {str(path): 2}
+        assert path.read_text() == "foo==2.0\nbar==0.2  # pinned by hand\n"
+
+        # only edited lines are pinned
+        path.write_text("foo>=1\nbar==0.1\nbaz\n")
+        assert reports.get(timeout=10) == {str(path): 3}
+        assert path.read_text() == "foo==2.0\nbar==0.2\nbaz==3.0\n"
+    finally:
+        stop_event.set()
+        thread.join(timeout=10)
+    assert not thread.is_alive()
+    assert reports.empty()
@@ -0,0 +1,132 @@
+import os
+import shlex
+import site
+import subprocess
+import sys
+import zipfile
+
+import pytest
+
+from pru.core import upgrade_requirements
+from pru.wheelhouse import (
+    add_to_wheelhouse,
+    get_find_links_dir,
+    get_wheelhouse_dir,
+    prefetch_wheels,
+)
+
+
+def make_wheel(directory, name, version, requires=()):
+    module = name.replace("-", "_")
+    dist_info = f"{module}-{version}.dist-info"
+    metadata = f"Metadata-Version: 2.1\nName: {name}\nVersion: {version}\n"
+    metadata += "".join(f"Requires-Dist: {requirement}\n" for requirement in requires)
+    files = {
+        f"{module}/__init__.py": "",
+        f"{dist_info}/METADATA": metadata,
+        f"{dist_info}/WHEEL": (
+            "Wheel-Version: 1.0\nGenerator: test\nRoot-Is-Purelib: true\n"
+            "Tag: py3-none-any\n"
+        ),
+    }
+    files[f"{dist_info}/RECORD"] = "".join(f"{path},,\n" for path in files) + (
+        f"{dist_info}/RECORD,,\n"
+    )
+    path = os.path.join(directory, f"{module}-{version}-py3-none-any.whl")
+    with zipfile.ZipFile(path, "w") as f:
+        for archive_name, content in files.items():
+            f.writestr(archive_name, content)
+    return path
+
+
+@pytest.fixture
+def find_links(tmp_path):
+    directory = tmp_path / "find-links"
+    directory.mkdir()
+    make_wheel(str(directory), "demo-pkg", "1.0")
+    make_wheel(str(directory), "demo-app", "2.0", requires=["demo-pkg>=1.0"])
+    return str(directory)
+
+
+def test_get_wheelhouse_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("PRU_WHEELHOUSE", str(tmp_path / "wh"))
+    assert get_wheelhouse_dir() == str(tmp_path / "wh")
+    assert get_find_links_dir() == str(tmp_path / "wh" / "files")
+    assert get_wheelhouse_dir("other") == os.path.abspath("other")
+
+
+def test_add_to_wheelhouse(tmp_path, find_links):
+    wheelhouse = str(tmp_path / "wh")
+    digests = set()
+    for _ in range(2):
+        path = make_wheel(str(tmp_path), "demo-pkg", "1.0")
+        digests.add(add_to_wheelhouse(path, wheelhouse))
+        assert not os.path.exists(path)
+    (digest,) = digests
+    assert os.listdir(get_find_links_dir(wheelhouse)) == [
+        "demo_pkg-1.0-py3-none-any.whl"
+    ]
+    assert os.path.isfile(
+        os.path.join(wheelhouse, "objects", "sha256", digest[:2], digest)
+    )
+
+
+def test_prefetch_wheels(tmp_path, find_links):
+    wheelhouse = str(tmp_path / "wh")
+    download_args = ["--no-index", "--find-links", find_links]
+    digests = prefetch_wheels(
+        ["demo-app", "demo-pkg"], wheelhouse, max_workers=2, download_args=download_args
+    )
+    assert sorted(digests) == [
+        "demo_app-2.0-py3-none-any.whl",
+        "demo_pkg-1.0-py3-none-any.whl",
+    ]
+    assert sorted(os.listdir(get_find_links_dir(wheelhouse))) == sorted(digests)
+    assert os.listdir(os.path.join(wheelhouse, "tmp")) == []
+
+    with pytest.raises(subprocess.CalledProcessError):
+        prefetch_wheels(["missing-pkg"], wheelhouse, download_args=download_args)
+
+
+def test_upgrade_requirements_prefetch(tmp_path, find_links, monkeypatch, capfd):
+    # pip reads its options from the environment, so downloads stay offline
+    monkeypatch.setenv("PIP_NO_INDEX", "1")
+    monkeypatch.setenv("PIP_FIND_LINKS", find_links)
+    requirements = tmp_path / "requirements.txt"
+    requirements.write_text("demo-app\n")
+    wheelhouse = str(tmp_path / "wh")
+    upgrade_requirements(
+        str(requirements), command="echo install", prefetch=True, wheelhouse=wheelhouse
+    )
+    files_dir = get_find_links_dir(wheelhouse)
+    assert capfd.readouterr().out.splitlines()[-1] == (
+        f"install --no-index --find-links {files_dir} demo-app"
+    )
+    assert len(os.listdir(files_dir)) == 2
+
+
+def test_upgrade_requirements_new_site_directory(tmp_path, find_links, monkeypatch):
+    # the user site-packages is created by the install, after startup
+    user_site = tmp_path / "user-site"
+    monkeypatch.setattr(sys, "path", list(sys.path))
+    monkeypatch.setattr(site, "ENABLE_USER_SITE", True)
+    monkeypatch.setattr(site, "USER_SITE", str(user_site))
+    script = tmp_path / "install.py"
+    script.write_text(
+        "import glob, os, sys, zipfile\n"
+        "find_links, target = sys.argv[1:3]\n"
+        "os.makedirs(target)\n"
+        "for name in sys.argv[3:]:\n"
+        "    pattern = os.path.join(find_links, name.replace('-', '_') + '-*.whl')\n"
+        "    for wheel in glob.glob(pattern):\n"
+        "        zipfile.ZipFile(wheel).extractall(target)\n"
+    )
+    command = " ".join(
+        shlex.quote(str(arg)) for arg in (sys.executable, script, find_links, user_site)
+    )
+    requirements = tmp_path / "requirements.txt"
+    requirements.write_text("demo-pkg>=0.5\n")
+    report, held_back = upgrade_requirements(str(requirements), command=command)
+    assert report == {str(requirements): 1}
+    assert held_back == []
+    assert requirements.read_text() == "demo-pkg==1.0\n"
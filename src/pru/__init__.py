@@ -1,25 +1,77 @@
 from .core import (
+    ConstraintViolation,
+    PruSession,
+    RequirementsPlan,
+    UpgradeResult,
+    expand_requirements_paths,
+    get_installed_packages_index,
     get_installed_packages_name,
     get_installed_packages_name_and_version,
     get_installed_requirements_packages_and_version,
     get_package_version,
     get_requirements_packages_name,
+    iter_installed_packages,
+    load_requirements_graph,
+    plan_requirements_versions,
     read_requirements,
     replace_requirements_packages_versions,
+    resolve_requirements,
+    run_subprocess_async,
+    run_subprocesses,
     upgrade_installed,
     upgrade_requirements,
     verbose_subprocess,
+    write_requirements_plans,
 )
+from .parser import Requirement, RequirementsFile, parse_requirements
+from .utils import canonicalize_name
+
+# imported on first access, so `import pru` does not load the modules of the
+# audit-imports, outdated and watch commands
+_LAZY_ATTRIBUTES = {
+    "audit_imports": "imports",
+    "get_outdated_packages": "index",
+    "watch_requirements": "watch",
+}
 
 __all__ = [
+    "ConstraintViolation",
+    "PruSession",
+    "Requirement",
+    "RequirementsFile",
+    "RequirementsPlan",
+    "UpgradeResult",
+    "audit_imports",
+    "canonicalize_name",
+    "expand_requirements_paths",
+    "get_installed_packages_index",
     "get_installed_packages_name",
     "get_installed_packages_name_and_version",
     "get_installed_requirements_packages_and_version",
+    "get_outdated_packages",
     "get_package_version",
     "get_requirements_packages_name",
+    "iter_installed_packages",
+    "load_requirements_graph",
+    "parse_requirements",
+    "plan_requirements_versions",
     "read_requirements",
     "replace_requirements_packages_versions",
+    "resolve_requirements",
+    "run_subprocess_async",
+    "run_subprocesses",
     "upgrade_installed",
     "upgrade_requirements",
     "verbose_subprocess",
+    "watch_requirements",
+    "write_requirements_plans",
 ]
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        from importlib import import_module
+
+        module = import_module(f".{_LAZY_ATTRIBUTES[name]}", __name__)
+        return getattr(module, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,128 @@
+"""Installer backend resolution.
+
+Detecting `uv` requires spawning a process, so it is only done when an
+installer command is actually needed. The result is memoized per process and
+cached on disk, keyed by the resolved `uv` executable path and its mtime, so
+that replacing or upgrading `uv` invalidates the cached answer.
+"""
+
+import os
+import shutil
+from subprocess import DEVNULL, run
+
+from pru.cache import get_cache_dir, load_json_cache, store_json_cache
+from pru.instrument import phase
+
+BACKENDS = ("uv", "pip")
+
+UPGRADE_COMMANDS = {
+    "uv": "uv pip install --upgrade",
+    "pip": "pip install --upgrade --user",
+}
+
+_UV_PROBES = {}
+
+
+def _probe_uv(executable):
+    try:
+        with phase("uv_probe", executable=executable):
+            run([executable, "--version"], stdout=DEVNULL, stderr=DEVNULL, check=True)
+    except Exception:
+        return False
+    return True
+
+
+def is_uv_available():
+    """
+    Check whether a working `uv` executable is available on PATH.
+
+    Returns
+    -------
+    bool
+        True if `uv --version` succeeds.
+
+    Notes
+    -----
+    - The probe result is memoized per process and cached in
+      `get_cache_dir("backend.json")`, keyed by the resolved executable path
+      and its mtime.
+    """
+
+    executable = shutil.which("uv")
+    if executable is None:
+        return False
+    executable = os.path.realpath(executable)
+    try:
+        mtime = os.stat(executable).st_mtime_ns
+    except OSError:
+        return False
+
+    key = f"{executable}:{mtime}"
+    if key in _UV_PROBES:
+        return _UV_PROBES[key]
+
+    cache_path = get_cache_dir("backend.json")
+    cache = load_json_cache(cache_path, {})
+    if not isinstance(cache, dict):
+        cache = {}
+    if key in cache:
+        result = bool(cache[key])
+    else:
+        result = _probe_uv(executable)
+        # drop stale entries of the same executable
+        cache = {k: v for k, v in cache.items() if k.rpartition(":")[0] != executable}
+        cache[key] = result
+        store_json_cache(cache_path, cache)
+
+    _UV_PROBES[key] = result
+    return result
+
+
+def resolve_backend(backend=None):
+    """
+    Resolve the installer backend to use.
+
+    Parameters
+    ----------
+    backend : str or None, optional
+        Either "uv" or "pip". If None, uses "uv" when available, otherwise
+        falls back to "pip".
+
+    Returns
+    -------
+    str
+        The resolved backend name.
+
+    Raises
+    ------
+    ValueError
+        If `backend` is not a supported backend.
+    """
+
+    if backend is None:
+        return "uv" if is_uv_available() else "pip"
+    if backend not in BACKENDS:
+        raise ValueError(
+            f"Unknown backend {backend!r}. Use one of: {', '.join(BACKENDS)}."
+        )
+    return backend
+
+
+def get_upgrade_command(backend=None):
+    """
+    Get the default upgrade command of an installer backend.
+
+    Parameters
+    ----------
+    backend : str or None, optional
+        Either "uv" or "pip". If None, the backend is detected with
+        `resolve_backend`.
+
+    Returns
+    -------
+    str
+        "uv pip install --upgrade" for uv, "pip install --upgrade --user" for
+        pip.
+    """
+
+    return UPGRADE_COMMANDS[resolve_backend(backend)]
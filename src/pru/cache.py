@@ -0,0 +1,183 @@
+import json
+import os
+import sys
+import time
+
+from pru.utils import atomic_write
+
+# seconds after which unused cache entries are dropped
+MAX_AGE = 30 * 24 * 3600
+
+# granularity of the last use times of cache entries, in seconds
+USED_RESOLUTION = 24 * 3600
+
+
+def get_cache_dir(*parts):
+    """
+    Get the path of the pru cache directory.
+
+    The location can be overridden with the `PRU_CACHE_DIR` environment
+    variable. Otherwise it follows the platform conventions: `%LOCALAPPDATA%`
+    on Windows, `~/Library/Caches` on macOS, and `$XDG_CACHE_HOME` (or
+    `~/.cache`) elsewhere.
+
+    Parameters
+    ----------
+    *parts : str
+        Optional path components joined to the cache directory.
+
+    Returns
+    -------
+    str
+        Path inside the cache directory. The directory is not created.
+    """
+
+    root = os.environ.get("PRU_CACHE_DIR")
+    if not root:
+        if sys.platform == "win32":
+            base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+        elif sys.platform == "darwin":
+            base = os.path.expanduser(os.path.join("~", "Library", "Caches"))
+        else:
+            base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser(
+                os.path.join("~", ".cache")
+            )
+        root = os.path.join(base, "pru")
+    return os.path.join(root, *parts)
+
+
+def load_json_cache(path, default=None):
+    """
+    Load a JSON cache file.
+
+    Parameters
+    ----------
+    path : str
+        Path to the cache file.
+    default : object, optional
+        Value returned when the file is missing or unreadable.
+
+    Returns
+    -------
+    object
+        Decoded JSON content, or `default`.
+    """
+
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def touch_cache_entries(used, keys, now=None):
+    """
+    Record that entries of a cache were used.
+
+    Last use times are only updated once per `USED_RESOLUTION`, so a cache
+    that was only read does not need to be written back on every run.
+
+    Parameters
+    ----------
+    used : dict
+        Dictionary of {key: last_use_seconds} of the cache, modified in place.
+    keys : iterable
+        Keys of the entries used by this run.
+    now : float or None, optional
+        Current time, in seconds since the epoch. If None, uses `time.time()`.
+
+    Returns
+    -------
+    bool
+        True if a last use time was updated, and the cache should be written.
+    """
+
+    if now is None:
+        now = time.time()
+    touched = False
+    for key in keys:
+        if now - used.get(key, 0) >= USED_RESOLUTION:
+            used[key] = now
+            touched = True
+    return touched
+
+
+def prune_cache_entries(entries, used, max_entries=None, max_age=None, now=None):
+    """
+    Drop the least recently used entries of a cache.
+
+    Caches shared by many projects or environments keep the entries of every
+    one of them, until they are unused for `max_age` seconds, or until the
+    cache holds more than `max_entries` entries.
+
+    Parameters
+    ----------
+    entries : dict
+        Cache entries, modified in place.
+    used : dict
+        Dictionary of {key: last_use_seconds}, see `touch_cache_entries`,
+        modified in place. Entries without a last use time are considered
+        used now.
+    max_entries : int or None, optional
+        Maximum number of entries kept. If None, only `max_age` applies.
+    max_age : float or None, optional
+        Seconds after which an unused entry is dropped. If None, uses
+        `MAX_AGE`.
+    now : float or None, optional
+        Current time, in seconds since the epoch. If None, uses `time.time()`.
+
+    Returns
+    -------
+    bool
+        True if entries were dropped.
+    """
+
+    if now is None:
+        now = time.time()
+    if max_age is None:
+        max_age = MAX_AGE
+    for key in list(used):
+        if key not in entries:
+            del used[key]
+    for key in entries:
+        used.setdefault(key, now)
+    stale = [key for key in entries if now - used[key] > max_age]
+    if max_entries is not None and len(entries) - len(stale) > max_entries:
+        kept = sorted(
+            (key for key in entries if now - used[key] <= max_age),
+            key=used.__getitem__,
+        )
+        stale.extend(kept[: len(kept) - max_entries])
+    for key in stale:
+        del entries[key]
+        del used[key]
+    return bool(stale)
+
+
+def store_json_cache(path, data):
+    """
+    Store data into a JSON cache file.
+
+    The file is written to a temporary file first and then renamed, so
+    concurrent readers never see a partial cache. Failures are ignored, since
+    a cache that cannot be written only costs a rescan on the next run.
+
+    Parameters
+    ----------
+    path : str
+        Path to the cache file.
+    data : object
+        JSON serializable data.
+
+    Returns
+    -------
+    bool
+        True if the cache was written.
+    """
+
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        atomic_write(path, json.dumps(data, separators=(",", ":")), encoding="utf-8")
+    except OSError:
+        return False
+    return True
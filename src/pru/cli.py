@@ -9,32 +9,850 @@ Supported commands:
   versions.
 - upgrade_requirements: Upgrade packages and write pinned versions to
   `requirements.txt`.
+- matrix: Run upgrade_requirements with many interpreters concurrently.
+- outdated: List packages with a newer version on the package index.
+- audit-imports: Compare the imports of a source tree with the requirements.
+- watch: Pin installed versions again whenever packages or files change.
 
 The CLI automatically detects and uses `uv` when available for faster package
 installation and upgrades. If `uv` is not installed, it falls back to using
-standard `pip`.
+standard `pip`. Use `--backend` to choose explicitly. Detection only happens
+when an installer command is needed.
 
 Examples:
     # Upgrade requirements (auto-detects uv)
     $ pru -r requirements.txt
 
+    # Explicit backend
+    $ pru -r requirements.txt --backend pip
+
     # Explicit command
     $ pru -r requirements.txt upgrade_requirements --cmd "uv pip install --upgrade"
 
     # Replace versions without upgrading
     $ pru -r requirements.txt replace_versions
+
+    # Show what would change, without writing (exit code 1 if pending)
+    $ pru -r requirements.txt replace_versions --diff
+
+    # Also pin files included with -r and -c
+    $ pru -r requirements.txt --recursive
+
+    # Upgrade many files with a single installer run
+    $ pru -r requirements.txt -r 'services/*/requirements.txt'
+
+    # Download concurrently into a shared wheelhouse, then install offline
+    $ pru -r requirements.txt --prefetch -j 8
+
+    # Pin with hashes of the prefetched wheels
+    $ pru -r requirements.txt --prefetch --hashes
+
+    # List outdated packages, without installing anything
+    $ pru -r requirements.txt outdated --index-url http://localhost:8000/simple/
+
+    # Keep requirements pinned while installing packages (Ctrl+C to stop)
+    $ pru -r requirements.txt watch
+
+    # Find requirements never imported, and imports missing from requirements
+    $ pru -r requirements.txt audit-imports src
+
+    # Upgrade per-version files with many virtual environments concurrently
+    $ pru matrix -p env3.12 -p env3.13 -r 'requirements/3_{minor}/requirements.txt'
+
+    # Pin against another virtual environment, without activating it
+    $ pru -r project/requirements.txt replace_versions --env project/.venv
+
+    # Stream installed packages as JSON lines (or csv, json)
+    $ pru print_installed --format jsonl --match 'django*'
+
+    # Print the time spent in each phase, or record a Chrome trace
+    $ pru -r requirements.txt --timings
+    $ pru -r requirements.txt --profile trace.json
 """
 
 import argparse
+import csv
+import json
+import sys
+from subprocess import CalledProcessError, TimeoutExpired
 
+from pru.backend import BACKENDS, resolve_backend
 from pru.core import (
-    get_installed_packages_name_and_version,
-    get_installed_requirements_packages_and_version,
-    replace_requirements_packages_versions,
-    upgrade_requirements,
+    PruSession,
+    get_installed_packages_index,
+    iter_installed_packages,
+    match_package_name,
 )
+from pru.instrument import PhaseTimer
+from pru.snapshot import get_environment_site_packages, get_snapshot_path
 from pru.version import __version__
 
+# The modules of the other commands are imported by the functions running
+# them, so `pru --version` and the common commands do not load them.
+
+
+def get_scan_paths(args):
+    """
+    Get the directories to scan for installed packages.
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        Parsed CLI arguments.
+
+    Returns
+    -------
+    list of str or None
+        The site-packages directories of every `--env`, followed by the
+        `--site-packages` directories, or None to scan `sys.path`.
+
+    Raises
+    ------
+    ValueError
+        If an `--env` has no site-packages directory.
+    """
+
+    if not args.env and not args.site_packages:
+        return None
+    paths = []
+    for prefix in args.env or ():
+        paths.extend(get_environment_site_packages(prefix))
+    paths.extend(args.site_packages or ())
+    return paths
+
+
+def get_snapshot_paths(args):
+    """
+    Get the snapshot file of each directory of every `--env`.
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        Parsed CLI arguments, with `scan_paths` set.
+
+    Returns
+    -------
+    dict or None
+        Dictionary of {site_packages: snapshot_path}, so the snapshot of an
+        `--env` is kept in that environment rather than in the running one,
+        or None without `--env`. `--site-packages` directories use the
+        snapshot of the running environment.
+    """
+
+    if not args.env:
+        return None
+    return {
+        path: get_snapshot_path(prefix)
+        for prefix in args.env
+        for path in get_environment_site_packages(prefix)
+    }
+
+
+def get_installer_command(args):
+    """
+    Get the installer command of `upgrade_requirements`.
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        Parsed CLI arguments.
+
+    Returns
+    -------
+    str or None
+        `--cmd`, or with an `--env`, the default command of the backend
+        targeting the interpreter of that environment. None to use the
+        default command.
+    """
+
+    if args.cmd is not None or not args.env:
+        return args.cmd
+    import shlex
+
+    from pru.matrix import MATRIX_COMMANDS, get_interpreter_executable
+
+    executable = get_interpreter_executable(args.env[0])
+    command = MATRIX_COMMANDS[resolve_backend(args.backend)]
+    return command.format(python=shlex.quote(executable))
+
+
+def get_index(args):
+    """
+    Get the installed packages index of `--env` and `--site-packages`.
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        Parsed CLI arguments.
+
+    Returns
+    -------
+    dict or None
+        Installed packages index, or None to let commands scan `sys.path`.
+    """
+
+    if args.scan_paths is None:
+        return None
+    return get_installed_packages_index(
+        args.scan_paths, max_workers=args.jobs, snapshot_path=args.snapshot_paths
+    )
+
+
+def print_report(report):
+    """
+    Print the number of changed pins of each written requirements file.
+
+    Parameters
+    ----------
+    report : dict
+        Dictionary of {path: number_of_changed_pins}.
+
+    Returns
+    -------
+    None
+    """
+
+    for path, changed in report.items():
+        print(f"{path}: {changed} pin(s) changed")
+
+
+def print_installed_packages(packages, output_format, stream=None):
+    """
+    Print installed packages one record at a time.
+
+    Each record is written as soon as it is received, so the packages are
+    never held in memory.
+
+    Parameters
+    ----------
+    packages : iterable of InstalledPackage
+        Packages to print, e.g. from `iter_installed_packages`.
+    output_format : str
+        "jsonl" for one JSON object per line, "csv" for comma-separated
+        values with a header, or "json" for a JSON array with one object
+        per line.
+    stream : file-like or None, optional
+        Where to print. If None, uses `sys.stdout`.
+
+    Returns
+    -------
+    int
+        Number of printed packages.
+    """
+
+    if stream is None:
+        stream = sys.stdout
+    fields = ("name", "version", "path")
+    writer = None
+    if output_format == "csv":
+        writer = csv.writer(stream, lineterminator="\n")
+        writer.writerow(fields)
+    elif output_format == "json":
+        stream.write("[")
+
+    count = 0
+    for package in packages:
+        if writer is not None:
+            writer.writerow((package.name, package.version, package.path))
+        else:
+            record = json.dumps(dict(zip(fields, package)))
+            if output_format == "json":
+                record = ("\n" if count == 0 else ",\n") + record
+            stream.write(record if output_format == "json" else record + "\n")
+        count += 1
+
+    if output_format == "json":
+        stream.write("\n]\n" if count else "]\n")
+    return count
+
+
+def run_print_installed_command(args):
+    """
+    Run the `print_installed` command of the CLI.
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        Parsed CLI arguments.
+    """
+
+    if args.format is not None:
+        print_installed_packages(
+            iter_installed_packages(
+                args.scan_paths, patterns=args.match, snapshot_path=args.snapshot_paths
+            ),
+            args.format,
+        )
+        return
+
+    session = PruSession(paths=args.scan_paths, snapshot_path=args.snapshot_paths)
+    requirements = session.get_installed_requirements_packages_and_version(
+        args.requirement
+    )
+    installed = session.get_installed_packages_name_and_version()
+    if args.match:
+        requirements = {
+            k: v for k, v in requirements.items() if match_package_name(k, args.match)
+        }
+        installed = {
+            k: v for k, v in installed.items() if match_package_name(k, args.match)
+        }
+    print(requirements)
+    print(installed)
+
+
+def print_plans(plans, diff=False):
+    """
+    Print the pending changes of planned requirements files.
+
+    Parameters
+    ----------
+    plans : list of RequirementsPlan
+        Plans from `plan_requirements_versions`.
+    diff : bool, optional
+        If True, print the unified diff of each pending file, otherwise
+        only its path.
+
+    Returns
+    -------
+    int
+        1 if any file has pending changes, 0 otherwise.
+    """
+
+    pending = [plan for plan in plans if plan.pending]
+    for plan in pending:
+        if diff:
+            sys.stdout.writelines(
+                line if line.endswith("\n") else line + "\n" for line in plan.diff()
+            )
+        else:
+            print(f"Would update {plan.path} ({plan.changed} pin(s) changed)")
+    if not pending:
+        print("Requirements are up to date.")
+    return 1 if pending else 0
+
+
+def print_violations(plans):
+    """
+    Print the lines kept because of a violated constraint, to stderr.
+
+    Parameters
+    ----------
+    plans : list of RequirementsPlan
+        Plans from `plan_requirements_versions` with `respect_constraints`.
+
+    Returns
+    -------
+    int
+        1 if any installed version violates its constraints, 0 otherwise.
+    """
+
+    violations = [violation for plan in plans for violation in plan.violations]
+    for violation in violations:
+        print(
+            f"{violation.path}:{violation.line}: {violation.name} "
+            f"{violation.version} is installed, which violates "
+            f"'{violation.specifier}', line kept unchanged",
+            file=sys.stderr,
+        )
+    return 1 if violations else 0
+
+
+def print_held_back(held_back):
+    """
+    Print the packages whose upgrade failed, to stderr.
+
+    Parameters
+    ----------
+    held_back : list of str
+        Packages held back by `upgrade_installed` with `bisect_failures`.
+
+    Returns
+    -------
+    int
+        1 if any package was held back, 0 otherwise.
+    """
+
+    if not held_back:
+        return 0
+    print(
+        f"Held back {len(held_back)} package(s) whose upgrade failed: "
+        f"{', '.join(held_back)}",
+        file=sys.stderr,
+    )
+    return 1
+
+
+def get_hash_dirs(args):
+    """
+    Get the directories to take `--hash` options from.
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        Parsed CLI arguments.
+
+    Returns
+    -------
+    list of str or None
+        The `--find-links` directories followed by the wheelhouse, or None
+        without `--hashes`.
+    """
+
+    if not args.hashes:
+        return None
+    from pru.wheelhouse import get_find_links_dir
+
+    return [*(args.find_links or []), get_find_links_dir(args.wheelhouse)]
+
+
+def run_replace_command(args):
+    """
+    Run the `replace_versions` command of the CLI.
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        Parsed CLI arguments.
+
+    Returns
+    -------
+    int or None
+        With `--dry-run` or `--diff`, 1 if changes are pending and 0
+        otherwise. With `--respect-constraints`, 1 if an installed version
+        violates its constraints. None after writing.
+    """
+
+    session = PruSession(paths=args.scan_paths, snapshot_path=args.snapshot_paths)
+    plans = session.plan_requirements_versions(
+        args.requirement,
+        args.output,
+        recursive=args.recursive,
+        hash_dirs=get_hash_dirs(args),
+        closure=args.closure,
+        respect_constraints=args.respect_constraints,
+    )
+    violated = print_violations(plans)
+    if args.dry_run or args.diff:
+        return max(print_plans(plans, diff=args.diff), violated)
+
+    report = session.write_requirements_plans(plans)
+    if args.recursive or len(report) > 1:
+        print_report(report)
+    print(f"Replaced versions in {', '.join(report)}")
+    return violated or None
+
+
+def upgrade_or_resolve(session, args):
+    """
+    Upgrade the packages of the requirements files, or only resolve them.
+
+    Parameters
+    ----------
+    session : PruSession
+        Session pinning the requirements files afterwards.
+    args : argparse.Namespace
+        Parsed CLI arguments. With `--resolve-only`, the upgrades are
+        resolved without installing them, and the session pins the resolved
+        versions.
+
+    Returns
+    -------
+    list of str
+        Packages held back by `--bisect-failures`.
+
+    Raises
+    ------
+    subprocess.CalledProcessError
+        If the installer or the resolver failed.
+    subprocess.TimeoutExpired
+        If the installer or the resolver timed out.
+    """
+
+    if args.resolve_only:
+        from pru.matrix import get_interpreter_executable
+
+        session.resolve_versions(
+            args.requirement,
+            recursive=args.recursive,
+            find_links=args.find_links,
+            index_url=args.index_url,
+            no_index=args.no_index,
+            python=get_interpreter_executable(args.env[0]) if args.env else None,
+            timeout=args.timeout,
+            log_path=args.log,
+            respect_constraints=args.respect_constraints,
+            closure=args.closure,
+        )
+        return []
+    return session.upgrade_installed(
+        args.requirement,
+        command=get_installer_command(args),
+        timeout=args.timeout,
+        log_path=args.log,
+        recursive=args.recursive,
+        prefetch=args.prefetch or args.wheelhouse is not None,
+        wheelhouse=args.wheelhouse,
+        max_workers=args.jobs,
+        respect_constraints=args.respect_constraints,
+        bisect_failures=args.bisect_failures,
+    )
+
+
+def run_upgrade_command(args):
+    """
+    Run the `upgrade_requirements` command of the CLI.
+
+    With `--resolve-only`, nothing is installed, and with `--dry-run` or
+    `--diff`, which require `--resolve-only`, the requirements files are
+    only planned and not written.
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        Parsed CLI arguments.
+
+    Returns
+    -------
+    int or None
+        Exit code of a failed installer or resolver, or 1 if it timed out. With
+        `--dry-run` or `--diff`, 1 if changes are pending and 0 otherwise.
+        With `--respect-constraints`, 1 if an installed version violates its
+        constraints, and with `--bisect-failures`, 1 if packages were held
+        back. None after writing.
+    """
+
+    # the files parsed for the upgrade are reused to plan the pins
+    session = PruSession(
+        backend=args.backend, paths=args.scan_paths, snapshot_path=args.snapshot_paths
+    )
+    if args.resolve_only and args.closure and resolve_backend(args.backend) == "uv":
+        print(
+            "--closure cannot be used to resolve with uv, whose resolution "
+            "does not list the dependencies of each package, use --backend pip",
+            file=sys.stderr,
+        )
+        return 1
+
+    tool = "Resolver" if args.resolve_only else "Installer"
+    try:
+        held_back = upgrade_or_resolve(session, args)
+    except CalledProcessError as e:
+        print(
+            f"{tool} failed with exit code {e.returncode}, "
+            "requirements were not updated.",
+            file=sys.stderr,
+        )
+        return e.returncode
+    except TimeoutExpired as e:
+        print(
+            f"{tool} timed out after {e.timeout} seconds, "
+            "requirements were not updated.",
+            file=sys.stderr,
+        )
+        return 1
+
+    plans = session.plan_requirements_versions(
+        args.requirement,
+        args.output,
+        recursive=args.recursive,
+        hash_dirs=get_hash_dirs(args),
+        closure=args.closure,
+        respect_constraints=args.respect_constraints,
+    )
+    failed = max(print_violations(plans), print_held_back(held_back))
+    if args.dry_run or args.diff:
+        return max(print_plans(plans, diff=args.diff), failed)
+
+    report = session.write_requirements_plans(plans)
+    if args.recursive or len(report) > 1:
+        print_report(report)
+    if args.resolve_only:
+        print(f"Pinned resolved versions in {', '.join(report)}")
+    else:
+        print(f"Upgraded packages in {', '.join(report)}")
+    return failed or None
+
+
+def print_outdated(outdated):
+    """
+    Print outdated packages as a table.
+
+    Parameters
+    ----------
+    outdated : list of OutdatedPackage
+        Result of `get_outdated_packages`.
+
+    Returns
+    -------
+    None
+    """
+
+    if not outdated:
+        print("All packages are up to date.")
+        return
+    rows = [("Package", "Current", "Latest")] + [tuple(row) for row in outdated]
+    widths = [max(len(row[i]) for row in rows) for i in range(2)]
+    for name, current, latest in rows:
+        print(f"{name:<{widths[0]}}  {current:<{widths[1]}}  {latest}")
+
+
+def run_outdated_command(args):
+    """
+    Run the `outdated` command of the CLI.
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        Parsed CLI arguments.
+
+    Returns
+    -------
+    int or None
+        1 if the index could not be queried, None otherwise.
+    """
+
+    from pru.index import get_outdated_packages
+
+    try:
+        outdated = get_outdated_packages(
+            args.requirement,
+            index_url=args.index_url,
+            recursive=args.recursive,
+            max_workers=args.jobs,
+            prereleases=args.pre,
+            index=get_index(args),
+            respect_constraints=args.respect_constraints,
+        )
+    except OSError as e:
+        print(f"Could not query the package index: {e}", file=sys.stderr)
+        return 1
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    print_outdated(outdated)
+
+
+def print_import_audit(audit):
+    """
+    Print the report of `audit_imports`.
+
+    Parameters
+    ----------
+    audit : pru.imports.ImportAudit
+        Result of the audit.
+    """
+
+    if not (audit.unused or audit.missing or audit.unresolved):
+        print("Requirements match the imports.")
+        return
+    if audit.unused:
+        print("Required but never imported:")
+        for name in audit.unused:
+            print(f"  {name}")
+    if audit.missing:
+        print("Imported but not required:")
+        for name, modules in audit.missing.items():
+            print(f"  {name} ({', '.join(modules)})")
+    if audit.unresolved:
+        print("Imported but not installed:")
+        for module in audit.unresolved:
+            print(f"  {module}")
+
+
+def run_audit_imports_command(args):
+    """
+    Run the `audit-imports` command of the CLI.
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        Parsed CLI arguments.
+
+    Returns
+    -------
+    int or None
+        1 if requirements and imports do not match, None otherwise.
+    """
+
+    from pru.imports import audit_imports
+
+    audit = audit_imports(
+        args.paths[0] if args.paths else ".",
+        args.requirement,
+        recursive=args.recursive,
+        index=get_index(args),
+        max_workers=args.jobs,
+    )
+    print_import_audit(audit)
+    if audit.unused or audit.missing or audit.unresolved:
+        return 1
+
+
+def run_watch_command(args):
+    """
+    Run the `watch` command of the CLI, until interrupted.
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        Parsed CLI arguments.
+    """
+
+    from pru.watch import watch_requirements
+
+    def print_changes(report):
+        print_report(report)
+        sys.stdout.flush()
+
+    print("Watching requirements and installed packages, press Ctrl+C to stop.")
+    try:
+        watch_requirements(
+            args.requirement,
+            recursive=args.recursive,
+            debounce=args.debounce,
+            paths=args.scan_paths,
+            snapshot_path=args.snapshot_paths,
+            polling=args.poll,
+            callback=print_changes,
+        )
+    except KeyboardInterrupt:
+        pass
+
+
+def run_matrix_command(args, parser):
+    """
+    Run the `matrix` command of the CLI.
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        Parsed CLI arguments.
+    parser : argparse.ArgumentParser
+        Parser used to report usage errors.
+
+    Returns
+    -------
+    int
+        0 if every job succeeded, 1 otherwise.
+    """
+
+    from pru.matrix import (
+        MATRIX_COMMANDS,
+        print_matrix_result,
+        print_matrix_summary,
+        run_matrix,
+    )
+
+    if not args.python:
+        parser.error("matrix requires at least one -p/--python")
+    if not args.requirement:
+        parser.error("matrix requires at least one -r/--requirement")
+
+    arguments = []
+    if args.recursive:
+        arguments.append("--recursive")
+    command = args.cmd
+    if command is None:
+        command = MATRIX_COMMANDS[resolve_backend(args.backend)]
+
+    results = run_matrix(
+        args.python,
+        args.requirement,
+        command=command,
+        arguments=arguments,
+        max_workers=args.jobs,
+        timeout=args.timeout,
+        callback=print_matrix_result,
+    )
+    print_matrix_summary(results)
+    return 0 if all(result.returncode == 0 for result in results) else 1
+
+
+def run_command(args, parser):
+    """
+    Run the command of the CLI.
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        Parsed CLI arguments.
+    parser : argparse.ArgumentParser
+        Parser used to report usage errors.
+
+    Returns
+    -------
+    int or None
+        Exit code, None on success.
+    """
+
+    command = args.command
+    if command == "print_installed":
+        return run_print_installed_command(args)
+    elif command == "replace_versions":
+        return run_replace_command(args)
+    elif command == "upgrade_requirements":
+        return run_upgrade_command(args)
+    elif command == "matrix":
+        return run_matrix_command(args, parser)
+    elif command == "outdated":
+        return run_outdated_command(args)
+    elif command == "audit-imports":
+        return run_audit_imports_command(args)
+    elif command == "watch":
+        return run_watch_command(args)
+    else:
+        print(
+            "Unknown command. Use print_installed, replace_versions, "
+            "upgrade_requirements, matrix, outdated, audit-imports, or watch."
+        )
+        return 2
+
+
+def run_instrumented_command(args, parser):
+    """
+    Run the command of the CLI, with `--timings` and `--profile`.
+
+    Timings are printed to stderr, so they never mix with the output of the
+    command. A `--profile` path ending with ".json" is written as a Chrome
+    trace of the phases, any other path as `cProfile` statistics.
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        Parsed CLI arguments.
+    parser : argparse.ArgumentParser
+        Parser used to report usage errors.
+
+    Returns
+    -------
+    int or None
+        Exit code, None on success.
+    """
+
+    trace = args.profile is not None and args.profile.endswith(".json")
+    profiler = None
+    if args.profile is not None and not trace:
+        import cProfile
+
+        profiler = cProfile.Profile()
+
+    with PhaseTimer() as timer:
+        if profiler is not None:
+            profiler.enable()
+        try:
+            return run_command(args, parser)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                profiler.dump_stats(args.profile)
+            if trace:
+                timer.write_chrome_trace(args.profile)
+            if args.timings == "json":
+                print(json.dumps(timer.to_json()), file=sys.stderr)
+            elif args.timings:
+                print(timer.format_table(), file=sys.stderr)
+
 
 def main():
     """
@@ -47,6 +865,14 @@ def main():
     - `replace_versions`: Pin installed versions into the requirements file.
     - `upgrade_requirements`: Upgrade packages and update the file with pinned
       versions.
+    - `matrix`: Run `upgrade_requirements` with every `--python` interpreter
+      concurrently, on `--requirement` paths formatted with its version.
+    - `outdated`: List the packages with a newer version on `--index-url`.
+    - `audit-imports`: List the requirements never imported by the Python
+      files of a directory, and the imported packages missing from the
+      requirements. Exits with 1 when they do not match.
+    - `watch`: Pin installed versions, then pin again the lines of packages
+      installed, upgraded or edited since, until interrupted.
 
     Uses argparse to configure and read CLI arguments.
 
@@ -56,16 +882,47 @@ def main():
 
     Returns
     -------
-    None
+    int or None
+        Exit code, None on success.
 
     Notes
     -----
     - Uses `argparse` to configure CLI behavior.
-    - The `--requirement` argument sets the path to the requirements file.
+    - The `--requirement` argument sets the path to the requirements file. It
+      can be repeated and accepts glob patterns.
     - The `--output` argument sets the path to write the requirements file.
     - The `--cmd` argument customizes the shell command for upgrading. If not
       specified, automatically uses "uv pip install --upgrade" when uv is
       available, otherwise falls back to "pip install --upgrade --user".
+    - The `--timeout` and `--log` arguments bound the installer run and
+      record its output as JSON lines. A failed installer run exits with its
+      exit code, without rewriting any file.
+    - The `--prefetch` and `--wheelhouse` arguments download packages
+      concurrently into a local wheelhouse before an offline install.
+    - The `--hashes` argument adds `--hash` options from the files of the
+      wheelhouse and of the `--find-links` directories.
+    - The `--closure` argument also pins the transitive dependencies.
+    - The `--respect-constraints` argument keeps the specifiers of the
+      requirements, and reports the lines violated by installed versions.
+    - The `--bisect-failures` argument isolates the packages making the
+      installer fail, and upgrades and pins every other package.
+    - The `--resolve-only` argument pins the versions resolved by the
+      backend without installing them, offline with `--no-index` and
+      `--find-links`.
+    - The `--debounce` and `--poll` arguments tune `watch`.
+    - The `--recursive` argument follows `-r`/`-c` includes.
+    - The `--dry-run` and `--diff` arguments only report pending changes,
+      and exit with 1 when a file would change. Unchanged files are never
+      written, changed files are replaced atomically.
+    - The `--backend` argument forces the "uv" or "pip" default command.
+    - The `--env` and `--site-packages` arguments inspect and pin against
+      other environments, whose metadata is read directly without running
+      their interpreter. Upgrades install into a single `--env`.
+    - The `--format` argument streams `print_installed` as JSON lines, CSV
+      or JSON, and `--match` filters its packages by name patterns.
+    - The `--timings` argument prints the time spent in each phase to
+      stderr, as a table or as JSON. The `--profile` argument writes a
+      Chrome trace (".json" paths) or `cProfile` statistics.
     - The default command is `upgrade_requirements`.
     - Automatically detects and uses `uv` for faster package operations.
     """
@@ -77,11 +934,13 @@ def main():
         "-r",
         "--requirement",
         type=str,
+        action="append",
         default=None,
         help=(
             "Path to the requirements file. Defaults to using requirements.txt from "
             "the current directory if it exists. Use '.' to indicate no requirements "
-            "file."
+            "file. Can be repeated and accepts glob patterns (quote them), in which "
+            "case all files are upgraded with a single installer run."
         ),
     )
     parser.add_argument(
@@ -89,10 +948,15 @@ def main():
         nargs="?",
         default="upgrade_requirements",
         help=(
-            "Command to run: print_installed, replace_versions, or "
-            "upgrade_requirements."
+            "Command to run: print_installed, replace_versions, "
+            "upgrade_requirements, matrix, outdated, audit-imports, or watch."
         ),
     )
+    parser.add_argument(
+        "paths",
+        nargs="*",
+        help="Source directory scanned by audit-imports. Defaults to '.'.",
+    )
     parser.add_argument(
         "--cmd",
         type=str,
@@ -100,9 +964,187 @@ def main():
         help=(
             "Command to use for upgrading packages on upgrade_requirements. "
             "If not specified, automatically uses 'uv pip install --upgrade' "
-            "when uv is available, otherwise 'pip install --upgrade --user'."
+            "when uv is available, otherwise 'pip install --upgrade --user'. "
+            "On matrix, {python} is replaced by each interpreter."
+        ),
+    )
+    parser.add_argument(
+        "-R",
+        "--recursive",
+        action="store_true",
+        help=(
+            "Follow files included with -r and -c, upgrading and pinning them "
+            "too. Included files are rewritten in place."
+        ),
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help=(
+            "Do not write requirements files, list the files that would change. "
+            "Exits with 1 when changes are pending. upgrade_requirements "
+            "requires --resolve-only."
+        ),
+    )
+    parser.add_argument(
+        "--diff",
+        action="store_true",
+        help="Same as --dry-run, but print a unified diff of the pending changes.",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=BACKENDS,
+        default=None,
+        help=(
+            "Installer backend used to build the default upgrade command. "
+            "If not specified, uses uv when available, otherwise pip."
+        ),
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=None,
+        help=(
+            "Seconds to wait for the installer (or for each matrix job) before "
+            "killing it. Files are not rewritten when the installer fails."
         ),
     )
+    parser.add_argument(
+        "--log",
+        type=str,
+        default=None,
+        help="Append the installer output as structured JSON lines to this file.",
+    )
+    parser.add_argument(
+        "--prefetch",
+        action="store_true",
+        help=(
+            "Download packages concurrently into a local wheelhouse first, then "
+            "install offline from it with --no-index --find-links."
+        ),
+    )
+    parser.add_argument(
+        "--wheelhouse",
+        type=str,
+        default=None,
+        help=(
+            "Wheelhouse directory used by --prefetch (implies it). Defaults to "
+            "$PRU_WHEELHOUSE, or a wheelhouse in the pru cache directory shared "
+            "by every environment."
+        ),
+    )
+    parser.add_argument(
+        "--hashes",
+        action="store_true",
+        help=(
+            "Add a --hash=sha256: option for each file of the pinned versions "
+            "found in the wheelhouse or --find-links directories, for installs "
+            "with --require-hashes."
+        ),
+    )
+    parser.add_argument(
+        "--closure",
+        action="store_true",
+        help=(
+            "Also pin every installed transitive dependency of the listed "
+            "packages, in a generated section with '# via' comments."
+        ),
+    )
+    parser.add_argument(
+        "--respect-constraints",
+        action="store_true",
+        help=(
+            "Keep the specifiers of the requirements (e.g. <=, ~=, != and "
+            "wildcards): only pin installed versions satisfying them, upgrade "
+            "and look for outdated packages within them. Lines violated by "
+            "the installed version are kept and reported, and pru exits with 1."
+        ),
+    )
+    parser.add_argument(
+        "--bisect-failures",
+        action="store_true",
+        help=(
+            "When the installer fails on upgrade_requirements, split the "
+            "packages in halves and install them again, recursively, to hold "
+            "back the failing ones and upgrade and pin everything else. Halves "
+            "run concurrently with uv. Exits with 1 when packages are held back."
+        ),
+    )
+    parser.add_argument(
+        "--resolve-only",
+        action="store_true",
+        help=(
+            "On upgrade_requirements, pin the versions the backend resolves "
+            "(pip install --dry-run --report, or uv pip compile) without "
+            "installing anything."
+        ),
+    )
+    parser.add_argument(
+        "--no-index",
+        action="store_true",
+        help="Resolve from the --find-links directories only, with --resolve-only.",
+    )
+    parser.add_argument(
+        "--find-links",
+        type=str,
+        action="append",
+        default=None,
+        help=(
+            "Extra directory of wheels and sdists to hash, or to resolve from "
+            "with --resolve-only. Can be repeated."
+        ),
+    )
+    parser.add_argument(
+        "--debounce",
+        type=float,
+        default=0.5,
+        help=(
+            "Seconds without any change before watch pins again, so a bulk "
+            "install causes a single rewrite. Defaults to 0.5."
+        ),
+    )
+    parser.add_argument(
+        "--poll",
+        action="store_true",
+        help="Poll files and directories on watch instead of using inotify.",
+    )
+    parser.add_argument(
+        "-p",
+        "--python",
+        action="append",
+        default=None,
+        help=(
+            "Interpreter or virtual environment directory to run on matrix. Can be "
+            "repeated. Requirement paths may use {major}, {minor} and {version} "
+            "placeholders, formatted with each interpreter's version."
+        ),
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=None,
+        help=(
+            "Maximum number of concurrent matrix jobs, prefetch downloads or "
+            "audit-imports parsing processes (defaults to the CPU count), or "
+            "outdated requests (defaults to 32)."
+        ),
+    )
+    parser.add_argument(
+        "--index-url",
+        type=str,
+        default=None,
+        help=(
+            "Base URL of the simple index queried by outdated and --resolve-only. "
+            "Defaults to the --index-url of the requirements files (on outdated), "
+            "$PIP_INDEX_URL, or PyPI."
+        ),
+    )
+    parser.add_argument(
+        "--pre",
+        action="store_true",
+        help="Also consider pre-releases on outdated.",
+    )
     parser.add_argument(
         "-o",
         "--output",
@@ -112,6 +1154,69 @@ def main():
             "overwriting the input requirements file."
         ),
     )
+    parser.add_argument(
+        "--env",
+        type=str,
+        action="append",
+        default=None,
+        help=(
+            "Virtual environment (or prefix) to inspect and pin against instead "
+            "of the running one, without activating it. Can be repeated, the "
+            "first environment providing a package wins. upgrade_requirements "
+            "installs into it with its interpreter."
+        ),
+    )
+    parser.add_argument(
+        "--site-packages",
+        type=str,
+        action="append",
+        default=None,
+        help=(
+            "Directory of installed distributions to inspect and pin against, "
+            "after the --env ones. Can be repeated."
+        ),
+    )
+    parser.add_argument(
+        "--format",
+        choices=("jsonl", "csv", "json"),
+        default=None,
+        help=(
+            "Stream every installed package of print_installed as JSON lines, "
+            "CSV or a JSON array of {name, version, path} records, printed as "
+            "they are discovered."
+        ),
+    )
+    parser.add_argument(
+        "--match",
+        type=str,
+        action="append",
+        default=None,
+        help=(
+            "Only print the installed packages whose name matches this "
+            "shell-style pattern on print_installed, e.g. 'django*'. Can be "
+            "repeated."
+        ),
+    )
+    parser.add_argument(
+        "--timings",
+        nargs="?",
+        const="table",
+        choices=("table", "json"),
+        default=None,
+        help=(
+            "Print the time spent in each phase (uv probe, scan, parse, install, "
+            "plan, write) to stderr, as a table or as JSON."
+        ),
+    )
+    parser.add_argument(
+        "--profile",
+        type=str,
+        default=None,
+        help=(
+            "Write a Chrome trace of the phases to this path if it ends with "
+            "'.json', otherwise cProfile statistics (see pstats)."
+        ),
+    )
     parser.add_argument(
         "-v",
         "--version",
@@ -123,27 +1228,42 @@ def main():
     args = parser.parse_args()
 
     file_path = args.requirement
-    output_path = args.output if args.output else file_path
-    command = args.command
-    upgrade_command = args.cmd
+    output_path = args.output
 
-    if command == "print_installed":
-        print(get_installed_requirements_packages_and_version(file_path))
-        print(get_installed_packages_name_and_version())
-    elif command == "replace_versions":
-        replace_requirements_packages_versions(file_path, output_path)
-        print(f"Replaced versions in {file_path}")
-    elif command == "upgrade_requirements":
-        upgrade_requirements(
-            file_path, output_path=output_path, command=upgrade_command
+    if output_path and file_path and len(file_path) > 1:
+        parser.error("-o/--output can only be used with a single -r/--requirement")
+
+    if (
+        args.command == "upgrade_requirements"
+        and args.cmd is None
+        and (args.site_packages or len(args.env or ()) > 1)
+    ):
+        parser.error(
+            "upgrade_requirements can only install into a single --env, "
+            "use --cmd to install elsewhere"
         )
-        print(f"Upgraded packages in {file_path}")
-    else:
-        print(
-            "Unknown command. Use print_installed, replace_versions, or "
-            "upgrade_requirements."
+    if (
+        args.command == "upgrade_requirements"
+        and (args.dry_run or args.diff)
+        and not args.resolve_only
+    ):
+        # the installer would upgrade the packages of the preview
+        parser.error(
+            "upgrade_requirements can only use --dry-run or --diff with --resolve-only"
         )
+    if args.closure and (args.env or args.site_packages):
+        # markers are evaluated against the running interpreter
+        parser.error("--closure cannot be used with --env or --site-packages")
+    try:
+        args.scan_paths = get_scan_paths(args)
+        args.snapshot_paths = get_snapshot_paths(args)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.timings or args.profile:
+        return run_instrumented_command(args, parser)
+    return run_command(args, parser)
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,129 @@
+"""Transitive closure of installed dependencies.
+
+The dependency graph is the installed packages index, where the edges of each
+package are its `Requires-Dist` entries. Entries are parsed once, only for the
+packages reached from the roots, and each `(package, extra)` pair is expanded
+once, so computing the closure is linear in the number of reached packages
+and edges.
+"""
+
+import re
+from collections import deque
+
+from pru.markers import evaluate_marker
+from pru.utils import canonicalize_name
+
+# `name [extras] (specifiers) ; marker` of `Requires-Dist` entries, where
+# direct references (`name @ url`) may not contain `;` before the marker
+_REQUIRES_DIST_RE = re.compile(
+    r"\s*([A-Za-z0-9](?:[A-Za-z0-9._-]*[A-Za-z0-9])?)\s*(?:\[([^\]]*)\])?[^;]*(?:;(.*))?$"
+)
+
+
+def _parse_dependencies(requires):
+    dependencies = []
+    for entry in requires:
+        match = _REQUIRES_DIST_RE.match(entry)
+        if match is None:
+            continue
+        name, extras, marker = match.groups()
+        extras = extras.split(",") if extras else ()
+        marker = marker.strip() or None if marker else None
+        dependencies.append(
+            (
+                canonicalize_name(name),
+                frozenset(canonicalize_name(e.strip()) for e in extras if e.strip()),
+                marker,
+                marker is not None and "extra" in marker,
+            )
+        )
+    return dependencies
+
+
+def _applies(marker, extra):
+    if marker is None:
+        return True
+    try:
+        return evaluate_marker(marker, extra)
+    except ValueError:
+        return False
+
+
+def _visit(index, closure, expanded, queue, key, extras, parent=None):
+    if key not in index:
+        return
+    required_by = closure.get(key)
+    if required_by is None:
+        required_by = closure[key] = set()
+        expanded[key] = set()
+    if parent is not None:
+        required_by.add(parent)
+    # each extra of each package is expanded once
+    new_extras = ({""} | set(extras)) - expanded[key]
+    if new_extras:
+        expanded[key].update(new_extras)
+        queue.append((key, new_extras))
+
+
+def _get_required(dependencies, extras):
+    for dependency, dependency_extras, marker, uses_extra in dependencies:
+        for extra in extras:
+            # markers without `extra` only need the base expansion
+            if (extra == "" or uses_extra) and _applies(marker, extra):
+                yield dependency, dependency_extras
+                break
+
+
+def get_dependency_closure(roots, index):
+    """
+    Get the installed packages required, directly or not, by root packages.
+
+    Parameters
+    ----------
+    roots : iterable of tuple
+        `(name, extras)` pairs of the root packages, e.g.
+        `[("requests", ("socks",))]`.
+    index : dict
+        Installed packages index as returned by `get_installed_packages_index`.
+
+    Returns
+    -------
+    dict
+        Dictionary of {canonical_name: required_by}, in discovery order, for
+        every installed package reached from the roots, including the roots.
+        `required_by` is the set of the names of the packages requiring it,
+        empty for roots that nothing else requires.
+
+    Notes
+    -----
+    - Environment markers are evaluated for the running interpreter, with
+      the `extra` requested by each dependent.
+    - Packages that are not installed are not part of the closure, and
+      neither are their dependencies.
+    """
+
+    closure = {}
+    expanded = {}
+    dependencies = {}
+    queue = deque()
+
+    for name, extras in roots:
+        extras = [canonicalize_name(extra) for extra in extras]
+        _visit(index, closure, expanded, queue, canonicalize_name(name), extras)
+
+    while queue:
+        key, extras = queue.popleft()
+        package = index[key]
+        if key not in dependencies:
+            dependencies[key] = _parse_dependencies(package.requires)
+        for dependency, dependency_extras in _get_required(dependencies[key], extras):
+            _visit(
+                index,
+                closure,
+                expanded,
+                queue,
+                dependency,
+                dependency_extras,
+                package.name,
+            )
+    return closure
@@ -1,27 +1,63 @@
+import contextlib
+import fnmatch
+import glob
+import os
 import re
 import sys
-from subprocess import DEVNULL, PIPE, STDOUT, Popen, run
-
-if sys.version_info >= (3, 8):
-    IS_PYTHON_7 = False
-    from importlib.metadata import PackageNotFoundError, distributions, version
-else:
-    IS_PYTHON_7 = True
-    import pkg_resources
-
-try:
-    run(["uv", "--version"], stdout=DEVNULL, stderr=DEVNULL, check=True)
-    IS_UV = True
-except (FileNotFoundError, Exception):
-    IS_UV = False
+import time
+from collections import namedtuple
+from subprocess import PIPE, CalledProcessError, TimeoutExpired
+
+from pru.backend import get_upgrade_command, is_uv_available, resolve_backend
+from pru.closure import get_dependency_closure
+from pru.hashes import get_package_hashes
+from pru.instrument import phase
+from pru.markers import evaluate_marker
+from pru.parser import RequirementsFile, parse_requirements, pin_requirements
+from pru.pep440 import compile_specifiers
+from pru.snapshot import (
+    InstalledPackage,  # noqa: F401
+    invalidate_snapshot,
+    refresh_environment_paths,
+    scan_installed_packages,
+)
+from pru.snapshot import (
+    iter_installed_packages as _iter_installed_packages,
+)
+from pru.textio import iter_lines, read_lines, write_lines
+from pru.utils import canonicalize_name
+
+IS_PYTHON_7 = sys.version_info < (3, 8)
+
+_GLOB_MAGIC_RE = re.compile(r"[*?[]")
+
+# maximum length of a single output line read from subprocesses
+_STREAM_LIMIT = 2**20
+
+# first line of the transitive dependencies appended by the closure mode
+CLOSURE_HEADER = "# Transitive dependencies, pinned by pru --closure\n"
+
+ConstraintViolation = namedtuple(
+    "ConstraintViolation", ["path", "line", "name", "specifier", "version"]
+)
+
+# result of upgrade_requirements, with the packages held back by bisection
+UpgradeResult = namedtuple("UpgradeResult", ["report", "held_back"])
+
+
+def __getattr__(name):
+    # `IS_UV` is resolved lazily, so importing pru does not spawn `uv`
+    if name == "IS_UV":
+        return is_uv_available()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def read_requirements(requirements_path=None):
     """
     Read lines from a requirements file and return them as a list.
 
-    Handles UTF-16 encoding fallback when UTF-8 fails, to support some Windows
-    generated files.
+    The encoding is sniffed from the first bytes, so UTF-16 files generated
+    on Windows are supported, see `pru.textio.read_lines`.
 
     Parameters
     ----------
@@ -31,56 +67,44 @@ def read_requirements(requirements_path=None):
     Returns
     -------
     list of str
-        Lines from the requirements file.
+        Lines from the requirements file, with line endings translated to
+        "\n". Empty for an empty file.
     """
 
     if requirements_path is None:
         requirements_path = get_requirements_path()
-    with open(requirements_path, "r") as f:
-        requirements = f.readlines()
-
-    # TODO: this part should be able to be simplified
-    if "\x00" in requirements[0]:
-        with open(requirements_path, "r", encoding="utf-16") as f:
-            requirements = f.readlines()
-    return requirements
+    return read_lines(requirements_path)[0]
 
 
-def get_installed_packages_name():
+def get_installed_packages_name(paths=None):
     """
     Get the names of all installed packages in the current environment.
 
-    Uses importlib.metadata or pkg_resources depending on the Python version.
-    In Python 3.7, repeated calls may be needed to capture newly installed
-    packages after subprocess execution.
+    Parameters
+    ----------
+    paths : list of str or None, optional
+        Directories to scan instead of the directories of `sys.path`, e.g.
+        the site-packages of another environment, see
+        `pru.snapshot.get_environment_site_packages`.
 
     Returns
     -------
     list of str
         Names of all installed packages.
-    """
 
-    # TODO:
-    #   [BUG] in Python3.7, get_installed_packages_name() did not fetch newly installed
-    # packages installed from verbose_subprocess, but will be able to fetch it in the
-    # second run. This is not `pkg_resources` specific, but 3.7 specific.
+    Notes
+    -----
+    - Read from the environment snapshot, see `get_installed_packages_index`.
+    """
 
-    if IS_PYTHON_7:
-        installed_packages = [package.key for package in pkg_resources.working_set]
-    else:
-        installed_packages = [
-            distribution.metadata["Name"] for distribution in distributions()
-        ]
-    return installed_packages
+    index = get_installed_packages_index(paths)
+    return [package.name for package in index.values()]
 
 
 def get_package_version(package_name):
     """
     Get the installed version of a specific package.
 
-    Compatible with both Python 3.7 (via pkg_resources) and 3.8+ (via
-    importlib.metadata).
-
     Parameters
     ----------
     package_name : str
@@ -90,38 +114,149 @@ def get_package_version(package_name):
     -------
     str or None
         The installed version of the package, or None if not found.
+
+    Notes
+    -----
+    - Read from the environment snapshot, see `get_installed_packages_index`.
+      Looking up many packages is cheaper with a single index.
     """
 
-    if IS_PYTHON_7:
-        try:
-            return pkg_resources.get_distribution(package_name).version
-        except pkg_resources.DistributionNotFound:
-            return None
-    else:
-        try:
-            return version(package_name)
-        except PackageNotFoundError:
-            return None
+    package = get_installed_packages_index().get(canonicalize_name(package_name))
+    return None if package is None else package.version
+
+
+def get_installed_packages_index(
+    paths=None, use_cache=True, max_workers=None, snapshot_path=None
+):
+    """
+    Build an index of every installed distribution in a single pass.
+
+    Each distribution's metadata is read at most once, and is reused from the
+    on-disk environment snapshot when its `.dist-info`/`.egg-info` entry did
+    not change since the previous run.
+
+    Parameters
+    ----------
+    paths : list of str or None, optional
+        Directories to scan, in priority order. If None, uses the directories
+        of `sys.path`.
+    use_cache : bool, optional
+        If False, ignore the on-disk snapshot and read all metadata again.
+    max_workers : int or None, optional
+        Maximum number of threads scanning directories and reading
+        metadata, see `pru.snapshot.scan_installed_packages`.
+    snapshot_path : str, dict or None, optional
+        Snapshot file, or snapshot file of each directory, see
+        `pru.snapshot.scan_installed_packages`. If None, uses the snapshot
+        of the running environment.
 
+    Returns
+    -------
+    dict
+        Dictionary of {canonical_name: InstalledPackage}, where
+        `InstalledPackage` is a `(name, version, path)` named tuple holding
+        the display name, the installed version, and the path to the
+        `.dist-info`/`.egg-info` metadata.
 
-def get_installed_packages_name_and_version():
+    Notes
+    -----
+    - Keys are normalized using PEP 503 rules, see `canonicalize_name`.
+    - When a distribution is found more than once, the first one on
+      `sys.path` wins.
+
+    See Also
+    --------
+    pru.snapshot.scan_installed_packages : Snapshot-backed scanner.
+    """
+
+    with phase("scan"):
+        return scan_installed_packages(
+            paths, snapshot_path, use_cache=use_cache, max_workers=max_workers
+        )
+
+
+def iter_installed_packages(
+    paths=None, patterns=None, use_cache=True, snapshot_path=None
+):
+    """
+    Iterate over installed distributions as they are discovered.
+
+    Parameters
+    ----------
+    paths : list of str or None, optional
+        Directories to scan, in priority order. If None, uses the directories
+        of `sys.path`.
+    patterns : list of str or None, optional
+        Shell-style patterns, e.g. "django-*". Only distributions whose
+        canonical name matches one of them are yielded. If None or empty,
+        every distribution is yielded.
+    use_cache : bool, optional
+        If False, ignore the on-disk snapshot and read all metadata again.
+    snapshot_path : str, dict or None, optional
+        Snapshot file, or snapshot file of each directory, see
+        `get_installed_packages_index`.
+
+    Yields
+    ------
+    InstalledPackage
+        Each installed distribution once, as soon as it is read.
+
+    See Also
+    --------
+    pru.snapshot.iter_installed_packages : Snapshot-backed iterator.
+    """
+
+    for package in _iter_installed_packages(paths, snapshot_path, use_cache):
+        if not patterns or match_package_name(package.name, patterns):
+            yield package
+
+
+def match_package_name(name, patterns):
+    """
+    Check whether a package name matches shell-style patterns.
+
+    Parameters
+    ----------
+    name : str
+        Package name, e.g. a distribution or requirement name.
+    patterns : iterable of str
+        Shell-style patterns, e.g. "django-*".
+
+    Returns
+    -------
+    bool
+        True if the name matches any pattern. Both sides are compared by
+        canonical name, so `Foo_Bar` matches `foo-*`.
+    """
+
+    name = canonicalize_name(name)
+    return any(
+        fnmatch.fnmatchcase(name, canonicalize_name(pattern)) for pattern in patterns
+    )
+
+
+def get_installed_packages_name_and_version(index=None):
     """
     Get a mapping of all installed packages to their installed versions.
 
+    Parameters
+    ----------
+    index : dict or None, optional
+        Installed packages index as returned by `get_installed_packages_index`.
+        If None, a fresh index is built.
+
     Returns
     -------
     dict
-        Dictionary of {normalized_package_name: version}.
+        Dictionary of {package_name: version}.
 
     Notes
     -----
-    - Uses pip's internal `pkg_resources` to gather installed packages.
-    - Normalizes names using PEP 503 to ensure compatibility.
+    - Built from a single pass over the installed distributions, see
+      `get_installed_packages_index`.
     """
-    packages = {}
-    for package_name in get_installed_packages_name():
-        packages[package_name] = get_package_version(package_name)
-    return packages
+
+    return PruSession(index=index).get_installed_packages_name_and_version()
 
 
 def get_requirements_packages_name(requirements_path=None):
@@ -138,20 +273,226 @@ def get_requirements_packages_name(requirements_path=None):
     -------
     list of str
         List of package names found in the requirements file. Version
-        constraints are removed.
+        constraints, extras, markers, and options are removed.
+
+    See Also
+    --------
+    pru.parser.parse_requirements : Parser used to read the file.
     """
 
-    requirements = read_requirements(requirements_path)
+    if requirements_path is None:
+        requirements_path = get_requirements_path()
+    # the lines are only needed while parsing, so they are streamed
+    requirements = parse_requirements(iter_lines(requirements_path))
+    return _get_packages_name(requirements)
+
+
+def _get_packages_name(requirements):
+    return [
+        requirement.name for requirement in requirements if requirement.name is not None
+    ]
+
+
+def _get_constraints(requirement):
+    # specifiers other than a single exact pin, which pru replaces anyway
+    specifiers = requirement.specifiers
+    if (
+        len(specifiers) == 1
+        and specifiers[0][0] in ("==", "===")
+        and not specifiers[0][1].endswith(".*")
+    ):
+        return ()
+    return specifiers
 
-    package_names = []
+
+def _format_specifiers(specifiers):
+    return ",".join(operator + version for operator, version in specifiers)
+
+
+def _get_install_names(requirements, constraints=False):
+    names = []
+    seen = set()
     for requirement in requirements:
-        match = re.search(r"^([\w.-]+)", requirement, re.IGNORECASE)
-        if match:
-            package_names.append(match.group(1))
-    return package_names
+        if requirement.name is None:
+            continue
+        key = (canonicalize_name(requirement.name), requirement.extras)
+        if key in seen:
+            continue
+        seen.add(key)
+        extras = f"[{','.join(requirement.extras)}]" if requirement.extras else ""
+        specifier = ""
+        if constraints:
+            specifier = _format_specifiers(_get_constraints(requirement))
+        names.append(f"{requirement.name}{extras}{specifier}")
+    return names
+
+
+def _quote_argument(argument):
+    import shlex
+
+    return f'"{argument}"' if os.name == "nt" else shlex.quote(argument)
+
+
+def _get_install_arguments(names):
+    return " ".join(_quote_argument(name) for name in names)
+
+
+def _is_uv_command(command):
+    # uv locks the environment itself, so its runs may overlap, pip's may not
+    import shlex
+
+    arguments = shlex.split(command)
+    if not arguments:
+        return False
+    return os.path.splitext(os.path.basename(arguments[0]))[0] == "uv"
+
+
+def _satisfies_constraints(requirement, version):
+    constraints = _get_constraints(requirement)
+    if not constraints:
+        return True
+    try:
+        # the installed version is what it is, pre-release or not
+        return compile_specifiers(constraints)(version, prereleases=True)
+    except ValueError:
+        # a specifier that can not be evaluated can not be respected
+        return False
 
 
-def get_installed_requirements_packages_and_version(requirements_path=None):
+def _pin_installed_versions(lines, requirements, index, hashes=None, violations=None):
+    changed = []
+
+    def get_version(requirement):
+        package = index.get(canonicalize_name(requirement.name))
+        if package is None:
+            return None
+        if violations is not None and not _satisfies_constraints(
+            requirement, package.version
+        ):
+            # the line is kept as is, and reported
+            violations.append((requirement, package.version))
+            return None
+        if requirement.specifiers != (("==", package.version),):
+            changed.append(requirement)
+        return package.version
+
+    def get_hashes(requirement, version):
+        digests = hashes.get((canonicalize_name(requirement.name), version))
+        if digests is None:
+            # without files, keep the hashes of an unchanged pin
+            if requirement.specifiers == (("==", version),):
+                return None
+            digests = []
+        current = [
+            value[7:]
+            for option, value in requirement.options
+            if option == "--hash" and value and value.startswith("sha256:")
+        ]
+        if sorted(current) != digests and not (changed and changed[-1] is requirement):
+            changed.append(requirement)
+        return digests
+
+    lines = pin_requirements(
+        lines, requirements, get_version, None if hashes is None else get_hashes
+    )
+    return lines, len(changed)
+
+
+def _get_package_hashes(files, index, hash_dirs, closures):
+    keys = {
+        canonicalize_name(requirement.name)
+        for requirements_file in files.values()
+        for requirement in requirements_file.requirements
+        if requirement.name is not None
+    }
+    for closure in closures.values():
+        keys.update(closure)
+    packages = {(index[key].name, index[key].version) for key in keys if key in index}
+    return get_package_hashes(packages, hash_dirs)
+
+
+def _split_closure(requirements_file):
+    # lines written by the user, and the section generated by a previous run
+    lines = requirements_file.lines
+    for i, line in enumerate(lines):
+        if line.rstrip("\r\n") == CLOSURE_HEADER.rstrip("\n"):
+            requirements = [r for r in requirements_file.requirements if r.span[1] <= i]
+            return lines[:i], requirements, lines[i:]
+    return lines, requirements_file.requirements, []
+
+
+def _marker_applies(requirement):
+    if requirement.markers is None:
+        return True
+    try:
+        return evaluate_marker(requirement.markers)
+    except ValueError:
+        return True
+
+
+def _get_closures(files, index):
+    split = {path: _split_closure(f) for path, f in files.items()}
+    listed = {
+        canonicalize_name(requirement.name)
+        for _, requirements, _ in split.values()
+        for requirement in requirements
+        if requirement.name is not None
+    }
+    closures = {}
+    for path, requirements_file in files.items():
+        if requirements_file.constraint:
+            continue
+        roots = [
+            (requirement.name, requirement.extras)
+            for requirement in split[path][1]
+            if requirement.name is not None and _marker_applies(requirement)
+        ]
+        closures[path] = {
+            key: required_by
+            for key, required_by in get_dependency_closure(roots, index).items()
+            if key not in listed
+        }
+    return closures
+
+
+def _format_closure(closure, index, hashes, previous):
+    previous_pins = {
+        (canonicalize_name(r.name), r.specifiers)
+        for r in parse_requirements(previous)
+        if r.name is not None
+    }
+    lines = [CLOSURE_HEADER]
+    changed = 0
+    for key in sorted(closure):
+        package = index[key]
+        pin = [f"{package.name}=={package.version}\n"]
+        pin, _ = _pin_installed_versions(pin, parse_requirements(pin), index, hashes)
+        lines.extend(pin)
+        required_by = ", ".join(sorted(closure[key], key=canonicalize_name))
+        if required_by:
+            lines.append(f"    # via {required_by}\n")
+        if (key, (("==", package.version),)) not in previous_pins:
+            changed += 1
+    return lines, changed
+
+
+def _add_closure(requirements_file, closure, index, hashes, violations=None):
+    lines, requirements, previous = _split_closure(requirements_file)
+    lines, changed = _pin_installed_versions(
+        lines, requirements, index, hashes, violations
+    )
+    if not closure:
+        return lines, changed
+    closure_lines, closure_changed = _format_closure(closure, index, hashes, previous)
+    lines = list(lines)
+    if lines and not lines[-1].endswith("\n"):
+        lines[-1] += "\n"
+    if lines and lines[-1].strip():
+        lines.append("\n")
+    return lines + closure_lines, changed + closure_changed
+
+
+def get_installed_requirements_packages_and_version(requirements_path=None, index=None):
     """
     Get installed versions for packages listed in a requirements file.
 
@@ -162,9 +503,13 @@ def get_installed_requirements_packages_and_version(requirements_path=None):
 
     Parameters
     ----------
-    requirements_path : str or None, optional
-        Path to the requirements file. Defaults to "requirements.txt" in
-        the current directory if None is provided.
+    requirements_path : str, list of str, or None, optional
+        Path to the requirements file, a glob pattern, or a list of them.
+        Defaults to "requirements.txt" in the current directory if None is
+        provided.
+    index : dict or None, optional
+        Installed packages index as returned by `get_installed_packages_index`.
+        If None, a fresh index is built.
 
     Returns
     -------
@@ -173,17 +518,141 @@ def get_installed_requirements_packages_and_version(requirements_path=None):
 
     Notes
     -----
-    - Does not resolve sub-dependencies or transitive dependencies.
+    - Does not resolve sub-dependencies or transitive dependencies, see the
+      `closure` option of `replace_requirements_packages_versions`.
     - Package names are normalized using PEP 503 normalization rules.
     """
 
-    packages = {}
-    for package_name in get_requirements_packages_name(requirements_path):
-        packages[package_name] = get_package_version(package_name)
-    return packages
+    session = PruSession(index=index)
+    return session.get_installed_requirements_packages_and_version(requirements_path)
 
 
-def replace_requirements_packages_versions(requirements_path=None, output_path=None):
+def expand_requirements_paths(requirements_path=None):
+    """
+    Expand requirements file paths and glob patterns.
+
+    Parameters
+    ----------
+    requirements_path : str, list of str, or None, optional
+        A path, a glob pattern such as `services/*/requirements.txt`, or a
+        list of them. `**` matches any number of directories. If None,
+        defaults to the result of `get_requirements_path()`.
+
+    Returns
+    -------
+    list of str
+        Deduplicated paths, in the given order. Glob matches are sorted.
+
+    Raises
+    ------
+    FileNotFoundError
+        If a glob pattern matches no file.
+    """
+
+    if requirements_path is None:
+        requirements_path = get_requirements_path()
+    if isinstance(requirements_path, (str, os.PathLike)):
+        requirements_path = [requirements_path]
+
+    paths = []
+    seen = set()
+    for pattern in requirements_path:
+        pattern = os.fspath(pattern)
+        if _GLOB_MAGIC_RE.search(pattern) and not os.path.exists(pattern):
+            matches = sorted(glob.glob(pattern, recursive=True))
+            if not matches:
+                raise FileNotFoundError(f"No requirements file matches {pattern!r}")
+        else:
+            matches = [pattern]
+        for path in matches:
+            path = os.path.normpath(path)
+            if path not in seen:
+                seen.add(path)
+                paths.append(path)
+    return paths
+
+
+def load_requirements_graph(requirements_path=None):
+    """
+    Parse requirements files and every file they include.
+
+    Files included with `-r`/`--requirement` and `-c`/`--constraint` are
+    followed recursively, relative to the including file. Each file is read
+    and parsed exactly once, even when it is included from many places.
+
+    Parameters
+    ----------
+    requirements_path : str, list of str, or None, optional
+        Path or glob pattern of the root requirements file, or a list of
+        them. If None, defaults to the result of `get_requirements_path()`.
+
+    Returns
+    -------
+    dict
+        Dictionary of {path: RequirementsFile}, with the root files first and
+        the included files in discovery order.
+
+    Raises
+    ------
+    ValueError
+        If the files include each other in a cycle.
+    """
+
+    files = {}
+    with phase("parse"):
+        for path in expand_requirements_paths(requirements_path):
+            _load_requirements_file(path, False, files, [])
+    return files
+
+
+def _load_requirements_file(path, constraint, files, chain):
+    if path in chain:
+        cycle = " -> ".join(chain[chain.index(path) :] + [path])
+        raise ValueError(f"Circular requirements include: {cycle}")
+
+    requirements_file = files.get(path)
+    if requirements_file is None:
+        lines, text_format = read_lines(path)
+        requirements_file = RequirementsFile(
+            path, lines, constraint=constraint, text_format=text_format
+        )
+        files[path] = requirements_file
+    elif constraint or not requirements_file.constraint:
+        return
+    else:
+        # included as requirements after being seen as constraints only
+        requirements_file.constraint = False
+
+    chain.append(path)
+    for include_path, include_constraint in requirements_file.get_includes():
+        _load_requirements_file(
+            include_path, constraint or include_constraint, files, chain
+        )
+    chain.pop()
+
+
+def _load_requirements_files(requirements_path, recursive):
+    paths = expand_requirements_paths(requirements_path)
+    if recursive:
+        return load_requirements_graph(paths)
+    with phase("parse"):
+        return {path: _read_requirements_file(path) for path in paths}
+
+
+def _read_requirements_file(path):
+    lines, text_format = read_lines(path)
+    return RequirementsFile(path, lines, text_format=text_format)
+
+
+def replace_requirements_packages_versions(
+    requirements_path=None,
+    output_path=None,
+    index=None,
+    recursive=False,
+    hash_dirs=None,
+    closure=False,
+    respect_constraints=False,
+):
     """
     Replace versions in a requirements file with installed versions.
 
@@ -194,94 +663,606 @@ def replace_requirements_packages_versions(requirements_path=None, output_path=N
 
     Parameters
     ----------
-    requirements_path : str
+    requirements_path : str, list of str, or None, optional
         Path to the input requirements file. Will be overwritten in-place.
+        Glob patterns and lists of paths pin many files with one index, see
+        `expand_requirements_paths`.
     output_path : str
         Path to the output requirements file. Will be overwritten in-place.
+        Only supported with a single input file.
+    index : dict or None, optional
+        Installed packages index as returned by `get_installed_packages_index`.
+        If None, a fresh index is built.
+    recursive : bool, optional
+        If True, also pin every file included with `-r` or `-c`, in place.
+        `output_path` only applies to the root file.
+    hash_dirs : list of str or None, optional
+        Directories with the wheels and sdists of the pinned versions, e.g.
+        a wheelhouse. If given, each pin gets one `--hash=sha256:` option per
+        matching file, for installs with `--require-hashes`. If None, hashes
+        are left as is.
+    closure : bool, optional
+        If True, also pin every installed package required, directly or not,
+        by the listed packages, according to their `Requires-Dist` metadata.
+        They are written after the listed packages, in a section starting
+        with `CLOSURE_HEADER` that is regenerated on every run, each with a
+        `# via` comment naming the packages requiring it.
+    respect_constraints : bool, optional
+        If True, the installed version is only pinned when it satisfies the
+        specifiers of the line, e.g. `numpy<=1.26.3`, `pkg~=2.1` or
+        `pkg!=1.4.*`. Lines whose installed version violates them are kept
+        as is, see `RequirementsPlan.violations`. If False, every specifier
+        is replaced by `==installed`.
+
+    Returns
+    -------
+    dict
+        Dictionary of {written_path: number_of_changed_pins}.
 
     Notes
     -----
     - Package names are normalized using PEP 503 rules.
     - Uninstalled packages are left unchanged.
+    - Only the version specifier is replaced, extras, environment markers,
+      options, and comments are kept.
+    - A single installed packages index is used for every file.
+    - Files whose content does not change are not written, other files are
+      replaced atomically, see `write_requirements_plans`.
 
     See Also
     --------
-    get_installed_packages_name_and_version : Used internally to obtain
-        installed versions for the listed packages.
+    get_installed_packages_index : Used internally to obtain installed
+        versions for the listed packages.
+    load_requirements_graph : Used to resolve included files when
+        `recursive` is True.
     """
 
-    requirements = read_requirements(requirements_path)
+    return PruSession(index=index).replace_requirements_packages_versions(
+        requirements_path,
+        output_path,
+        recursive,
+        hash_dirs,
+        closure,
+        respect_constraints,
+    )
 
-    installed_packages = get_installed_packages_name_and_version()
 
-    name_mapping = {}
-    for pkg_name in installed_packages:
-        # create normalized key from what is installed
-        normalized = pkg_name.lower().replace("-", "_")
+class RequirementsPlan(
+    namedtuple(
+        "RequirementsPlan",
+        ["path", "current_lines", "lines", "changed", "text_format", "violations"],
+        defaults=(None, ()),
+    )
+):
+    """
+    Planned content of a requirements file.
 
-        # store original name
-        name_mapping[normalized] = pkg_name
+    Attributes
+    ----------
+    path : str
+        Path of the file to write.
+    current_lines : list of str or None
+        Current lines of the file, or None if it does not exist yet.
+    lines : list of str
+        Planned lines of the file.
+    changed : int
+        Number of pins changed by the plan.
+    text_format : pru.textio.TextFormat or None
+        Encoding and line endings of the source file, kept when writing. If
+        None, the file is written as UTF-8 with "\n" line endings.
+    violations : tuple of ConstraintViolation
+        Lines kept unchanged because the installed version violates their
+        specifiers, with `respect_constraints`.
+    """
 
-    updated_requirements = []
-    for requirement in requirements:
-        # TODO:
-        #   support respect all symbols
-        #   support single package in multi package requirements
-        #   support verboste to print what is is updated
-        match = re.search(r"^([\w.-]+)([>=<]+)?([\w.-]+)?(.*)$", requirement, re.DOTALL)
-        if match:
-            req_pkg_name = match.group(1)
-
-            # normalized what is in requirements.txt
-            normalized_req = req_pkg_name.lower().replace("-", "_")
-
-            if normalized_req in name_mapping:
-                installed_pkg_name = name_mapping[normalized_req]
-                # package installed and updated
-                updated_requirements.append(
-                    f"{req_pkg_name}=="
-                    f"{installed_packages[installed_pkg_name]}{match.group(4)}"
-                )
-            else:
-                updated_requirements.append(requirement)
+    __slots__ = ()
+
+    @property
+    def pending(self):
+        """bool: True if writing the plan would change the file."""
+        return self.current_lines != self.lines
+
+    def diff(self):
+        """
+        Get the unified diff between the current and the planned content.
+
+        Returns
+        -------
+        list of str
+            Lines of the unified diff, empty if nothing is pending.
+        """
+
+        import difflib
+
+        return list(
+            difflib.unified_diff(
+                self.current_lines or [],
+                self.lines,
+                fromfile=self.path,
+                tofile=self.path,
+            )
+        )
+
+
+def plan_requirements_versions(
+    requirements_path=None,
+    output_path=None,
+    index=None,
+    recursive=False,
+    hash_dirs=None,
+    closure=False,
+    respect_constraints=False,
+):
+    """
+    Plan the pinning of requirements files without writing them.
+
+    Parameters
+    ----------
+    requirements_path : str, list of str, or None, optional
+        Path to the input requirements file, a glob pattern, or a list of
+        them. If None, defaults to "requirements.txt".
+    output_path : str or None, optional
+        Path of the file to write instead of the input file. Only supported
+        with a single input file.
+    index : dict or None, optional
+        Installed packages index as returned by `get_installed_packages_index`.
+        If None, a fresh index is built.
+    recursive : bool, optional
+        If True, also plan every file included with `-r` or `-c`.
+    hash_dirs : list of str or None, optional
+        Directories with the distribution files of the pinned versions, see
+        `replace_requirements_packages_versions`.
+    closure : bool, optional
+        If True, also pin the transitive dependencies, see
+        `replace_requirements_packages_versions`.
+    respect_constraints : bool, optional
+        If True, only pin installed versions satisfying the specifiers of
+        their line, see `replace_requirements_packages_versions`.
+
+    Returns
+    -------
+    list of RequirementsPlan
+        One plan per file, see `write_requirements_plans`.
+    """
+
+    return PruSession(index=index).plan_requirements_versions(
+        requirements_path,
+        output_path,
+        recursive,
+        hash_dirs,
+        closure,
+        respect_constraints=respect_constraints,
+    )
+
+
+def _plan_versions(
+    files,
+    output_path=None,
+    index=None,
+    hash_dirs=None,
+    closure=False,
+    respect_constraints=False,
+):
+    if index is None:
+        index = get_installed_packages_index()
+    closures = {}
+    if closure:
+        with phase("closure"):
+            closures = _get_closures(files, index)
+    hashes = None
+    if hash_dirs is not None:
+        # every file is hashed at once, in parallel
+        with phase("hashes"):
+            hashes = _get_package_hashes(files, index, hash_dirs, closures)
+
+    with phase("plan"):
+        return _plan_files(
+            files, output_path, index, hashes, closures, respect_constraints
+        )
+
+
+def _plan_files(files, output_path, index, hashes, closures, respect_constraints):
+    plans = []
+    for i, requirements_file in enumerate(files.values()):
+        violations = [] if respect_constraints else None
+        if requirements_file.path in closures:
+            lines, changed = _add_closure(
+                requirements_file,
+                closures[requirements_file.path],
+                index,
+                hashes,
+                violations,
+            )
         else:
-            # not a package, comments or whitespaces
-            updated_requirements.append(requirement)
+            lines, changed = _pin_installed_versions(
+                requirements_file.lines,
+                requirements_file.requirements,
+                index,
+                hashes,
+                violations,
+            )
+        path = output_path if i == 0 and output_path else requirements_file.path
+        if path == requirements_file.path:
+            current_lines = requirements_file.lines
+        elif os.path.exists(path):
+            current_lines = read_requirements(path)
+        else:
+            current_lines = None
+        plans.append(
+            RequirementsPlan(
+                path,
+                current_lines,
+                lines,
+                changed,
+                requirements_file.text_format,
+                tuple(
+                    ConstraintViolation(
+                        requirements_file.path,
+                        requirement.span[0] + 1,
+                        requirement.name,
+                        _format_specifiers(requirement.specifiers),
+                        version,
+                    )
+                    for requirement, version in violations or ()
+                ),
+            )
+        )
+    return plans
+
+
+def write_requirements_plans(plans):
+    """
+    Write planned requirements files.
+
+    Files whose content would not change are not written, so their mtime is
+    kept. Other files are replaced atomically, with the encoding, byte order
+    mark and line endings of their source file.
+
+    Parameters
+    ----------
+    plans : list of RequirementsPlan
+        Plans from `plan_requirements_versions`.
+
+    Returns
+    -------
+    dict
+        Dictionary of {path: number_of_changed_pins}.
+    """
+
+    report = {}
+    with phase("write"):
+        for plan in plans:
+            if plan.pending:
+                write_lines(plan.path, plan.lines, plan.text_format)
+            report[plan.path] = plan.changed
+    return report
+
+
+def _print_line(stream, line):
+    print(line, file=sys.stderr if stream == "stderr" else sys.stdout, flush=True)
+
+
+def _write_log_event(log_file, event):
+    if log_file is not None:
+        import json
+
+        event["time"] = time.time()
+        log_file.write(json.dumps(event) + "\n")
+        log_file.flush()
+
+
+async def _read_stream(stream, name, pid, on_line, log_file):
+    while True:
+        line = await stream.readline()
+        if not line:
+            break
+        text = line.decode("utf-8", errors="replace").rstrip("\r\n")
+        if on_line is not None:
+            on_line(name, text)
+        _write_log_event(
+            log_file, {"event": "output", "pid": pid, "stream": name, "line": text}
+        )
+
+
+async def run_subprocess_async(command, timeout=None, log_file=None, on_line=None):
+    """
+    Run a subprocess, streaming its stdout and stderr concurrently.
+
+    Parameters
+    ----------
+    command : str or list of str
+        Shell command, or program arguments executed without a shell.
+    timeout : float or None, optional
+        Seconds to wait for the process before killing it.
+    log_file : file-like or None, optional
+        Text stream receiving structured JSON lines events: `start`, one
+        `output` per line with its `stream`, and `exit` with the
+        `returncode`.
+    on_line : callable or None, optional
+        Called with `(stream, line)` for every output line, where `stream`
+        is "stdout" or "stderr". If None, output is discarded.
+
+    Returns
+    -------
+    int
+        Exit code of the process.
+
+    Raises
+    ------
+    subprocess.TimeoutExpired
+        If the process did not finish within `timeout`. The process is
+        killed.
+    """
+
+    # asyncio is only imported to run installers, it doubles the import time
+    # of pru
+    import asyncio
+
+    kwargs = {"stdout": PIPE, "stderr": PIPE, "limit": _STREAM_LIMIT}
+    if isinstance(command, str):
+        process = await asyncio.create_subprocess_shell(command, **kwargs)
+    else:
+        process = await asyncio.create_subprocess_exec(*command, **kwargs)
+
+    pid = process.pid
+    start = time.perf_counter()
+    _write_log_event(log_file, {"event": "start", "pid": pid, "command": command})
+    communicate = asyncio.gather(
+        _read_stream(process.stdout, "stdout", pid, on_line, log_file),
+        _read_stream(process.stderr, "stderr", pid, on_line, log_file),
+        process.wait(),
+    )
+    try:
+        await asyncio.wait_for(communicate, timeout)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+        _write_log_event(log_file, {"event": "timeout", "pid": pid, "timeout": timeout})
+        raise TimeoutExpired(command, timeout) from None
+
+    _write_log_event(
+        log_file,
+        {
+            "event": "exit",
+            "pid": pid,
+            "returncode": process.returncode,
+            "duration": time.perf_counter() - start,
+        },
+    )
+    return process.returncode
+
 
-    if output_path is None:
-        if requirements_path is None:
-            requirements_path = get_requirements_path()
-        output_path = requirements_path
+def _run_coroutine(coroutine):
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor
 
-    with open(output_path, "w") as f:
-        f.writelines(updated_requirements)
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    # an event loop is already running in this thread, e.g. in Jupyter
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coroutine).result()
 
 
-def verbose_subprocess(command):
+def _open_log(log_path):
+    if log_path is None:
+        return contextlib.nullcontext()
+    return open(log_path, "a", encoding="utf-8")
+
+
+def verbose_subprocess(
+    command, timeout=None, log_path=None, check=False, on_line=_print_line
+):
     """
     Run a subprocess command and print real-time output to the console.
 
-    Useful for observing pip/uv upgrade/install output as it happens. Lines are
-    printed to stdout as soon as they are received.
+    Useful for observing pip/uv upgrade/install output as it happens. Stdout
+    and stderr are read concurrently and each line is printed to the matching
+    console stream as soon as it is received.
+
+    Parameters
+    ----------
+    command : str or list of str
+        The shell command to execute, or program arguments executed without a
+        shell.
+    timeout : float or None, optional
+        Seconds to wait for the command before killing it.
+    log_path : str or None, optional
+        Path to a JSON lines file receiving the structured output events,
+        see `run_subprocess_async`. Events are appended.
+    check : bool, optional
+        If True, raise `subprocess.CalledProcessError` on a non-zero exit
+        code.
+    on_line : callable or None, optional
+        Called with `(stream, line)` for every output line. Defaults to
+        printing to the console.
+
+    Returns
+    -------
+    int
+        Exit code of the command.
+
+    Raises
+    ------
+    subprocess.CalledProcessError
+        If `check` is True and the command failed.
+    subprocess.TimeoutExpired
+        If the command did not finish within `timeout`.
+    """
+
+    with _open_log(log_path) as log_file:
+        returncode = _run_coroutine(
+            run_subprocess_async(command, timeout, log_file, on_line)
+        )
+    if check and returncode != 0:
+        raise CalledProcessError(returncode, command)
+    return returncode
+
+
+def run_subprocesses(
+    commands, max_workers=None, timeout=None, log_path=None, on_line=_print_line
+):
+    """
+    Run several subprocesses concurrently.
 
     Parameters
     ----------
-    command : str
-        The shell command to execute.
+    commands : list of str or list of list of str
+        Commands, see `verbose_subprocess`.
+    max_workers : int or None, optional
+        Maximum number of processes running at the same time. If None, all
+        commands run at once.
+    timeout : float or None, optional
+        Seconds to wait for each command before killing it.
+    log_path : str or None, optional
+        Path to a JSON lines file receiving the structured output events of
+        every command, which are told apart by their `pid`.
+    on_line : callable or None, optional
+        Called with `(stream, line)` for every output line. Defaults to
+        printing to the console.
 
     Returns
     -------
-    None
+    list of int or subprocess.TimeoutExpired
+        Exit code of each command, in the order of `commands`, or the
+        timeout exception of commands that timed out.
     """
 
-    with Popen(
-        command, stdout=PIPE, shell=True, stderr=STDOUT, bufsize=0, close_fds=True
-    ) as process:
-        for line in iter(process.stdout.readline, b""):
-            print(line.rstrip().decode("utf-8"))
+    import asyncio
 
+    async def run_all(log_file):
+        semaphore = asyncio.Semaphore(max_workers or len(commands) or 1)
 
-def upgrade_installed(requirements_path=None, command=None):
+        async def run_one(command):
+            async with semaphore:
+                return await run_subprocess_async(command, timeout, log_file, on_line)
+
+        return await asyncio.gather(
+            *[run_one(command) for command in commands], return_exceptions=True
+        )
+
+    with _open_log(log_path) as log_file:
+        results = _run_coroutine(run_all(log_file))
+    for result in results:
+        if not isinstance(result, (int, TimeoutExpired)):
+            raise result
+    return list(results)
+
+
+def _get_upgrade_requirements(files):
+    # packages of constraints files are pinned, but not upgraded
+    return [
+        requirement
+        for requirements_file in files.values()
+        if not requirements_file.constraint
+        for requirement in requirements_file.requirements
+    ]
+
+
+def _prefetch(requirements, wheelhouse, max_workers, timeout, log_path, constraints):
+    # imported here, since pru.wheelhouse imports pru.core
+    from pru.wheelhouse import get_find_links_dir, prefetch_wheels
+
+    with phase("prefetch"):
+        prefetch_wheels(
+            _get_install_names(requirements, constraints),
+            wheelhouse=wheelhouse,
+            max_workers=max_workers,
+            timeout=timeout,
+            log_path=log_path,
+        )
+    return f"--no-index --find-links {_quote_argument(get_find_links_dir(wheelhouse))}"
+
+
+def _run_installer(
+    command,
+    requirements,
+    timeout=None,
+    log_path=None,
+    prefetch=False,
+    wheelhouse=None,
+    max_workers=None,
+    respect_constraints=False,
+    bisect_failures=False,
+):
+    if prefetch:
+        options = _prefetch(
+            requirements,
+            wheelhouse,
+            max_workers,
+            timeout,
+            log_path,
+            respect_constraints,
+        )
+        command = f"{command} {options}"
+    names = _get_install_names(requirements, respect_constraints)
+    try:
+        with phase("install", command=command):
+            if bisect_failures:
+                return _bisect_install(command, names, timeout, log_path)
+            verbose_subprocess(
+                f"{command} {_get_install_arguments(names)}",
+                timeout=timeout,
+                log_path=log_path,
+                check=True,
+            )
+            return []
+    finally:
+        # even a failed installer run may have changed the environment, and
+        # may have created directories missing from `sys.path`
+        refresh_environment_paths()
+        invalidate_snapshot()
+
+
+def _bisect_install(command, names, timeout=None, log_path=None):
+    # the halves of every failed batch run again until the failing packages
+    # are isolated, so k failures among n packages take O(k log n) runs;
+    # batches of the same round run concurrently when the backend allows it
+    concurrent = _is_uv_command(command)
+    held_back = []
+    batches = [names]
+    while batches:
+        commands = [f"{command} {_get_install_arguments(batch)}" for batch in batches]
+        with phase("bisect", batches=len(batches)):
+            if concurrent:
+                results = run_subprocesses(commands, timeout=timeout, log_path=log_path)
+            else:
+                results = [
+                    verbose_subprocess(
+                        batch_command, timeout=timeout, log_path=log_path
+                    )
+                    for batch_command in commands
+                ]
+        failed = []
+        for batch, result in zip(batches, results):
+            if isinstance(result, TimeoutExpired):
+                raise result
+            if result == 0:
+                continue
+            if len(batch) <= 1:
+                held_back.extend(batch)
+            else:
+                middle = len(batch) // 2
+                failed += [batch[:middle], batch[middle:]]
+        batches = failed
+    order = {name: i for i, name in enumerate(names)}
+    return sorted(held_back, key=order.__getitem__)
+
+
+def upgrade_installed(
+    requirements_path=None,
+    command=None,
+    backend=None,
+    timeout=None,
+    log_path=None,
+    recursive=False,
+    prefetch=False,
+    wheelhouse=None,
+    max_workers=None,
+    respect_constraints=False,
+    bisect_failures=False,
+):
     """
     Upgrade all installed packages listed in the requirements file.
 
@@ -290,12 +1271,55 @@ def upgrade_installed(requirements_path=None, command=None):
 
     Parameters
     ----------
-    requirements_path : str
-        Path to the requirements file to read package names from.
+    requirements_path : str, list of str, or None, optional
+        Path to the requirements file to read package names from, a glob
+        pattern, or a list of them.
     command : str or None
         Command used to upgrade each package. If None, automatically selects
         "uv pip install --upgrade" if uv is available, otherwise falls back to
         "pip install --upgrade --user".
+    backend : str or None, optional
+        Installer backend, "uv" or "pip", used to pick the default command
+        when `command` is None. If None, the backend is detected lazily.
+    timeout : float or None, optional
+        Seconds to wait for the installer before killing it.
+    log_path : str or None, optional
+        Path to a JSON lines file receiving the installer output events, see
+        `verbose_subprocess`.
+    recursive : bool, optional
+        If True, also upgrade the packages of every file included with `-r`.
+    prefetch : bool, optional
+        If True, first download the packages and their dependencies
+        concurrently into the wheelhouse, then install offline from it with
+        `--no-index --find-links`, see `pru.wheelhouse.prefetch_wheels`.
+    wheelhouse : str or None, optional
+        Wheelhouse directory used when `prefetch` is True. If None, uses a
+        wheelhouse in the pru cache directory, shared by every environment.
+    max_workers : int or None, optional
+        Maximum number of concurrent downloads when `prefetch` is True.
+    respect_constraints : bool, optional
+        If True, packages are passed to the installer with the specifiers of
+        their line, e.g. `numpy<=1.26.3`, so they are only upgraded within
+        them. Exact `==` pins are still upgraded.
+    bisect_failures : bool, optional
+        If True and the installer fails, the batch of packages is split in
+        halves that are installed again, recursively, until the packages
+        failing on their own are isolated. Every other package is upgraded.
+        Halves run concurrently with uv, one after the other otherwise.
+
+    Returns
+    -------
+    list of str
+        Packages held back by `bisect_failures` because their upgrade
+        failed, in requirements order. Empty otherwise.
+
+    Raises
+    ------
+    subprocess.CalledProcessError
+        If the installer or a prefetch download failed, unless
+        `bisect_failures` is True and only the installer failed.
+    subprocess.TimeoutExpired
+        If the installer did not finish within `timeout`.
 
     Notes
     -----
@@ -304,17 +1328,36 @@ def upgrade_installed(requirements_path=None, command=None):
     - Automatically uses uv if available for faster package installation.
     """
 
-    if command is None:
-        command = (
-            "uv pip install --upgrade" if IS_UV else "pip install --upgrade --user"
-        )
-
-    verbose_subprocess(
-        f"{command} {' '.join(get_requirements_packages_name(requirements_path))}"
+    return PruSession(backend=backend).upgrade_installed(
+        requirements_path,
+        command=command,
+        timeout=timeout,
+        log_path=log_path,
+        recursive=recursive,
+        prefetch=prefetch,
+        wheelhouse=wheelhouse,
+        max_workers=max_workers,
+        respect_constraints=respect_constraints,
+        bisect_failures=bisect_failures,
     )
 
 
-def upgrade_requirements(requirements_path=None, output_path=None, command=None):
+def upgrade_requirements(
+    requirements_path=None,
+    output_path=None,
+    command=None,
+    backend=None,
+    recursive=False,
+    timeout=None,
+    log_path=None,
+    prefetch=False,
+    wheelhouse=None,
+    max_workers=None,
+    hash_dirs=None,
+    closure=False,
+    respect_constraints=False,
+    bisect_failures=False,
+):
     """
     Upgrade all packages listed in requirements.txt and pin their versions.
 
@@ -332,17 +1375,72 @@ def upgrade_requirements(requirements_path=None, output_path=None, command=None)
 
     Parameters
     ----------
-    requirements_path : str or None, optional
+    requirements_path : str, list of str, or None, optional
         Path to the input requirements file. If None, defaults to
-        "requirements.txt" in the current directory.
+        "requirements.txt" in the current directory. Glob patterns and lists
+        of paths upgrade the deduplicated union of their packages with a
+        single installer run, see `expand_requirements_paths`.
     output_path : str or None, optional
         Path to the output file to write the updated, pinned requirements.
-        If None, will overwrite the input file.
+        If None, will overwrite the input file. Only supported with a single
+        input file.
     command : str or None, optional
         Shell command used to perform the upgrade. If None, automatically selects
         "uv pip install --upgrade" if uv is available, otherwise falls back to
         "pip install --upgrade --user". The command is appended with
         package names before execution.
+    backend : str or None, optional
+        Installer backend, "uv" or "pip", used to pick the default command
+        when `command` is None. If None, the backend is detected lazily.
+    recursive : bool, optional
+        If True, also upgrade the packages of every file included with `-r`
+        and pin every file included with `-r` or `-c`, in place. Packages of
+        constraints files are pinned but not upgraded.
+    timeout : float or None, optional
+        Seconds to wait for the installer before killing it.
+    log_path : str or None, optional
+        Path to a JSON lines file receiving the installer output events, see
+        `verbose_subprocess`.
+    prefetch : bool, optional
+        If True, first download the packages and their dependencies
+        concurrently into the wheelhouse, then install offline from it with
+        `--no-index --find-links`, see `pru.wheelhouse.prefetch_wheels`.
+    wheelhouse : str or None, optional
+        Wheelhouse directory used when `prefetch` is True. If None, uses a
+        wheelhouse in the pru cache directory, shared by every environment.
+    max_workers : int or None, optional
+        Maximum number of concurrent downloads when `prefetch` is True.
+    hash_dirs : list of str or None, optional
+        Directories with the distribution files of the pinned versions, see
+        `replace_requirements_packages_versions`. With `prefetch`, pass the
+        wheelhouse `files` directory to hash the downloaded files.
+    closure : bool, optional
+        If True, also pin the transitive dependencies installed by the
+        upgrade, see `replace_requirements_packages_versions`.
+    respect_constraints : bool, optional
+        If True, packages are only upgraded within the specifiers of their
+        line, and only pinned if the installed version satisfies them, see
+        `upgrade_installed` and `replace_requirements_packages_versions`.
+    bisect_failures : bool, optional
+        If True, a failed installer run is bisected to hold back the failing
+        packages, see `upgrade_installed`. Every file is pinned afterwards,
+        held back packages with the version still installed.
+
+    Returns
+    -------
+    UpgradeResult
+        Named tuple of `(report, held_back)`, where `report` is a dictionary
+        of {written_path: number_of_changed_pins}, and `held_back` lists the
+        packages held back by `bisect_failures`, empty otherwise.
+
+    Raises
+    ------
+    subprocess.CalledProcessError
+        If the installer or a prefetch download failed. No file is
+        rewritten. With `bisect_failures`, only raised by prefetching.
+    subprocess.TimeoutExpired
+        If the installer did not finish within `timeout`. No file is
+        rewritten.
 
     Notes
     -----
@@ -352,6 +1450,8 @@ def upgrade_requirements(requirements_path=None, output_path=None, command=None)
       version found in the current environment.
     - The function normalizes package names to resolve discrepancies like
       `some-pkg` vs `some_pkg`.
+    - The environment snapshot is invalidated after the upgrade, so pinning
+      sees the freshly installed versions.
     - Automatically uses uv if available for faster package installation.
 
     See Also
@@ -362,14 +1462,508 @@ def upgrade_requirements(requirements_path=None, output_path=None, command=None)
         file.
     """
 
-    if command is None:
-        command = (
-            "uv pip install --upgrade" if IS_UV else "pip install --upgrade --user"
+    return PruSession(backend=backend).upgrade_requirements(
+        requirements_path,
+        output_path=output_path,
+        command=command,
+        recursive=recursive,
+        timeout=timeout,
+        log_path=log_path,
+        prefetch=prefetch,
+        wheelhouse=wheelhouse,
+        max_workers=max_workers,
+        hash_dirs=hash_dirs,
+        closure=closure,
+        respect_constraints=respect_constraints,
+        bisect_failures=bisect_failures,
+    )
+
+
+def resolve_requirements(
+    requirements_path=None,
+    output_path=None,
+    backend=None,
+    recursive=False,
+    find_links=None,
+    index_url=None,
+    no_index=False,
+    python=None,
+    timeout=None,
+    log_path=None,
+    hash_dirs=None,
+    closure=False,
+    respect_constraints=False,
+):
+    """
+    Pin the versions an upgrade would install, without installing them.
+
+    The latest versions of the packages listed in requirements files are
+    resolved by the installer backend, see `pru.resolve.resolve_versions`,
+    and pinned in place of the installed versions. The environment is not
+    modified, so CI jobs updating requirements files need no install.
+
+    Parameters
+    ----------
+    requirements_path : str, list of str, or None, optional
+        Path to the input requirements file, a glob pattern, or a list of
+        them. If None, defaults to "requirements.txt".
+    output_path : str or None, optional
+        Path to the output file. If None, will overwrite the input file.
+        Only supported with a single input file.
+    backend : str or None, optional
+        Resolver backend, "pip" for `pip install --dry-run --report` or "uv"
+        for `uv pip compile`. If None, uses uv when available.
+    recursive : bool, optional
+        If True, also resolve the packages of every file included with `-r`,
+        with the files included with `-c` as constraints, and pin them all.
+    find_links : list of str or None, optional
+        Directories of distributions to resolve from.
+    index_url : str or None, optional
+        Base URL of the package index. If None, the backend default is used.
+    no_index : bool, optional
+        If True, only `find_links` are used, so the resolution runs offline.
+    python : str or None, optional
+        Interpreter whose environment the resolution targets. If None, uses
+        the running interpreter.
+    timeout : float or None, optional
+        Seconds to wait for the resolver before killing it.
+    log_path : str or None, optional
+        Path to a JSON lines file receiving the resolver output events.
+    hash_dirs : list of str or None, optional
+        Directories with the distribution files of the pinned versions, see
+        `replace_requirements_packages_versions`.
+    closure : bool, optional
+        If True, also pin the resolved transitive dependencies, see
+        `replace_requirements_packages_versions`. Only supported by pip,
+        whose report lists the dependencies of each distribution.
+    respect_constraints : bool, optional
+        If True, packages are resolved within the specifiers of their line,
+        see `upgrade_installed`.
+
+    Returns
+    -------
+    dict
+        Dictionary of {written_path: number_of_changed_pins}.
+
+    Raises
+    ------
+    ValueError
+        If `closure` is True with the uv backend.
+    subprocess.CalledProcessError
+        If the resolution failed. No file is rewritten.
+    subprocess.TimeoutExpired
+        If the resolver did not finish within `timeout`. No file is
+        rewritten.
+    """
+
+    session = PruSession(backend=backend)
+    session.resolve_versions(
+        requirements_path,
+        recursive=recursive,
+        closure=closure,
+        find_links=find_links,
+        index_url=index_url,
+        no_index=no_index,
+        python=python,
+        timeout=timeout,
+        log_path=log_path,
+        respect_constraints=respect_constraints,
+    )
+    return session.replace_requirements_packages_versions(
+        requirements_path,
+        output_path,
+        recursive,
+        hash_dirs,
+        closure,
+        respect_constraints,
+    )
+
+
+class PruSession:
+    """
+    Long-lived state shared by many pru operations.
+
+    A session holds the installer backend, the parsed requirements files and
+    the installed packages index, so services calling pru repeatedly read,
+    parse and scan them once. The module-level functions of `pru.core` are
+    thin wrappers around a short-lived session.
+
+    Parameters
+    ----------
+    backend : str or None, optional
+        Installer backend, "uv" or "pip", used to pick the default upgrade
+        command. If None, the backend is detected on first use.
+    paths : list of str or None, optional
+        Directories scanned for installed packages, see
+        `get_installed_packages_index`.
+    index : dict or None, optional
+        Installed packages index to start from. If None, the environment is
+        scanned on first use.
+    use_cache : bool, optional
+        If False, the on-disk environment snapshot is not used.
+    snapshot_path : str, dict or None, optional
+        Snapshot file of the scanned directories, see
+        `get_installed_packages_index`, e.g. the snapshots of the
+        environments of `paths`.
+
+    Notes
+    -----
+    - Parsed files are kept until `refresh` is called, except files written
+      by the session, which are read again on next use.
+    - The index is kept until `invalidate` or `refresh` is called. Upgrades
+      run by the session invalidate it, so pins are read from the freshly
+      installed versions.
+
+    Examples
+    --------
+    >>> session = PruSession()
+    >>> versions = session.get_installed_requirements_packages_and_version()
+    >>> report = session.replace_requirements_packages_versions()
+    """
+
+    def __init__(
+        self, backend=None, paths=None, index=None, use_cache=True, snapshot_path=None
+    ):
+        self.backend = backend
+        self.paths = paths
+        self.use_cache = use_cache
+        self.snapshot_path = snapshot_path
+        self._index = index
+        self._command = None
+        self._files = {}
+
+    @property
+    def index(self):
+        """dict: Installed packages index, scanned on first access."""
+        if self._index is None:
+            self._index = get_installed_packages_index(
+                self.paths, self.use_cache, snapshot_path=self.snapshot_path
+            )
+        return self._index
+
+    @property
+    def command(self):
+        """str: Default upgrade command of the backend, resolved once."""
+        if self._command is None:
+            self._command = get_upgrade_command(self.backend)
+        return self._command
+
+    def invalidate(self):
+        """
+        Forget the installed packages index, e.g. after an install.
+
+        The on-disk environment snapshot is invalidated too, so the next
+        access to `index` reads the metadata of every distribution again.
+        """
+
+        self._index = None
+        invalidate_snapshot(self.snapshot_path)
+
+    def refresh(self):
+        """
+        Forget every parsed requirements file and the installed packages index.
+        """
+
+        self.invalidate_files()
+        self.invalidate()
+
+    def invalidate_files(self, paths=None):
+        """
+        Forget parsed requirements files, e.g. after they were edited.
+
+        Parameters
+        ----------
+        paths : iterable of str or None, optional
+            Paths of the changed files. Every loaded set of files including
+            one of them is dropped. If None, every parsed file is dropped.
+        """
+
+        if paths is None:
+            self._files.clear()
+            return
+        paths = {os.path.normpath(path) for path in paths}
+        for key, files in list(self._files.items()):
+            if paths.intersection(files):
+                del self._files[key]
+
+    def load_requirements_files(
+        self, requirements_path=None, recursive=False, output_path=None
+    ):
+        """
+        Read and parse requirements files, once per session.
+
+        Parameters
+        ----------
+        requirements_path : str, list of str, or None, optional
+            Path to the requirements file, a glob pattern, or a list of them.
+            If None, defaults to "requirements.txt".
+        recursive : bool, optional
+            If True, also load every file included with `-r` or `-c`, see
+            `load_requirements_graph`.
+        output_path : str or None, optional
+            Output path of the operation, only allowed with a single file.
+
+        Returns
+        -------
+        dict
+            Dictionary of {path: RequirementsFile}.
+
+        Raises
+        ------
+        ValueError
+            If `output_path` is given with many files, or files include each
+            other in a cycle.
+        """
+
+        paths = expand_requirements_paths(requirements_path)
+        if output_path and len(paths) > 1:
+            raise ValueError(
+                "An output path can only be used with one requirements file"
+            )
+        key = (tuple(paths), recursive)
+        files = self._files.get(key)
+        if files is None:
+            files = self._files[key] = _load_requirements_files(paths, recursive)
+        return files
+
+    def get_installed_packages_name_and_version(self):
+        """
+        Get a mapping of all installed packages to their installed versions.
+
+        See `get_installed_packages_name_and_version`.
+        """
+
+        return {package.name: package.version for package in self.index.values()}
+
+    def get_installed_requirements_packages_and_version(self, requirements_path=None):
+        """
+        Get installed versions for packages listed in requirements files.
+
+        See `get_installed_requirements_packages_and_version`.
+        """
+
+        packages = {}
+        for requirements_file in self.load_requirements_files(
+            requirements_path
+        ).values():
+            for package_name in _get_packages_name(requirements_file.requirements):
+                package = self.index.get(canonicalize_name(package_name))
+                packages[package_name] = None if package is None else package.version
+        return packages
+
+    def plan_requirements_versions(
+        self,
+        requirements_path=None,
+        output_path=None,
+        recursive=False,
+        hash_dirs=None,
+        closure=False,
+        packages=None,
+        respect_constraints=False,
+    ):
+        """
+        Plan the pinning of requirements files without writing them.
+
+        See `plan_requirements_versions`. With `packages`, an iterable of
+        package names, only the lines of these packages are pinned, and the
+        other lines are kept as is. `packages` can not be used with
+        `closure`.
+        """
+
+        files = self.load_requirements_files(requirements_path, recursive, output_path)
+        index = self.index
+        if packages is not None:
+            if closure:
+                raise ValueError("packages can not be used with closure")
+            # packages missing from the index are left unchanged
+            keys = {canonicalize_name(name) for name in packages}
+            index = {key: package for key, package in index.items() if key in keys}
+        return _plan_versions(
+            files, output_path, index, hash_dirs, closure, respect_constraints
         )
 
-    package_names = get_requirements_packages_name(requirements_path)
-    verbose_subprocess(f"{command} {' '.join(package_names)}")
-    replace_requirements_packages_versions(requirements_path, output_path)
+    def write_requirements_plans(self, plans):
+        """
+        Write planned requirements files.
+
+        See `write_requirements_plans`. Parsed files including a written
+        path are dropped from the session.
+        """
+
+        report = write_requirements_plans(plans)
+        self.invalidate_files(plan.path for plan in plans if plan.pending)
+        return report
+
+    def replace_requirements_packages_versions(
+        self,
+        requirements_path=None,
+        output_path=None,
+        recursive=False,
+        hash_dirs=None,
+        closure=False,
+        respect_constraints=False,
+    ):
+        """
+        Replace versions in requirements files with installed versions.
+
+        See `replace_requirements_packages_versions`.
+        """
+
+        return self.write_requirements_plans(
+            self.plan_requirements_versions(
+                requirements_path,
+                output_path,
+                recursive,
+                hash_dirs,
+                closure,
+                respect_constraints=respect_constraints,
+            )
+        )
+
+    def _run_installer(self, command, files, **kwargs):
+        try:
+            return _run_installer(
+                command or self.command, _get_upgrade_requirements(files), **kwargs
+            )
+        finally:
+            # even a failed installer run may have changed the environment
+            self._index = None
+            if self.snapshot_path is not None:
+                # e.g. of the environment of an `--env` install
+                invalidate_snapshot(self.snapshot_path)
+
+    def upgrade_installed(
+        self,
+        requirements_path=None,
+        command=None,
+        timeout=None,
+        log_path=None,
+        recursive=False,
+        prefetch=False,
+        wheelhouse=None,
+        max_workers=None,
+        respect_constraints=False,
+        bisect_failures=False,
+    ):
+        """
+        Upgrade all installed packages listed in requirements files.
+
+        See `upgrade_installed`. The index is invalidated after the install.
+        """
+
+        return self._run_installer(
+            command,
+            self.load_requirements_files(requirements_path, recursive),
+            timeout=timeout,
+            log_path=log_path,
+            prefetch=prefetch,
+            wheelhouse=wheelhouse,
+            max_workers=max_workers,
+            respect_constraints=respect_constraints,
+            bisect_failures=bisect_failures,
+        )
+
+    def upgrade_requirements(
+        self,
+        requirements_path=None,
+        output_path=None,
+        command=None,
+        recursive=False,
+        timeout=None,
+        log_path=None,
+        prefetch=False,
+        wheelhouse=None,
+        max_workers=None,
+        hash_dirs=None,
+        closure=False,
+        respect_constraints=False,
+        bisect_failures=False,
+    ):
+        """
+        Upgrade all packages listed in requirements files and pin them.
+
+        See `upgrade_requirements`. The index is invalidated after the
+        install, and files are read and parsed once for both steps.
+        """
+
+        files = self.load_requirements_files(requirements_path, recursive, output_path)
+        held_back = self._run_installer(
+            command,
+            files,
+            timeout=timeout,
+            log_path=log_path,
+            prefetch=prefetch,
+            wheelhouse=wheelhouse,
+            max_workers=max_workers,
+            respect_constraints=respect_constraints,
+            bisect_failures=bisect_failures,
+        )
+        report = self.replace_requirements_packages_versions(
+            requirements_path,
+            output_path,
+            recursive,
+            hash_dirs,
+            closure,
+            respect_constraints,
+        )
+        return UpgradeResult(report, held_back)
+
+    def resolve_versions(
+        self,
+        requirements_path=None,
+        recursive=False,
+        find_links=None,
+        index_url=None,
+        no_index=False,
+        python=None,
+        timeout=None,
+        log_path=None,
+        respect_constraints=False,
+        closure=False,
+    ):
+        """
+        Resolve the upgrades of requirements files without installing them.
+
+        See `resolve_requirements`. The resolved versions replace the index
+        of the session, so the next plans pin them, until `invalidate` or
+        `refresh` is called. `closure` tells that the next plans pin the
+        transitive dependencies, which uv does not report.
+
+        Returns
+        -------
+        dict
+            Index of the resolved distributions, see
+            `pru.resolve.resolve_versions`.
+
+        Raises
+        ------
+        ValueError
+            If `closure` is True with the uv backend.
+        """
+
+        # imported here, since pru.resolve imports pru.core
+        from pru.resolve import resolve_versions
+
+        backend = resolve_backend(self.backend)
+        if closure and backend == "uv":
+            raise ValueError(
+                "closure cannot be used to resolve with uv, whose resolution "
+                "does not list the dependencies of each package, use the pip "
+                "backend"
+            )
+        files = self.load_requirements_files(requirements_path, recursive)
+        self._index = resolve_versions(
+            _get_install_names(_get_upgrade_requirements(files), respect_constraints),
+            backend=backend,
+            constraints=[path for path, f in files.items() if f.constraint],
+            find_links=find_links,
+            index_url=index_url,
+            no_index=no_index,
+            python=python,
+            timeout=timeout,
+            log_path=log_path,
+        )
+        return self._index
 
 
 def get_requirements_path():
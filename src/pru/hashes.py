@@ -0,0 +1,228 @@
+"""Hashes of distribution files for hash-locked requirements files.
+
+Distribution files are looked up by name and version in local directories,
+such as the wheelhouse filled by `--prefetch`, and hashed in a thread pool.
+Files are read in chunks, and `hashlib` releases the GIL while hashing them,
+so large wheels are hashed in parallel. Digests are cached on disk keyed by
+the path, size and mtime of each file, so hashing an unchanged wheelhouse
+again reads no file at all.
+"""
+
+import hashlib
+import os
+import time
+
+from pru.cache import (
+    get_cache_dir,
+    load_json_cache,
+    prune_cache_entries,
+    store_json_cache,
+    touch_cache_entries,
+)
+from pru.pep440 import parse_version
+from pru.snapshot import RACY_NS
+from pru.utils import canonicalize_name
+
+HASH_CACHE_VERSION = 1
+
+# digests kept in the cache, the least recently used are dropped
+MAX_CACHED_FILES = 2**16
+
+_CHUNK_SIZE = 2**20
+
+_ARCHIVE_EXTENSIONS = (".whl", ".tar.gz", ".tar.bz2", ".tar.xz", ".tgz", ".zip")
+
+
+def hash_file(path):
+    """
+    Compute the sha256 digest of a file.
+
+    Parameters
+    ----------
+    path : str
+        Path of the file, read in chunks of 1 MiB.
+
+    Returns
+    -------
+    str
+        Hexadecimal sha256 digest.
+    """
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _load_hash_cache(cache_path):
+    data = load_json_cache(cache_path)
+    if not isinstance(data, dict) or data.get("version") != HASH_CACHE_VERSION:
+        data = {"version": HASH_CACHE_VERSION, "files": {}}
+    return data
+
+
+def get_file_digests(paths, max_workers=None, cache_path=None, use_cache=True):
+    """
+    Compute the sha256 digests of many files in parallel.
+
+    Parameters
+    ----------
+    paths : iterable of str
+        Paths of the files.
+    max_workers : int or None, optional
+        Maximum number of files hashed at the same time. If None, uses the
+        number of CPUs.
+    cache_path : str or None, optional
+        Path of the digest cache. If None, uses `get_cache_dir("hashes.json")`.
+    use_cache : bool, optional
+        If False, every file is hashed and the cache is neither read nor
+        written.
+
+    Returns
+    -------
+    dict
+        Dictionary of {absolute_path: sha256}.
+
+    Notes
+    -----
+    - Cached digests are reused when the size and mtime of the file are
+      unchanged. Files modified within a couple of seconds of the run are
+      not cached, since a later change could keep the same mtime.
+    - Digests unused for `pru.cache.MAX_AGE` seconds are dropped from the
+      cache, and the least recently used ones when it holds too many.
+    """
+
+    if cache_path is None:
+        cache_path = get_cache_dir("hashes.json")
+    data = (
+        _load_hash_cache(cache_path)
+        if use_cache
+        else {"version": HASH_CACHE_VERSION, "files": {}}
+    )
+    cached_files = data["files"]
+    now = time.time_ns()
+
+    digests = {}
+    stats = {}
+    for path in dict.fromkeys(os.path.abspath(path) for path in paths):
+        stat = os.stat(path)
+        stats[path] = (stat.st_size, stat.st_mtime_ns)
+        cached = cached_files.get(path)
+        if cached is not None and tuple(cached[:2]) == stats[path]:
+            digests[path] = cached[2]
+
+    missing = [path for path in stats if path not in digests]
+    if missing:
+        from concurrent.futures import ThreadPoolExecutor
+
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+        max_workers = max(1, min(max_workers, len(missing)))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for path, digest in zip(missing, executor.map(hash_file, missing)):
+                digests[path] = digest
+                size, mtime = stats[path]
+                if now - mtime >= RACY_NS:
+                    cached_files[path] = [size, mtime, digest]
+    if use_cache:
+        # digests of other projects and wheelhouses are kept until unused
+        used = data.setdefault("used", {})
+        cached = [path for path in stats if path in cached_files]
+        if touch_cache_entries(used, cached) or missing:
+            prune_cache_entries(cached_files, used, MAX_CACHED_FILES)
+            store_json_cache(cache_path, data)
+    return digests
+
+
+def _split_filename(filename):
+    lowered = filename.lower()
+    for extension in _ARCHIVE_EXTENSIONS:
+        if lowered.endswith(extension):
+            break
+    else:
+        return None
+    stem = filename[: -len(extension)]
+    if extension == ".whl":
+        parts = stem.split("-")
+        return (parts[0], parts[1]) if len(parts) >= 5 else None
+    # versions of sdists do not contain dashes, names of old ones might
+    name, _, version = stem.rpartition("-")
+    return (name, version) if name else None
+
+
+def find_distribution_files(directories):
+    """
+    Find distribution files by package name and version.
+
+    Parameters
+    ----------
+    directories : iterable of str
+        Directories holding wheels and sdists, e.g. a wheelhouse or a
+        `--find-links` directory. Missing directories are skipped.
+
+    Returns
+    -------
+    dict
+        Dictionary of {(canonical_name, version_key): [paths]}, where
+        `version_key` is the `pru.pep440.parse_version` key of the version.
+    """
+
+    files = {}
+    for directory in directories:
+        try:
+            entries = sorted(os.listdir(directory))
+        except OSError:
+            continue
+        for filename in entries:
+            parts = _split_filename(filename)
+            if parts is None:
+                continue
+            version_key = parse_version(parts[1])
+            if version_key is None:
+                continue
+            key = (canonicalize_name(parts[0]), version_key)
+            files.setdefault(key, []).append(os.path.join(directory, filename))
+    return files
+
+
+def get_package_hashes(packages, directories, max_workers=None, use_cache=True):
+    """
+    Get the sha256 digests of the distribution files of pinned packages.
+
+    Parameters
+    ----------
+    packages : iterable of tuple
+        `(name, version)` pairs.
+    directories : iterable of str
+        Directories holding the distribution files, see
+        `find_distribution_files`.
+    max_workers : int or None, optional
+        Maximum number of files hashed at the same time.
+    use_cache : bool, optional
+        If False, the digest cache is not used.
+
+    Returns
+    -------
+    dict
+        Dictionary of {(canonical_name, version): [sha256]}, with sorted,
+        deduplicated digests. Packages without any file are missing.
+    """
+
+    files = find_distribution_files(directories)
+    paths = {}
+    for name, version in packages:
+        key = (canonicalize_name(name), version)
+        found = files.get((key[0], parse_version(version)))
+        if found:
+            paths[key] = found
+
+    digests = get_file_digests(
+        [path for found in paths.values() for path in found],
+        max_workers=max_workers,
+        use_cache=use_cache,
+    )
+    return {
+        key: sorted({digests[os.path.abspath(path)] for path in found})
+        for key, found in paths.items()
+    }
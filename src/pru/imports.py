@@ -0,0 +1,375 @@
+"""Audit of the imports of a project against its requirements.
+
+Every Python file of the project is parsed with `ast` to collect its
+top-level imports. Files are parsed in a process pool, and the imports of
+each file are cached by its size and mtime, so a later audit only parses the
+files that changed. Imports are then mapped to installed distributions with
+the top-level modules of the environment snapshot.
+"""
+
+import ast
+import os
+import sys
+import sysconfig
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from pru.cache import (
+    get_cache_dir,
+    load_json_cache,
+    prune_cache_entries,
+    store_json_cache,
+    touch_cache_entries,
+)
+from pru.core import (
+    _get_packages_name,
+    _load_requirements_files,
+    get_installed_packages_index,
+)
+from pru.instrument import phase
+from pru.snapshot import RACY_NS
+from pru.utils import canonicalize_name
+
+IMPORTS_CACHE_VERSION = 1
+
+# files kept in the cache, the least recently used are dropped
+MAX_CACHED_FILES = 2**17
+
+ImportAudit = namedtuple("ImportAudit", ["unused", "missing", "unresolved"])
+
+# directories that never hold project sources
+_SKIP_DIRS = frozenset(["__pycache__", "node_modules", "site-packages", "build"])
+
+# below this number of files, starting a process pool costs more than it saves
+_MIN_PARALLEL_FILES = 64
+
+_CHUNK_SIZE = 32
+
+
+def get_stdlib_modules():
+    """
+    Get the names of the top-level modules of the standard library.
+
+    Returns
+    -------
+    frozenset of str
+        Module names, from `sys.stdlib_module_names` on Python 3.10+, or
+        from the standard library directory on older versions.
+    """
+
+    names = getattr(sys, "stdlib_module_names", None)
+    if names is not None:
+        return frozenset(names)
+    names = set(sys.builtin_module_names)
+    stdlib = sysconfig.get_paths()["stdlib"]
+    for directory in (stdlib, os.path.join(stdlib, "lib-dynload")):
+        try:
+            filenames = os.listdir(directory)
+        except OSError:
+            continue
+        for filename in filenames:
+            name = filename.split(".", 1)[0]
+            if name.isidentifier() and name != "site-packages":
+                names.add(name)
+    return frozenset(names)
+
+
+def find_python_files(directory):
+    """
+    Find the Python files of a project.
+
+    Parameters
+    ----------
+    directory : str
+        Root directory of the project sources.
+
+    Returns
+    -------
+    list of str
+        Sorted paths of the `.py` files. Hidden directories, `__pycache__`,
+        `build`, `node_modules`, and virtual environments are skipped.
+    """
+
+    paths = []
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = sorted(
+            name
+            for name in dirs
+            if not name.startswith(".")
+            and name not in _SKIP_DIRS
+            and not os.path.exists(os.path.join(root, name, "pyvenv.cfg"))
+        )
+        paths.extend(os.path.join(root, name) for name in files if name.endswith(".py"))
+    return sorted(paths)
+
+
+def get_module_imports(path):
+    """
+    Get the top-level modules imported by a Python file.
+
+    Parameters
+    ----------
+    path : str
+        Path of the Python file.
+
+    Returns
+    -------
+    list of str or None
+        Sorted names of the top-level modules of absolute imports, e.g.
+        `numpy` for `import numpy.linalg`, or None if the file can not be
+        read or parsed.
+    """
+
+    try:
+        with open(path, "rb") as f:
+            tree = ast.parse(f.read(), path)
+    except (OSError, SyntaxError, ValueError):
+        return None
+
+    modules = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            modules.update(alias.name.split(".", 1)[0] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            modules.add(node.module.split(".", 1)[0])
+    return sorted(modules)
+
+
+def _load_imports_cache(cache_path):
+    data = load_json_cache(cache_path)
+    if not isinstance(data, dict) or data.get("version") != IMPORTS_CACHE_VERSION:
+        data = {"version": IMPORTS_CACHE_VERSION, "files": {}}
+    return data
+
+
+def scan_imports(paths, max_workers=None, cache_path=None, use_cache=True):
+    """
+    Get the top-level modules imported by many Python files.
+
+    Parameters
+    ----------
+    paths : iterable of str
+        Paths of the Python files.
+    max_workers : int or None, optional
+        Maximum number of worker processes. If None, uses the number of CPUs.
+    cache_path : str or None, optional
+        Path of the imports cache. If None, uses
+        `get_cache_dir("imports.json")`.
+    use_cache : bool, optional
+        If False, every file is parsed and the cache is neither read nor
+        written.
+
+    Returns
+    -------
+    dict
+        Dictionary of {absolute_path: modules}, where `modules` is the result
+        of `get_module_imports`.
+
+    Notes
+    -----
+    - Files whose size and mtime are unchanged since the last scan are not
+      parsed again. Files modified within a couple of seconds of the scan
+      are not cached, since a later change could keep the same mtime.
+    - Imports unused for `pru.cache.MAX_AGE` seconds are dropped from the
+      cache, and the least recently used ones when it holds too many, so
+      the entries of other projects are kept meanwhile.
+    - Few files are parsed in the calling process, without a pool.
+    """
+
+    if cache_path is None:
+        cache_path = get_cache_dir("imports.json")
+    data = (
+        _load_imports_cache(cache_path)
+        if use_cache
+        else {"version": IMPORTS_CACHE_VERSION, "files": {}}
+    )
+    cached_files = data["files"]
+    now = time.time_ns()
+
+    imports = {}
+    stats = {}
+    for path in dict.fromkeys(os.path.abspath(path) for path in paths):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            imports[path] = None
+            continue
+        stats[path] = (stat.st_size, stat.st_mtime_ns)
+        cached = cached_files.get(path)
+        if cached is not None and tuple(cached[:2]) == stats[path]:
+            imports[path] = cached[2]
+
+    # deleted files are dropped
+    deleted = [path for path in imports if imports[path] is None]
+    for path in deleted:
+        cached_files.pop(path, None)
+    missing = [path for path in stats if path not in imports]
+    if len(missing) < _MIN_PARALLEL_FILES or max_workers == 1:
+        results = map(get_module_imports, missing)
+        _store_imports(imports, cached_files, stats, missing, results, now)
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results = executor.map(get_module_imports, missing, chunksize=_CHUNK_SIZE)
+            _store_imports(imports, cached_files, stats, missing, results, now)
+    if use_cache:
+        used = data.setdefault("used", {})
+        cached = [path for path in stats if path in cached_files]
+        if touch_cache_entries(used, cached) or missing or deleted:
+            prune_cache_entries(cached_files, used, MAX_CACHED_FILES)
+            store_json_cache(cache_path, data)
+    return imports
+
+
+def _store_imports(imports, cached_files, stats, paths, results, now):
+    for path, modules in zip(paths, results):
+        imports[path] = modules
+        size, mtime = stats[path]
+        if modules is not None and now - mtime >= RACY_NS:
+            cached_files[path] = [size, mtime, modules]
+
+
+def get_local_modules(directory):
+    """
+    Get the names of the modules defined by the project itself.
+
+    Parameters
+    ----------
+    directory : str
+        Root directory of the project sources.
+
+    Returns
+    -------
+    set of str
+        Names of the top-level modules and packages of the project, at its
+        root and at the root of its `src` directory, if any. Directories at
+        these roots count too, e.g. implicit namespace packages. Modules
+        nested in packages are not local, since they can only be imported
+        by their qualified name.
+    """
+
+    roots = [os.path.abspath(directory)]
+    src = os.path.join(roots[0], "src")
+    if os.path.isdir(src):
+        roots.append(src)
+
+    local = set()
+    for root in roots:
+        for name in os.listdir(root):
+            if name.endswith(".py"):
+                name = name[:-3]
+            elif not os.path.isdir(os.path.join(root, name)):
+                continue
+            if name.isidentifier():
+                local.add(name)
+    return local
+
+
+def get_import_index(index):
+    """
+    Map importable top-level modules to installed distributions.
+
+    Parameters
+    ----------
+    index : dict
+        Installed packages index as returned by `get_installed_packages_index`.
+
+    Returns
+    -------
+    dict
+        Dictionary of {module: [canonical_name]}. A module is provided by
+        more than one distribution for namespace packages.
+    """
+
+    modules = {}
+    for key, package in index.items():
+        for module in package.top_level:
+            modules.setdefault(module, []).append(key)
+    return modules
+
+
+def audit_imports(
+    directory=".",
+    requirements_path=None,
+    index=None,
+    recursive=False,
+    max_workers=None,
+    use_cache=True,
+):
+    """
+    Find unused and missing requirements of a project from its imports.
+
+    Parameters
+    ----------
+    directory : str, optional
+        Root directory of the project sources.
+    requirements_path : str, list of str, or None, optional
+        Path to the requirements file, a glob pattern, or a list of them. If
+        None, defaults to "requirements.txt".
+    index : dict or None, optional
+        Installed packages index as returned by `get_installed_packages_index`.
+        If None, a fresh index is built.
+    recursive : bool, optional
+        If True, also read every file included with `-r`.
+    max_workers : int or None, optional
+        Maximum number of worker processes parsing files.
+    use_cache : bool, optional
+        If False, the per-file imports cache is not used.
+
+    Returns
+    -------
+    ImportAudit
+        Named tuple of `(unused, missing, unresolved)`, where `unused` lists
+        the requirements whose modules are never imported, `missing` is a
+        dictionary of {distribution: modules} of installed distributions
+        imported without being required, and `unresolved` lists the imported
+        modules that no installed distribution provides.
+
+    Notes
+    -----
+    - Imports of the standard library and of the project itself are
+      ignored. Relative imports are always local.
+    - Every import counts, including optional ones inside `try` blocks.
+    - Requirements that are not installed are matched by their name, e.g.
+      `foo-bar` is considered imported by `import foo_bar`.
+    """
+
+    files = _load_requirements_files(requirements_path, recursive)
+    if index is None:
+        index = get_installed_packages_index()
+
+    imported = set()
+    with phase("imports", directory=directory):
+        paths = find_python_files(directory)
+        for modules in scan_imports(paths, max_workers, use_cache=use_cache).values():
+            imported.update(modules or ())
+    imported -= get_stdlib_modules() | get_local_modules(directory)
+
+    required = {}
+    for requirements_file in files.values():
+        if requirements_file.constraint:
+            continue
+        for name in _get_packages_name(requirements_file.requirements):
+            required.setdefault(canonicalize_name(name), name)
+
+    import_index = get_import_index(index)
+    imported_dists = {}
+    unresolved = []
+    for module in sorted(imported):
+        keys = import_index.get(module)
+        if keys is None:
+            # not installed, e.g. a requirement of another platform
+            keys = [canonicalize_name(module)]
+            if keys[0] not in required:
+                unresolved.append(module)
+                continue
+        for key in keys:
+            imported_dists.setdefault(key, []).append(module)
+
+    unused = [name for key, name in required.items() if key not in imported_dists]
+    missing = {
+        index[key].name: modules
+        for key, modules in sorted(imported_dists.items())
+        if key not in required and key in index
+    }
+    return ImportAudit(unused, missing, unresolved)
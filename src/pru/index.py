@@ -0,0 +1,519 @@
+"""Client of package indexes following the simple repository API.
+
+Project pages are requested as PEP 691 JSON, with a fallback to the PEP 503
+HTML pages served by older indexes and plain directory listings such as
+`python -m http.server`. Requests for many projects run concurrently in a
+thread pool, and each worker thread keeps its own keep-alive connection per
+host. Responses are cached on disk as the list of released versions, along
+with their `ETag` and `Last-Modified` validators, so later runs only need a
+conditional request, answered with `304 Not Modified` when nothing changed.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from html.parser import HTMLParser
+from urllib.parse import unquote, urljoin, urlsplit
+
+from pru.cache import get_cache_dir, load_json_cache, store_json_cache
+from pru.core import (
+    _get_constraints,
+    _load_requirements_files,
+    get_installed_packages_index,
+)
+from pru.pep440 import filter_versions, get_latest_version, parse_version
+from pru.utils import canonicalize_name
+
+DEFAULT_INDEX_URL = "https://pypi.org/simple/"
+
+ACCEPT = (
+    "application/vnd.pypi.simple.v1+json, "
+    "application/vnd.pypi.simple.v1+html;q=0.2, "
+    "text/html;q=0.1"
+)
+
+HTTP_CACHE_VERSION = 1
+
+OutdatedPackage = namedtuple("OutdatedPackage", ["name", "current", "latest"])
+
+_ARCHIVE_EXTENSIONS = (".tar.gz", ".tar.bz2", ".tar.xz", ".tgz", ".tar", ".zip")
+_MAX_REDIRECTS = 5
+_TIMEOUT = 30
+
+
+class _LinkParser(HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.links = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag != "a":
+            return
+        attrs = dict(attrs)
+        if attrs.get("href"):
+            self.links.append((attrs["href"], "data-yanked" in attrs))
+
+
+def get_filename_version(filename, project):
+    """
+    Get the version of a distribution file from its name.
+
+    Parameters
+    ----------
+    filename : str
+        Name of a wheel, sdist or egg, e.g. `numpy-2.4.1-cp313-none-any.whl`.
+    project : str
+        Name of the project the file belongs to.
+
+    Returns
+    -------
+    str or None
+        Version of the file, or None if the name does not match `project`
+        or has an unknown extension.
+    """
+
+    lowered = filename.lower()
+    if lowered.endswith((".whl", ".egg")):
+        parts = filename[:-4].split("-")
+        if len(parts) < 2 or canonicalize_name(parts[0]) != project:
+            return None
+        return parts[1]
+
+    for extension in _ARCHIVE_EXTENSIONS:
+        if lowered.endswith(extension):
+            stem = filename[: -len(extension)]
+            break
+    else:
+        return None
+    # sdist names may contain dashes, so find the prefix matching the project
+    position = stem.find("-")
+    while position != -1:
+        if canonicalize_name(stem[:position]) == project:
+            return stem[position + 1 :] or None
+        position = stem.find("-", position + 1)
+    return None
+
+
+def _get_versions(files, project):
+    versions = set()
+    for filename, yanked in files:
+        if yanked:
+            continue
+        version = get_filename_version(filename, project)
+        if version is not None and parse_version(version) is not None:
+            versions.add(version)
+    return sorted(versions, key=parse_version)
+
+
+def parse_simple_json(data, project):
+    """
+    Get the released versions of a PEP 691 JSON project page.
+
+    Parameters
+    ----------
+    data : bytes or str
+        JSON body of the page.
+    project : str
+        Canonical name of the project.
+
+    Returns
+    -------
+    list of str
+        Versions with at least one file that is not yanked, in ascending
+        order.
+    """
+
+    page = json.loads(data)
+    files = [
+        (file["filename"], bool(file.get("yanked"))) for file in page.get("files", [])
+    ]
+    return _get_versions(files, project)
+
+
+def parse_simple_html(data, project):
+    """
+    Get the released versions of a PEP 503 HTML project page.
+
+    Directory listings, e.g. served by `python -m http.server`, are parsed
+    the same way.
+
+    Parameters
+    ----------
+    data : bytes or str
+        HTML body of the page.
+    project : str
+        Canonical name of the project.
+
+    Returns
+    -------
+    list of str
+        Versions with at least one file that is not yanked, in ascending
+        order.
+    """
+
+    if isinstance(data, bytes):
+        data = data.decode("utf-8", errors="replace")
+    parser = _LinkParser()
+    parser.feed(data)
+    parser.close()
+    files = [
+        (unquote(urlsplit(href).path.rstrip("/").rpartition("/")[2]), yanked)
+        for href, yanked in parser.links
+    ]
+    return _get_versions(files, project)
+
+
+def _get_max_age(headers):
+    max_age = None
+    for directive in (headers.get("Cache-Control") or "").lower().split(","):
+        key, _, value = directive.strip().partition("=")
+        if key in ("no-cache", "no-store"):
+            return None
+        if key == "max-age" and value.isdigit():
+            max_age = int(value)
+    return max_age
+
+
+class SimpleIndexClient:
+    """
+    Concurrent client of a simple repository API index.
+
+    Each thread using the client gets its own keep-alive connection per host,
+    so a thread pool fetches many pages without reconnecting for each one.
+
+    Parameters
+    ----------
+    index_url : str or None, optional
+        Base URL of the index, e.g. `https://pypi.org/simple/`. If None, uses
+        the `PIP_INDEX_URL` environment variable or `DEFAULT_INDEX_URL`.
+    use_cache : bool, optional
+        If False, pages are neither read from nor written to the on-disk
+        cache.
+    timeout : float, optional
+        Seconds to wait for each connection and response.
+
+    Notes
+    -----
+    - Cached pages are stored in `get_cache_dir("http")`. A page still fresh
+      according to its `Cache-Control: max-age` is used without a request,
+      otherwise it is revalidated with `If-None-Match`/`If-Modified-Since`.
+    """
+
+    def __init__(self, index_url=None, use_cache=True, timeout=_TIMEOUT):
+        if index_url is None:
+            index_url = os.environ.get("PIP_INDEX_URL") or DEFAULT_INDEX_URL
+        if not index_url.endswith("/"):
+            index_url += "/"
+        self.index_url = index_url
+        self.use_cache = use_cache
+        self.timeout = timeout
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Close every connection opened by the client."""
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for connection in connections:
+            connection.close()
+
+    def _get_connection(self, scheme, netloc):
+        connections = getattr(self._local, "connections", None)
+        if connections is None:
+            connections = self._local.connections = {}
+        connection = connections.get((scheme, netloc))
+        if connection is None:
+            # imported lazily, since it also imports ssl
+            import http.client
+
+            if scheme == "https":
+                connection = http.client.HTTPSConnection(netloc, timeout=self.timeout)
+            elif scheme == "http":
+                connection = http.client.HTTPConnection(netloc, timeout=self.timeout)
+            else:
+                raise ValueError(f"Unsupported index URL scheme: {scheme!r}")
+            connections[(scheme, netloc)] = connection
+            with self._lock:
+                self._connections.append(connection)
+        return connection
+
+    def _request(self, url, headers):
+        import http.client
+
+        parts = urlsplit(url)
+        target = parts.path or "/"
+        if parts.query:
+            target = f"{target}?{parts.query}"
+        connection = self._get_connection(parts.scheme, parts.netloc)
+        for attempt in range(2):
+            try:
+                connection.request("GET", target, headers=headers)
+                response = connection.getresponse()
+                return response, response.read()
+            except (http.client.HTTPException, ConnectionError):
+                # the server may have closed an idle keep-alive connection
+                connection.close()
+                if attempt:
+                    raise
+
+    def _fetch(self, url, cached):
+        headers = {"Accept": ACCEPT, "Accept-Encoding": "identity"}
+        if cached is not None:
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+
+        for _ in range(_MAX_REDIRECTS + 1):
+            response, body = self._request(url, headers)
+            location = response.getheader("Location")
+            if response.status in (301, 302, 303, 307, 308) and location:
+                url = urljoin(url, location)
+                continue
+            return response, body
+        raise OSError(f"Too many redirects for {url}")
+
+    def get_project_versions(self, name):
+        """
+        Get the released versions of a project.
+
+        Parameters
+        ----------
+        name : str
+            Project name, normalized following PEP 503.
+
+        Returns
+        -------
+        list of str or None
+            Versions in ascending order, or None if the index does not know
+            the project.
+
+        Raises
+        ------
+        OSError
+            If the index can not be reached or answers with an error.
+        """
+
+        project = canonicalize_name(name)
+        url = urljoin(self.index_url, f"{project}/")
+        cache_path = get_cache_dir(
+            "http", hashlib.sha1(url.encode("utf-8")).hexdigest() + ".json"
+        )
+        cached = load_json_cache(cache_path) if self.use_cache else None
+        if cached is not None and cached.get("version") != HTTP_CACHE_VERSION:
+            cached = None
+        if cached is not None and time.time() < (cached.get("expires") or 0):
+            return cached["versions"]
+
+        response, body = self._fetch(url, cached)
+        if response.status == 304 and cached is not None:
+            versions = cached["versions"]
+        elif response.status == 404:
+            return None
+        elif response.status != 200:
+            raise OSError(f"{url}: HTTP {response.status} {response.reason}")
+        elif "json" in (response.getheader("Content-Type") or ""):
+            versions = parse_simple_json(body, project)
+        else:
+            versions = parse_simple_html(body, project)
+
+        if self.use_cache:
+            max_age = _get_max_age(response.headers)
+            store_json_cache(
+                cache_path,
+                {
+                    "version": HTTP_CACHE_VERSION,
+                    "etag": response.getheader("ETag") or (cached or {}).get("etag"),
+                    "last_modified": response.getheader("Last-Modified")
+                    or (cached or {}).get("last_modified"),
+                    "expires": None if max_age is None else time.time() + max_age,
+                    "versions": versions,
+                },
+            )
+        return versions
+
+    def get_latest_versions(
+        self, names, max_workers=None, prereleases=False, specifiers=None
+    ):
+        """
+        Get the latest version of many projects concurrently.
+
+        Parameters
+        ----------
+        names : iterable of str
+            Project names.
+        max_workers : int or None, optional
+            Maximum number of concurrent requests. If None, uses up to 32.
+        prereleases : bool, optional
+            If True, pre-releases are candidates for the latest version, see
+            `get_latest_version`.
+        specifiers : dict or None, optional
+            Dictionary of {name: specifiers}, with specifiers as `(operator,
+            version)` pairs. The latest version of these projects is the
+            latest one satisfying them, see `pru.pep440.filter_versions`.
+
+        Returns
+        -------
+        dict
+            Dictionary of {name: latest_version}, where the version is None
+            for projects unknown to the index.
+        """
+
+        names = list(dict.fromkeys(names))
+        if not names:
+            return {}
+        if max_workers is None:
+            max_workers = 32
+        max_workers = max(1, min(max_workers, len(names)))
+
+        if specifiers is None:
+            specifiers = {}
+
+        def get_latest(name, versions):
+            if versions is None:
+                return None
+            if specifiers.get(name):
+                versions = filter_versions(specifiers[name], versions, True)
+            return get_latest_version(versions, prereleases)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            pages = executor.map(self.get_project_versions, names)
+            return {
+                name: get_latest(name, versions) for name, versions in zip(names, pages)
+            }
+
+
+def _get_current_version(requirement, index):
+    package = index.get(canonicalize_name(requirement.name))
+    if package is not None:
+        return package.version
+    for operator, version in requirement.specifiers:
+        if operator in ("==", "==="):
+            return version
+    return None
+
+
+def _get_current_versions(files, index):
+    # {canonical_name: (name, current_version)}, in requirements order, and
+    # {canonical_name: specifiers} of the same requirements
+    current = {}
+    constraints = {}
+    for requirements_file in files.values():
+        for requirement in requirements_file.requirements:
+            if requirement.name is None or requirement.url is not None:
+                continue
+            key = canonicalize_name(requirement.name)
+            version = _get_current_version(requirement, index)
+            if key not in current and version is not None:
+                current[key] = (requirement.name, version)
+                constraints[key] = _get_constraints(requirement)
+    return current, constraints
+
+
+def _get_index_url(files):
+    # like pip, the last --index-url of the requirements files wins
+    index_url = None
+    for requirements_file in files.values():
+        for requirement in requirements_file.requirements:
+            for option, value in requirement.options:
+                if option in ("-i", "--index-url") and value:
+                    index_url = value
+    return index_url
+
+
+def get_outdated_packages(
+    requirements_path=None,
+    index_url=None,
+    index=None,
+    recursive=False,
+    max_workers=None,
+    prereleases=False,
+    use_cache=True,
+    respect_constraints=False,
+):
+    """
+    Get the packages of requirements files with a newer version on an index.
+
+    Parameters
+    ----------
+    requirements_path : str, list of str, or None, optional
+        Path to the requirements file, a glob pattern, or a list of them. If
+        None, defaults to "requirements.txt".
+    index_url : str or None, optional
+        Base URL of the simple index. If None, uses the `--index-url` of the
+        requirements files, the `PIP_INDEX_URL` environment variable, or
+        `DEFAULT_INDEX_URL`.
+    index : dict or None, optional
+        Installed packages index as returned by `get_installed_packages_index`.
+        If None, a fresh index is built.
+    recursive : bool, optional
+        If True, also check every file included with `-r` or `-c`.
+    max_workers : int or None, optional
+        Maximum number of concurrent requests.
+    prereleases : bool, optional
+        If True, pre-releases are candidates for the latest version.
+    use_cache : bool, optional
+        If False, the on-disk HTTP cache is not used.
+    respect_constraints : bool, optional
+        If True, the latest version is the latest one satisfying the
+        specifiers of the requirement, e.g. `numpy<=1.26.3`, so packages
+        are only outdated within their constraints.
+
+    Returns
+    -------
+    list of OutdatedPackage
+        Named tuples of `(name, current, latest)`, in requirements order.
+
+    Notes
+    -----
+    - The current version is the installed version, or the `==` pin of
+      packages that are not installed. Packages with neither are skipped.
+    - Only the index is queried, nothing is installed.
+
+    Raises
+    ------
+    OSError
+        If the index can not be reached or answers with an error.
+    ValueError
+        If `respect_constraints` is True and a specifier is invalid.
+    """
+
+    files = _load_requirements_files(requirements_path, recursive)
+    if index is None:
+        index = get_installed_packages_index()
+    if index_url is None:
+        index_url = _get_index_url(files)
+
+    current, constraints = _get_current_versions(files, index)
+    if not respect_constraints:
+        constraints = None
+
+    with SimpleIndexClient(index_url, use_cache=use_cache) as client:
+        latest = client.get_latest_versions(
+            current,
+            max_workers=max_workers,
+            prereleases=prereleases,
+            specifiers=constraints,
+        )
+
+    outdated = []
+    for key, (name, version) in current.items():
+        latest_version = latest[key]
+        if latest_version is None:
+            continue
+        latest_key = parse_version(latest_version)
+        current_key = parse_version(version)
+        if current_key is None or latest_key > current_key:
+            outdated.append(OutdatedPackage(name, version, latest_version))
+    return outdated
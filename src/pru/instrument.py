@@ -0,0 +1,256 @@
+"""Per-phase timing hooks.
+
+The slow phases of pru (the `uv` probe, the environment scan, parsing of
+requirements files, the installer run, planning and writing files) are
+wrapped in `phase`. Hooks added with `add_hook` receive an event when each
+phase starts and ends. Without any hook, `phase` returns a shared no-op
+context manager, so instrumentation costs a single truth test.
+
+Examples:
+    >>> from pru.instrument import PhaseTimer
+    >>> with PhaseTimer() as timer:
+    ...     replace_requirements_packages_versions("requirements.txt")
+    >>> timer.summary()
+    [PhaseSummary(name='parse', count=1, total=0.001), ...]
+"""
+
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+
+PhaseSummary = namedtuple("PhaseSummary", ["name", "count", "total"])
+
+PhaseRecord = namedtuple(
+    "PhaseRecord", ["name", "start", "end", "thread_id", "details"]
+)
+
+_HOOKS = ()
+_HOOKS_LOCK = threading.Lock()
+
+
+class _NullPhase:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NULL_PHASE = _NullPhase()
+
+
+class _Phase:
+    __slots__ = ("name", "details", "hooks")
+
+    def __init__(self, name, details, hooks):
+        self.name = name
+        self.details = details
+        self.hooks = hooks
+
+    def __enter__(self):
+        timestamp = time.perf_counter()
+        for hook in self.hooks:
+            hook("start", self.name, timestamp, self.details)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        timestamp = time.perf_counter()
+        for hook in self.hooks:
+            hook("end", self.name, timestamp, self.details)
+        return False
+
+
+def phase(name, **details):
+    """
+    Context manager marking a phase of pru.
+
+    Parameters
+    ----------
+    name : str
+        Name of the phase, e.g. "scan" or "install".
+    **details
+        Extra data passed to the hooks, e.g. the path of a parsed file.
+
+    Returns
+    -------
+    context manager
+        Calls every hook with a "start" event on enter, and an "end" event
+        on exit, even when the phase raises.
+    """
+
+    hooks = _HOOKS
+    if not hooks:
+        return _NULL_PHASE
+    return _Phase(name, details, hooks)
+
+
+def add_hook(hook):
+    """
+    Add a hook receiving the start and end events of every phase.
+
+    Parameters
+    ----------
+    hook : callable
+        Called as `hook(event, name, timestamp, details)`, with `event`
+        either "start" or "end", the phase `name`, a `time.perf_counter()`
+        `timestamp` and the `details` dictionary of the phase. Hooks are
+        called in the thread running the phase, and must be thread safe.
+    """
+
+    global _HOOKS
+    with _HOOKS_LOCK:
+        _HOOKS = _HOOKS + (hook,)
+
+
+def remove_hook(hook):
+    """
+    Remove a hook added with `add_hook`.
+
+    Parameters
+    ----------
+    hook : callable
+        The hook to remove.
+
+    Raises
+    ------
+    ValueError
+        If the hook was not added.
+    """
+
+    global _HOOKS
+    with _HOOKS_LOCK:
+        hooks = list(_HOOKS)
+        hooks.remove(hook)
+        _HOOKS = tuple(hooks)
+
+
+class PhaseTimer:
+    """
+    Hook recording the duration of every phase.
+
+    Used as a context manager, the timer is added as a hook on enter and
+    removed on exit.
+
+    Attributes
+    ----------
+    records : list of PhaseRecord
+        Finished phases, in the order they ended.
+    """
+
+    def __init__(self):
+        self.records = []
+        self.origin = time.perf_counter()
+        self._starts = {}
+
+    def __call__(self, event, name, timestamp, details):
+        key = (threading.get_ident(), name)
+        if event == "start":
+            self._starts.setdefault(key, []).append(timestamp)
+            return
+        starts = self._starts.get(key)
+        if starts:
+            self.records.append(
+                PhaseRecord(name, starts.pop(), timestamp, key[0], details)
+            )
+
+    def __enter__(self):
+        add_hook(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        remove_hook(self)
+        return False
+
+    def summary(self):
+        """
+        Get the number of runs and total duration of each phase.
+
+        Returns
+        -------
+        list of PhaseSummary
+            One summary per phase name, in the order the phases first
+            started. Durations are in seconds.
+        """
+
+        summaries = {}
+        for record in sorted(self.records, key=lambda record: record.start):
+            count, total = summaries.get(record.name, (0, 0.0))
+            summaries[record.name] = (count + 1, total + record.end - record.start)
+        return [
+            PhaseSummary(name, count, total)
+            for name, (count, total) in summaries.items()
+        ]
+
+    def format_table(self):
+        """
+        Format the summary as a table.
+
+        Returns
+        -------
+        str
+            One line per phase with its number of runs and total duration,
+            and a last line with the time elapsed since the timer was
+            created.
+        """
+
+        rows = [("Phase", "Count", "Seconds")]
+        rows += [
+            (name, str(count), f"{total:.3f}") for name, count, total in self.summary()
+        ]
+        rows.append(("total", "", f"{time.perf_counter() - self.origin:.3f}"))
+        width = max(len(row[0]) for row in rows)
+        return "\n".join(
+            f"{name:<{width}}  {count:>5}  {seconds:>8}"
+            for name, count, seconds in rows
+        )
+
+    def to_json(self):
+        """
+        Get the summary as a JSON-serializable dictionary.
+
+        Returns
+        -------
+        dict
+            Dictionary with the "total" elapsed seconds, and the "phases"
+            list of {"name", "count", "seconds"}.
+        """
+
+        return {
+            "total": time.perf_counter() - self.origin,
+            "phases": [
+                {"name": name, "count": count, "seconds": total}
+                for name, count, total in self.summary()
+            ],
+        }
+
+    def write_chrome_trace(self, path):
+        """
+        Write the recorded phases in the Chrome trace event format.
+
+        The file can be opened with `chrome://tracing` or Perfetto.
+
+        Parameters
+        ----------
+        path : str
+            Path of the JSON file to write.
+        """
+
+        pid = os.getpid()
+        events = [
+            {
+                "name": record.name,
+                "ph": "X",
+                "ts": (record.start - self.origin) * 1e6,
+                "dur": (record.end - record.start) * 1e6,
+                "pid": pid,
+                "tid": record.thread_id,
+                "args": {key: str(value) for key, value in record.details.items()},
+            }
+            for record in self.records
+        ]
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
@@ -0,0 +1,292 @@
+"""Evaluation of PEP 508 environment markers.
+
+Dependency metadata repeats the same handful of markers across thousands of
+`Requires-Dist` entries, e.g. `python_version < "3.11"` or `extra == "dev"`.
+Markers are compiled once per unique string, and their result in the running
+environment is memoized per unique `(marker, extra)` pair.
+"""
+
+import os
+import platform
+import re
+import sys
+from functools import lru_cache
+
+from pru.pep440 import parse_version
+from pru.utils import canonicalize_name
+
+_TOKEN_RE = re.compile(
+    r"""
+    \s*(
+        \(|\)
+        |===|==|!=|<=|>=|~=|<|>
+        |not\s+in\b|in\b|and\b|or\b
+        |'[^']*'|"[^"]*"
+        |[A-Za-z_][A-Za-z0-9_.]*
+    )
+    """,
+    re.VERBOSE,
+)
+
+_RELEASE_RE = re.compile(r"\s*v?(?:[0-9]+!)?([0-9]+(?:\.[0-9]+)*)")
+
+_VARIABLES = frozenset(
+    [
+        "implementation_name",
+        "implementation_version",
+        "os_name",
+        "platform_machine",
+        "platform_python_implementation",
+        "platform_release",
+        "platform_system",
+        "platform_version",
+        "python_full_version",
+        "python_version",
+        "sys_platform",
+        "extra",
+    ]
+)
+
+# legacy names of PEP 345 and setuptools
+_ALIASES = {
+    "os.name": "os_name",
+    "sys.platform": "sys_platform",
+    "platform.version": "platform_version",
+    "platform.machine": "platform_machine",
+    "platform.python_implementation": "platform_python_implementation",
+    "python_implementation": "platform_python_implementation",
+}
+
+_OPERATORS = frozenset(["===", "==", "!=", "<=", ">=", "~=", "<", ">", "in", "not in"])
+
+
+@lru_cache(maxsize=None)
+def default_environment():
+    """
+    Get the marker variables of the running interpreter.
+
+    Returns
+    -------
+    dict
+        Dictionary of {variable: value} as defined by PEP 508, without
+        `extra`.
+    """
+
+    info = sys.implementation.version
+    implementation_version = f"{info.major}.{info.minor}.{info.micro}"
+    if info.releaselevel != "final":
+        implementation_version += f"{info.releaselevel[0]}{info.serial}"
+    return {
+        "implementation_name": sys.implementation.name,
+        "implementation_version": implementation_version,
+        "os_name": os.name,
+        "platform_machine": platform.machine(),
+        "platform_python_implementation": platform.python_implementation(),
+        "platform_release": platform.release(),
+        "platform_system": platform.system(),
+        "platform_version": platform.version(),
+        "python_full_version": platform.python_version(),
+        "python_version": "%d.%d" % sys.version_info[:2],
+        "sys_platform": sys.platform,
+    }
+
+
+def _tokenize(marker):
+    tokens = []
+    position = 0
+    marker = marker.strip()
+    while position < len(marker):
+        match = _TOKEN_RE.match(marker, position)
+        if match is None:
+            raise ValueError(f"Invalid marker: {marker!r}")
+        token = match.group(1)
+        tokens.append(" ".join(token.split()) if token.startswith("not") else token)
+        position = match.end()
+    return tokens
+
+
+class _Parser:
+    def __init__(self, marker):
+        self.marker = marker
+        self.tokens = _tokenize(marker)
+        self.position = 0
+
+    def error(self):
+        return ValueError(f"Invalid marker: {self.marker!r}")
+
+    def next(self):
+        if self.position >= len(self.tokens):
+            raise self.error()
+        token = self.tokens[self.position]
+        self.position += 1
+        return token
+
+    def peek(self):
+        if self.position < len(self.tokens):
+            return self.tokens[self.position]
+        return None
+
+    def parse(self):
+        tree = self.parse_or()
+        if self.position != len(self.tokens):
+            raise self.error()
+        return tree
+
+    def parse_or(self):
+        tree = self.parse_and()
+        while self.peek() == "or":
+            self.next()
+            tree = ("or", tree, self.parse_and())
+        return tree
+
+    def parse_and(self):
+        tree = self.parse_atom()
+        while self.peek() == "and":
+            self.next()
+            tree = ("and", tree, self.parse_atom())
+        return tree
+
+    def parse_atom(self):
+        if self.peek() == "(":
+            self.next()
+            tree = self.parse_or()
+            if self.next() != ")":
+                raise self.error()
+            return tree
+        left = self.parse_value()
+        operator = self.next()
+        if operator not in _OPERATORS:
+            raise self.error()
+        return ("compare", left, operator, self.parse_value())
+
+    def parse_value(self):
+        token = self.next()
+        if token[0] in "'\"":
+            return ("string", token[1:-1])
+        name = _ALIASES.get(token, token)
+        if name not in _VARIABLES:
+            raise self.error()
+        return ("variable", name)
+
+
+@lru_cache(maxsize=None)
+def compile_marker(marker):
+    """
+    Parse a marker into a tree of tuples.
+
+    Parameters
+    ----------
+    marker : str
+        Environment marker, e.g. `python_version < "3.11" and extra == "dev"`.
+
+    Returns
+    -------
+    tuple
+        Parsed tree, see `evaluate_marker`.
+
+    Raises
+    ------
+    ValueError
+        If the marker is not valid.
+    """
+
+    return _Parser(marker).parse()
+
+
+def _compare_versions(left, operator, right):
+    if right.endswith(".*") and operator in ("==", "!="):
+        # prefix match on the release segments
+        prefix = right[:-2].split(".")
+        matches = left.split("+")[0].split(".")[: len(prefix)] == prefix
+        return matches if operator == "==" else not matches
+    left_key = parse_version(left)
+    right_key = parse_version(right)
+    if left_key is None or right_key is None:
+        return None
+    if operator == "~=":
+        # `~=X.Y.Z` is `>=X.Y.Z, ==X.Y.*`
+        release = _RELEASE_RE.match(right).group(1).split(".")
+        if len(release) < 2:
+            return None
+        prefix = ".".join(release[:-1])
+        return left_key >= right_key and _compare_versions(left, "==", f"{prefix}.*")
+    return {
+        "==": left_key == right_key,
+        "!=": left_key != right_key,
+        "<": left_key < right_key,
+        "<=": left_key <= right_key,
+        ">": left_key > right_key,
+        ">=": left_key >= right_key,
+    }[operator]
+
+
+def _compare(left, operator, right, is_extra):
+    if is_extra:
+        left = canonicalize_name(left)
+        right = canonicalize_name(right)
+    if operator == "in":
+        return left in right
+    if operator == "not in":
+        return left not in right
+    if operator != "===" and not is_extra:
+        result = _compare_versions(left, operator, right)
+        if result is not None:
+            return result
+    if operator in ("==", "==="):
+        return left == right
+    if operator == "!=":
+        return left != right
+    raise ValueError(f"Invalid comparison: {left!r} {operator} {right!r}")
+
+
+def _evaluate(tree, environment):
+    kind = tree[0]
+    if kind == "and":
+        return _evaluate(tree[1], environment) and _evaluate(tree[2], environment)
+    if kind == "or":
+        return _evaluate(tree[1], environment) or _evaluate(tree[2], environment)
+    _, left, operator, right = tree
+    is_extra = ("variable", "extra") in (left, right)
+    left = environment[left[1]] if left[0] == "variable" else left[1]
+    right = environment[right[1]] if right[0] == "variable" else right[1]
+    return _compare(left, operator, right, is_extra)
+
+
+def evaluate_marker(marker, extra="", environment=None):
+    """
+    Evaluate an environment marker.
+
+    Parameters
+    ----------
+    marker : str
+        Environment marker.
+    extra : str, optional
+        Value of the `extra` variable, empty when no extra is requested.
+    environment : dict or None, optional
+        Marker variables. If None, uses `default_environment()` and the
+        result is memoized.
+
+    Returns
+    -------
+    bool
+        True if the marker holds.
+
+    Raises
+    ------
+    ValueError
+        If the marker is not valid.
+
+    Examples
+    --------
+    >>> evaluate_marker('python_version >= "3" and extra == "socks"', "socks")
+    True
+    """
+
+    if environment is None:
+        return _evaluate_default(marker, extra)
+    return _evaluate(compile_marker(marker), dict(environment, extra=extra))
+
+
+@lru_cache(maxsize=None)
+def _evaluate_default(marker, extra):
+    return _evaluate(compile_marker(marker), dict(default_environment(), extra=extra))
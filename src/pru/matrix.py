@@ -0,0 +1,344 @@
+"""Run pru against many interpreters concurrently.
+
+Each interpreter (or virtual environment) gets its own job, which runs
+`python -m pru` with that interpreter on requirements paths formatted for its
+version, e.g. `pytests/requirements/3_{minor}/requirements.txt`. Jobs run in
+a bounded worker pool, their output is captured separately, and files whose
+content changed are reported at the end.
+"""
+
+import hashlib
+import os
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from pru.backend import resolve_backend
+from pru.core import expand_requirements_paths
+
+MatrixResult = namedtuple(
+    "MatrixResult", ["interpreter", "version", "changed", "returncode", "output"]
+)
+
+MATRIX_COMMANDS = {
+    "uv": "uv pip install --upgrade --python {python}",
+    "pip": "{python} -m pip install --upgrade",
+}
+
+_PRU_PACKAGE = os.path.dirname(os.path.abspath(__file__))
+
+
+def get_interpreter_executable(interpreter):
+    """
+    Get the Python executable of an interpreter or virtual environment.
+
+    Parameters
+    ----------
+    interpreter : str
+        Path to a Python executable, a command on PATH such as `python3.12`,
+        or a virtual environment directory.
+
+    Returns
+    -------
+    str
+        Path or command of the Python executable.
+    """
+
+    if os.path.isdir(interpreter):
+        if os.name == "nt":
+            return os.path.join(interpreter, "Scripts", "python.exe")
+        return os.path.join(interpreter, "bin", "python")
+    return interpreter
+
+
+def get_interpreter_version(executable, timeout=None):
+    """
+    Get the `(major, minor)` version of a Python executable.
+
+    Parameters
+    ----------
+    executable : str
+        Path or command of the Python executable.
+    timeout : float or None, optional
+        Seconds to wait for the interpreter.
+
+    Returns
+    -------
+    tuple of int
+        `(major, minor)` version.
+    """
+
+    output = subprocess.check_output(
+        [executable, "-c", "import sys; print('%d %d' % sys.version_info[:2])"],
+        timeout=timeout,
+    )
+    major, minor = output.split()
+    return int(major), int(minor)
+
+
+def format_requirements_paths(patterns, version):
+    """
+    Format per-version requirements paths.
+
+    Parameters
+    ----------
+    patterns : list of str
+        Paths or glob patterns with `{major}`, `{minor}` and `{version}`
+        placeholders.
+    version : tuple of int
+        `(major, minor)` interpreter version.
+
+    Returns
+    -------
+    list of str
+        Formatted patterns.
+    """
+
+    major, minor = version
+    return [
+        pattern.format(major=major, minor=minor, version=f"{major}.{minor}")
+        for pattern in patterns
+    ]
+
+
+def _get_checksums(paths):
+    checksums = {}
+    for path in expand_requirements_paths(paths):
+        try:
+            with open(path, "rb") as f:
+                checksums[path] = hashlib.sha256(f.read()).hexdigest()
+        except OSError:
+            checksums[path] = None
+    return checksums
+
+
+def _copy_pru_package(directory):
+    # the parent directory of the package may be a site-packages directory,
+    # whose distributions must not leak into the scans of the jobs
+    shutil.copytree(
+        _PRU_PACKAGE,
+        os.path.join(directory, "pru"),
+        ignore=shutil.ignore_patterns("__pycache__"),
+    )
+    return directory
+
+
+def _get_environment(interpreter, source):
+    env = os.environ.copy()
+    pythonpath = env.get("PYTHONPATH")
+    env["PYTHONPATH"] = (
+        source if not pythonpath else os.pathsep.join([source, pythonpath])
+    )
+    if os.path.isdir(interpreter):
+        # same as activating the virtual environment
+        env["VIRTUAL_ENV"] = os.path.abspath(interpreter)
+        bin_dir = os.path.dirname(get_interpreter_executable(env["VIRTUAL_ENV"]))
+        env["PATH"] = os.pathsep.join([bin_dir, env.get("PATH", "")])
+        env.pop("PYTHONHOME", None)
+    return env
+
+
+def run_matrix_job(interpreter, patterns, command=None, arguments=(), timeout=None):
+    """
+    Upgrade and pin requirements files with one interpreter.
+
+    Parameters
+    ----------
+    interpreter : str
+        Python executable, command, or virtual environment directory.
+    patterns : list of str
+        Requirements paths or glob patterns, see `format_requirements_paths`.
+    command : str or None, optional
+        Upgrade command, where `{python}` is replaced by the interpreter
+        executable. If None, uses `MATRIX_COMMANDS` of the detected backend,
+        so packages are installed into the interpreter's environment.
+    arguments : sequence of str, optional
+        Extra `pru` CLI arguments, e.g. `["--recursive"]`.
+    timeout : float or None, optional
+        Seconds to wait for the job.
+
+    Returns
+    -------
+    MatrixResult
+        Named tuple of `(interpreter, version, changed, returncode, output)`,
+        where `changed` lists the files whose content changed and `output` is
+        the captured output of the job.
+
+    Notes
+    -----
+    The job imports a copy of the running pru package, so pru does not need
+    to be installed in the interpreter's environment.
+    """
+
+    with tempfile.TemporaryDirectory(prefix="pru-matrix-") as directory:
+        return _run_matrix_job(
+            interpreter,
+            patterns,
+            command,
+            arguments,
+            timeout,
+            _copy_pru_package(directory),
+        )
+
+
+def _run_matrix_job(interpreter, patterns, command, arguments, timeout, source):
+    executable = get_interpreter_executable(interpreter)
+    try:
+        version = get_interpreter_version(executable, timeout=timeout)
+    except (OSError, ValueError, subprocess.SubprocessError) as e:
+        return MatrixResult(interpreter, None, [], 1, f"{e}\n")
+
+    if command is None:
+        command = MATRIX_COMMANDS[resolve_backend()]
+    command = command.replace(
+        "{python}", executable if os.name == "nt" else shlex.quote(executable)
+    )
+
+    paths = format_requirements_paths(patterns, version)
+    try:
+        before = _get_checksums(paths)
+    except FileNotFoundError as e:
+        return MatrixResult(interpreter, version, [], 1, f"{e}\n")
+
+    args = [executable, "-m", "pru"]
+    for path in paths:
+        args.extend(["-r", path])
+    args.extend(["--cmd", command])
+    args.extend(arguments)
+    try:
+        process = subprocess.run(
+            args,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            env=_get_environment(interpreter, source),
+            timeout=timeout,
+        )
+        returncode = process.returncode
+        output = process.stdout.decode("utf-8", errors="replace")
+    except (OSError, subprocess.SubprocessError) as e:
+        returncode = 1
+        output = f"{e}\n"
+
+    try:
+        after = _get_checksums(paths)
+    except FileNotFoundError:
+        after = {}
+    changed = [path for path, checksum in after.items() if before.get(path) != checksum]
+    return MatrixResult(interpreter, version, changed, returncode, output)
+
+
+def run_matrix(
+    interpreters,
+    patterns,
+    command=None,
+    arguments=(),
+    max_workers=None,
+    timeout=None,
+    callback=None,
+):
+    """
+    Upgrade and pin requirements files with many interpreters concurrently.
+
+    Parameters
+    ----------
+    interpreters : list of str
+        Python executables, commands, or virtual environment directories.
+    patterns : list of str
+        Requirements paths or glob patterns, see `format_requirements_paths`.
+    command : str or None, optional
+        Upgrade command, see `run_matrix_job`.
+    arguments : sequence of str, optional
+        Extra `pru` CLI arguments.
+    max_workers : int or None, optional
+        Maximum number of concurrent jobs. If None, uses the number of CPUs.
+    timeout : float or None, optional
+        Seconds to wait for each job.
+    callback : callable or None, optional
+        Called from the calling thread with each `MatrixResult` as soon as
+        its job finishes.
+
+    Returns
+    -------
+    list of MatrixResult
+        Results, in the order of `interpreters`.
+    """
+
+    if command is None:
+        # resolve once, instead of once per job
+        command = MATRIX_COMMANDS[resolve_backend()]
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    max_workers = max(1, min(max_workers, len(interpreters)))
+
+    with tempfile.TemporaryDirectory(prefix="pru-matrix-") as directory:
+        # one copy of the package, shared by the jobs
+        source = _copy_pru_package(directory)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(
+                    _run_matrix_job,
+                    interpreter,
+                    patterns,
+                    command,
+                    arguments,
+                    timeout,
+                    source,
+                )
+                for interpreter in interpreters
+            ]
+            if callback is not None:
+                for future in as_completed(futures):
+                    callback(future.result())
+    return [future.result() for future in futures]
+
+
+def print_matrix_result(result, file=None):
+    """
+    Print the captured output of a matrix job.
+
+    Parameters
+    ----------
+    result : MatrixResult
+        Result of `run_matrix_job`.
+    file : file-like or None, optional
+        Output stream. Defaults to `sys.stdout`.
+    """
+
+    file = sys.stdout if file is None else file
+    version = "?" if result.version is None else "%d.%d" % result.version
+    print(f"=== {result.interpreter} (Python {version}) ===", file=file)
+    print(result.output, end="" if result.output.endswith("\n") else "\n", file=file)
+    file.flush()
+
+
+def print_matrix_summary(results, file=None):
+    """
+    Print the changed files and failures of a matrix run.
+
+    Parameters
+    ----------
+    results : list of MatrixResult
+        Results of `run_matrix`.
+    file : file-like or None, optional
+        Output stream. Defaults to `sys.stdout`.
+    """
+
+    file = sys.stdout if file is None else file
+    changed = [path for result in results for path in result.changed]
+    failed = [result for result in results if result.returncode != 0]
+
+    print("", file=file)
+    if changed:
+        print("Requirements updated:", file=file)
+        for path in changed:
+            print(path, file=file)
+    else:
+        print("No requirements updated.", file=file)
+    if failed:
+        print("Failed:", file=file)
+        for result in failed:
+            print(f"{result.interpreter} (exit code {result.returncode})", file=file)
@@ -0,0 +1,491 @@
+"""Single-pass parser for requirements files.
+
+Each logical line of a requirements file (physical lines joined by trailing
+backslashes) that holds a requirement or options becomes a `Requirement`
+record. Blank and comment-only lines produce no record. Records keep the span
+of physical lines they come from and the span of their version specifier, so
+pins can be rewritten without touching the rest of the formatting.
+"""
+
+import os
+import re
+
+_COMMENT_LINE_RE = re.compile(r"^\s*#")
+_COMMENT_RE = re.compile(r"(^|\s)#")
+_CONTINUATION_RE = re.compile(r"\\(\r\n|\r|\n)")
+_NAME_RE = re.compile(r"\s*([A-Za-z0-9](?:[A-Za-z0-9._-]*[A-Za-z0-9])?)")
+_EXTRAS_RE = re.compile(r"\s*\[([^\]]*)\]")
+_SPECIFIER_RE = re.compile(r"\s*(~=|===|==|!=|<=|>=|<|>)\s*([^\s,;()]+)")
+_URL_RE = re.compile(r"^\s*([A-Za-z][\w+.-]*://|\.{0,2}[\\/]|\.{1,2}\s*$)")
+_URL_REFERENCE_RE = re.compile(r"\s*@\s*(\S+)")
+_OPEN_PAREN_RE = re.compile(r"\s*\(")
+_CLOSE_PAREN_RE = re.compile(r"\s*\)")
+_COMMA_RE = re.compile(r"\s*,")
+_OPTION_START_RE = re.compile(r"(?:^|\s)-[-A-Za-z]")
+
+# options that do not take a value
+_FLAG_OPTIONS = frozenset(
+    ["--pre", "--prefer-binary", "--require-hashes", "--no-index", "--no-deps"]
+)
+
+# options including other files, mapped to whether they include constraints
+_INCLUDE_OPTIONS = {
+    "-r": False,
+    "--requirement": False,
+    "-c": True,
+    "--constraint": True,
+}
+
+
+class Requirement:
+    """
+    A requirement or option line parsed from a requirements file.
+
+    Attributes
+    ----------
+    name : str or None
+        Package name as written, or None for option-only lines and direct
+        URLs or paths.
+    extras : tuple of str
+        Requested extras, e.g. `("socks",)` for `requests[socks]`.
+    specifiers : tuple of tuple
+        `(operator, version)` pairs, e.g. `(("<=", "1.26.3"),)`.
+    markers : str or None
+        Environment markers after `;`, e.g. `python_version < "3.8"`.
+    url : str or None
+        Direct reference of `name @ url` requirements, or the URL or path of
+        lines without a package name.
+    options : tuple of tuple
+        `(option, value)` pairs, e.g. `(("--hash", "sha256:..."),)` or
+        `(("-r", "base.txt"),)`. The value is None for flags.
+    comment : str or None
+        Inline comment, including the leading `#`.
+    span : tuple of int
+        `(start, end)` indices of the physical lines holding the record.
+    version_span : tuple of int or None
+        `(start, end)` offsets of the version specifier in the text of the
+        physical lines of `span` joined together. Empty (start == end) when
+        there is no specifier yet, and None when the record can not be
+        pinned.
+    """
+
+    __slots__ = (
+        "name",
+        "extras",
+        "specifiers",
+        "markers",
+        "url",
+        "options",
+        "comment",
+        "span",
+        "version_span",
+    )
+
+    def __init__(
+        self,
+        name=None,
+        extras=(),
+        specifiers=(),
+        markers=None,
+        url=None,
+        options=(),
+        comment=None,
+        span=(0, 0),
+        version_span=None,
+    ):
+        self.name = name
+        self.extras = extras
+        self.specifiers = specifiers
+        self.markers = markers
+        self.url = url
+        self.options = options
+        self.comment = comment
+        self.span = span
+        self.version_span = version_span
+
+    def __repr__(self):
+        fields = ", ".join(
+            f"{slot}={getattr(self, slot)!r}"
+            for slot in self.__slots__
+            if getattr(self, slot) not in (None, ())
+        )
+        return f"Requirement({fields})"
+
+    def __eq__(self, other):
+        if not isinstance(other, Requirement):
+            return NotImplemented
+        return all(
+            getattr(self, slot) == getattr(other, slot) for slot in self.__slots__
+        )
+
+    __hash__ = None
+
+
+def _blank_continuations(match):
+    return " " * len(match.group(0))
+
+
+def _split_comment(raw):
+    # blank continuations with spaces of the same length, so offsets in the
+    # parsed text are also offsets in `raw`
+    text = _CONTINUATION_RE.sub(_blank_continuations, raw).rstrip("\r\n")
+    match = _COMMENT_RE.search(text)
+    if match is None:
+        return text, None
+    comment_start = match.end() - 1
+    return text[:comment_start], text[comment_start:].rstrip()
+
+
+def _split_options(text):
+    if _OPTION_START_RE.search(text) is None:
+        return text, ""
+    # find the first option token that is outside of quoted marker values
+    quote = None
+    for i, char in enumerate(text):
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in "'\"":
+            quote = char
+        elif char == "-" and (i == 0 or text[i - 1].isspace()):
+            if i + 1 < len(text) and (text[i + 1] == "-" or text[i + 1].isalpha()):
+                return text[:i], text[i:]
+    return text, ""
+
+
+def _parse_options(text):
+    options = []
+    tokens = text.split()
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        i += 1
+        if not token.startswith("-"):
+            # stray value, keep it attached to the previous option
+            if options:
+                option, value = options[-1]
+                value = token if value is None else f"{value} {token}"
+                options[-1] = (option, value)
+            continue
+        if token.startswith("--"):
+            option, sep, value = token.partition("=")
+            if not sep:
+                value = None
+                if option not in _FLAG_OPTIONS and i < len(tokens):
+                    if not tokens[i].startswith("-"):
+                        value = tokens[i]
+                        i += 1
+        else:
+            option = token[:2]
+            value = token[2:].lstrip("=") or None
+            if value is None and i < len(tokens) and not tokens[i].startswith("-"):
+                value = tokens[i]
+                i += 1
+        options.append((option, value))
+    return tuple(options)
+
+
+def _parse_specifiers(text, position):
+    # optional parentheses around the specifiers, e.g. `pkg (>=1.0)`
+    match = _OPEN_PAREN_RE.match(text, position)
+    parenthesized = match is not None
+    spec_start = None
+    if parenthesized:
+        spec_start = match.end() - 1
+        position = match.end()
+
+    specifiers = []
+    while True:
+        match = _SPECIFIER_RE.match(text, position)
+        if match is None:
+            break
+        if spec_start is None:
+            spec_start = match.start(1)
+        specifiers.append((match.group(1), match.group(2)))
+        position = match.end()
+        comma = _COMMA_RE.match(text, position)
+        if comma is None:
+            break
+        position = comma.end()
+
+    spec_end = position
+    if parenthesized:
+        match = _CLOSE_PAREN_RE.match(text, position)
+        if match is None:
+            return None
+        spec_end = position = match.end()
+    if not specifiers:
+        return (), None, position
+    return tuple(specifiers), (spec_start, spec_end), position
+
+
+def _parse_requirement(text, record):
+    if _URL_RE.match(text):
+        record.url = text.strip()
+        return record
+
+    match = _NAME_RE.match(text)
+    if match is None:
+        record.url = text.strip()
+        return record
+    name = match.group(1)
+    position = match.end()
+
+    extras = ()
+    match = _EXTRAS_RE.match(text, position)
+    if match:
+        extras = tuple(e.strip() for e in match.group(1).split(",") if e.strip())
+        position = match.end()
+    insert_at = position
+
+    url = None
+    version_span = None
+    specifiers = ()
+    match = _URL_REFERENCE_RE.match(text, position)
+    if match:
+        url = match.group(1)
+        position = match.end()
+    else:
+        parsed = _parse_specifiers(text, position)
+        if parsed is None:
+            record.url = text.strip()
+            return record
+        specifiers, version_span, position = parsed
+        if version_span is None:
+            version_span = (insert_at, insert_at)
+
+    markers = None
+    rest = text[position:].strip()
+    if rest.startswith(";"):
+        markers = rest[1:].strip() or None
+    elif rest:
+        # unsupported syntax, keep the line untouched
+        version_span = None
+
+    record.name = name
+    record.extras = extras
+    record.specifiers = specifiers
+    record.markers = markers
+    record.url = url
+    record.version_span = version_span
+    return record
+
+
+def parse_requirement_line(raw, span=(0, 1)):
+    """
+    Parse one logical line of a requirements file.
+
+    Parameters
+    ----------
+    raw : str
+        Text of the physical lines of the logical line joined together,
+        including line continuations and line endings.
+    span : tuple of int, optional
+        `(start, end)` indices of the physical lines of `raw`.
+
+    Returns
+    -------
+    Requirement or None
+        The parsed record, or None for blank and comment-only lines.
+    """
+
+    text, comment = _split_comment(raw)
+    if not text.strip():
+        return None
+
+    record = Requirement(comment=comment, span=span)
+    if text.lstrip().startswith("-"):
+        record.options = _parse_options(text)
+        return record
+
+    requirement_text, options_text = _split_options(text)
+    record.options = _parse_options(options_text)
+    return _parse_requirement(requirement_text, record)
+
+
+def parse_requirements(lines):
+    """
+    Parse requirements file lines into `Requirement` records in one pass.
+
+    Parameters
+    ----------
+    lines : iterable of str
+        Lines of the requirements file, e.g. from `read_requirements`,
+        including line endings. Lines are consumed one at a time, so they
+        can be streamed, see `pru.textio.iter_lines`.
+
+    Returns
+    -------
+    list of Requirement
+        Records of requirement and option lines, in file order.
+
+    Examples
+    --------
+    >>> parse_requirements(["requests[socks]>=2.0  # http\\n"])[0].specifiers
+    (('>=', '2.0'),)
+    """
+
+    requirements = []
+    start = end = 0
+    raw = None
+    for end, line in enumerate(lines, 1):
+        if raw is None:
+            start = end - 1
+            raw = line
+        else:
+            raw += line
+        if raw.rstrip("\r\n").endswith("\\") and not _COMMENT_LINE_RE.match(line):
+            continue
+        record = parse_requirement_line(raw, (start, end))
+        if record is not None:
+            requirements.append(record)
+        raw = None
+    if raw is not None:
+        # the last line is continued
+        record = parse_requirement_line(raw, (start, end))
+        if record is not None:
+            requirements.append(record)
+    return requirements
+
+
+def _format_hashed(raw, requirement, version, hashes):
+    text, comment = _split_comment(raw)
+    requirement_text, _ = _split_options(text)
+    spec_start, spec_end = requirement.version_span
+    head = f"{requirement_text[:spec_start]}=={version}{requirement_text[spec_end:]}"
+
+    parts = [head.rstrip()]
+    for option, value in requirement.options:
+        if option != "--hash":
+            parts.append(option if value is None else f"{option} {value}")
+    parts.extend(f"--hash=sha256:{digest}" for digest in hashes)
+
+    newline = "\r\n" if "\r\n" in raw else "\n"
+    line_ending = raw[len(raw.rstrip("\r\n")) :]
+    if comment:
+        parts[-1] = f"{parts[-1]}  {comment}"
+    return f" \\{newline}    ".join(parts) + line_ending
+
+
+def _has_stale_hashes(requirement, version):
+    return requirement.specifiers != (("==", version),) and any(
+        option == "--hash" for option, _ in requirement.options
+    )
+
+
+def pin_requirements(lines, requirements, get_version, get_hashes=None):
+    """
+    Rewrite requirements lines with pinned versions.
+
+    Only the version specifier of each pinned record is replaced, so
+    extras, markers, options, comments, and line endings are kept as is.
+
+    Parameters
+    ----------
+    lines : list of str
+        Lines of the requirements file.
+    requirements : list of Requirement
+        Records parsed from `lines` with `parse_requirements`.
+    get_version : callable
+        Called with each `Requirement` that has a name and returns the
+        version to pin, or None to keep the line unchanged.
+    get_hashes : callable or None, optional
+        Called with each pinned `Requirement` and its version, returns the
+        sha256 digests to write as `--hash` options, or None to keep the
+        existing ones. Lines with hashes are written with one option per
+        continuation line, replacing every previous `--hash` option.
+
+    Returns
+    -------
+    list of str
+        Updated lines. Each pinned logical line becomes a single item.
+
+    Notes
+    -----
+    Existing `--hash` options are only kept while the pinned version is
+    unchanged. Digests of another version would fail `--require-hashes`
+    installs, so they are dropped when no new ones are given.
+    """
+
+    updated = []
+    position = 0
+    for requirement in requirements:
+        if requirement.name is None or requirement.version_span is None:
+            continue
+        version = get_version(requirement)
+        if version is None:
+            continue
+        hashes = None if get_hashes is None else get_hashes(requirement, version)
+        if hashes is None and _has_stale_hashes(requirement, version):
+            hashes = []
+        start, end = requirement.span
+        raw = "".join(lines[start:end])
+        updated.extend(lines[position:start])
+        if hashes is None:
+            spec_start, spec_end = requirement.version_span
+            updated.append(f"{raw[:spec_start]}=={version}{raw[spec_end:]}")
+        else:
+            updated.append(_format_hashed(raw, requirement, version, hashes))
+        position = end
+    updated.extend(lines[position:])
+    return updated
+
+
+class RequirementsFile:
+    """
+    A parsed requirements file.
+
+    Attributes
+    ----------
+    path : str
+        Path of the file.
+    lines : list of str
+        Lines of the file, including line endings.
+    requirements : list of Requirement
+        Records parsed from `lines`.
+    constraint : bool
+        True if the file is only included as a constraints file (`-c`).
+    text_format : pru.textio.TextFormat or None
+        Encoding and line endings of the file, see `pru.textio.read_lines`.
+    """
+
+    __slots__ = ("path", "lines", "requirements", "constraint", "text_format")
+
+    def __init__(
+        self, path, lines, requirements=None, constraint=False, text_format=None
+    ):
+        self.path = path
+        self.lines = lines
+        self.requirements = (
+            parse_requirements(lines) if requirements is None else requirements
+        )
+        self.constraint = constraint
+        self.text_format = text_format
+
+    def __repr__(self):
+        return (
+            f"RequirementsFile(path={self.path!r}, "
+            f"requirements={len(self.requirements)}, constraint={self.constraint})"
+        )
+
+    def get_includes(self):
+        """
+        Get the files included with `-r` or `-c` options.
+
+        Returns
+        -------
+        list of tuple
+            `(path, constraint)` pairs in file order, where `path` is resolved
+            relative to the directory of this file and `constraint` is True
+            for `-c` includes. Remote URLs are skipped.
+        """
+
+        directory = os.path.dirname(self.path)
+        includes = []
+        for requirement in self.requirements:
+            for option, value in requirement.options:
+                if option not in _INCLUDE_OPTIONS or not value or "://" in value:
+                    continue
+                path = os.path.normpath(os.path.join(directory, value))
+                includes.append((path, _INCLUDE_OPTIONS[option]))
+        return includes
@@ -0,0 +1,392 @@
+"""Parsing and ordering of PEP 440 versions.
+
+Versions are turned into plain tuples of numbers and strings that sort in
+PEP 440 order, so they can be compared and sorted directly. Keys are cached,
+since the same versions are compared many times when looking for the latest
+release of hundreds of packages.
+
+Version specifiers are compiled once into predicates comparing these keys,
+following the PEP 440 rules for `~=`, wildcards, exclusive comparisons and
+pre-releases.
+"""
+
+import re
+from functools import lru_cache
+
+_VERSION_RE = re.compile(
+    r"""
+    ^\s*v?
+    (?:(?P<epoch>[0-9]+)!)?
+    (?P<release>[0-9]+(?:\.[0-9]+)*)
+    (?:[-_.]?(?P<pre_l>alpha|a|beta|b|preview|pre|c|rc)[-_.]?(?P<pre_n>[0-9]+)?)?
+    (?:-(?P<post_n1>[0-9]+)|[-_.]?(?P<post_l>post|rev|r)[-_.]?(?P<post_n2>[0-9]+)?)?
+    (?:[-_.]?(?P<dev_l>dev)[-_.]?(?P<dev_n>[0-9]+)?)?
+    (?:\+(?P<local>[a-z0-9]+(?:[-_.][a-z0-9]+)*))?
+    \s*$
+    """,
+    re.VERBOSE | re.IGNORECASE,
+)
+
+_LOCAL_SEPARATOR_RE = re.compile(r"[-_.]")
+
+# pre-release phases, in PEP 440 order
+_PRE_RELEASES = {
+    "a": 0,
+    "alpha": 0,
+    "b": 1,
+    "beta": 1,
+    "c": 2,
+    "rc": 2,
+    "pre": 2,
+    "preview": 2,
+}
+
+# sorts a developmental release before its pre-releases
+_DEV_ONLY_PRE = (-1, 0)
+# sorts a final release after its pre-releases
+_NO_PRE = (3, 0)
+# sorts a release after its developmental releases
+_NO_DEV = float("inf")
+
+
+# large enough for the release lists of thousands of packages
+@lru_cache(maxsize=2**16)
+def parse_version(version):
+    """
+    Get the sort key of a PEP 440 version.
+
+    Parameters
+    ----------
+    version : str
+        Version string, e.g. `1.26.3`, `2.0rc1` or `1!2.0.post1.dev3+local`.
+
+    Returns
+    -------
+    tuple or None
+        Key ordering versions as defined by PEP 440, or None if `version` is
+        not a valid PEP 440 version. Equal versions, such as `1.0` and
+        `1.0.0`, share the same key.
+
+    Examples
+    --------
+    >>> parse_version("1.0rc1") < parse_version("1.0") < parse_version("1.0.post1")
+    True
+    """
+
+    match = _VERSION_RE.match(version)
+    if match is None:
+        return None
+
+    release = [int(part) for part in match.group("release").split(".")]
+    while len(release) > 1 and release[-1] == 0:
+        release.pop()
+
+    pre_l = match.group("pre_l")
+    post = match.group("post_n1") or match.group("post_n2")
+    has_post = post is not None or match.group("post_l") is not None
+    has_dev = match.group("dev_l") is not None
+
+    if pre_l is not None:
+        pre = (_PRE_RELEASES[pre_l.lower()], int(match.group("pre_n") or 0))
+    elif has_dev and not has_post:
+        pre = _DEV_ONLY_PRE
+    else:
+        pre = _NO_PRE
+
+    local = match.group("local")
+    if local is None:
+        local_key = ()
+    else:
+        # numeric segments sort after alphanumeric ones
+        local_key = tuple(
+            (1, int(part), "") if part.isdigit() else (0, 0, part.lower())
+            for part in _LOCAL_SEPARATOR_RE.split(local)
+        )
+
+    return (
+        int(match.group("epoch") or 0),
+        tuple(release),
+        pre,
+        int(post or 0) if has_post else -1,
+        int(match.group("dev_n") or 0) if has_dev else _NO_DEV,
+        local_key,
+    )
+
+
+def is_prerelease(version):
+    """
+    Check whether a version is a pre-release or a developmental release.
+
+    Parameters
+    ----------
+    version : str
+        Version string.
+
+    Returns
+    -------
+    bool
+        True for pre-releases (`a`, `b`, `rc`) and developmental releases
+        (`dev`). False for final releases and invalid versions.
+    """
+
+    key = parse_version(version)
+    return key is not None and (key[2] != _NO_PRE or key[4] != _NO_DEV)
+
+
+def get_latest_version(versions, prereleases=False):
+    """
+    Get the latest of many versions.
+
+    Parameters
+    ----------
+    versions : iterable of str
+        Version strings. Invalid versions are ignored.
+    prereleases : bool, optional
+        If True, pre-releases and developmental releases are candidates too.
+        Otherwise they are only considered when there is no final release.
+
+    Returns
+    -------
+    str or None
+        The latest version, or None if there is no valid version.
+    """
+
+    latest = None
+    latest_pre = None
+    for version in versions:
+        key = parse_version(version)
+        if key is None:
+            continue
+        if not prereleases and is_prerelease(version):
+            if latest_pre is None or key > latest_pre[0]:
+                latest_pre = (key, version)
+        elif latest is None or key > latest[0]:
+            latest = (key, version)
+    if latest is None:
+        latest = latest_pre
+    return None if latest is None else latest[1]
+
+
+def _is_final(key):
+    return key[2] == _NO_PRE and key[4] == _NO_DEV
+
+
+def _public(key):
+    return key[:5]
+
+
+def _get_release(version, suffixes=True):
+    # (epoch, release) with the release as written, e.g. (0, (1, 0)) for 1.0
+    match = _VERSION_RE.match(version)
+    if match is None:
+        return None
+    if not suffixes and any(
+        match.group(group) is not None
+        for group in ("pre_l", "post_n1", "post_l", "dev_l", "local")
+    ):
+        return None
+    release = tuple(int(part) for part in match.group("release").split("."))
+    return int(match.group("epoch") or 0), release
+
+
+def _matches_prefix(key, prefix):
+    epoch, release = prefix
+    if key is None or key[0] != epoch:
+        return False
+    candidate = key[1]
+    if len(candidate) < len(release):
+        # keys drop trailing zeros, so releases are padded back
+        candidate += (0,) * (len(release) - len(candidate))
+    return candidate[: len(release)] == release
+
+
+def _compile_equal(spec, version):
+    if spec[5]:
+        return lambda key, raw: key == spec
+    # without a local segment, the local segment of candidates is ignored
+    public = _public(spec)
+    return lambda key, raw: key is not None and _public(key) == public
+
+
+def _compile_not_equal(spec, version):
+    equal = _compile_equal(spec, version)
+    return lambda key, raw: key is not None and not equal(key, raw)
+
+
+def _compile_less_equal(spec, version):
+    public = _public(spec)
+    return lambda key, raw: key is not None and _public(key) <= public
+
+
+def _compile_greater_equal(spec, version):
+    public = _public(spec)
+    return lambda key, raw: key is not None and _public(key) >= public
+
+
+def _compile_less(spec, version):
+    # `<V` excludes the pre-releases of V, unless V is one: anything from the
+    # first developmental release of V, e.g. `1.0.dev0` for `<1.0`
+    if _is_final(spec):
+        lowest = (spec[0], spec[1], _NO_PRE if spec[3] != -1 else _DEV_ONLY_PRE)
+        lowest += (spec[3], 0, ())
+    else:
+        lowest = spec
+
+    def check(key, raw):
+        return key is not None and key < lowest
+
+    return check
+
+
+def _compile_greater(spec, version):
+    public = _public(spec)
+    post = spec[3] != -1
+
+    def check(key, raw):
+        # `>V` excludes the post-releases of V, unless V is one, and the
+        # local versions of V
+        if key is None or key <= spec or _public(key) == public:
+            return False
+        return post or key[:3] != spec[:3] or key[3] == -1
+
+    return check
+
+
+def _compile_compatible(spec, version):
+    # `~=X.Y.Z` is `>=X.Y.Z, ==X.Y.*`
+    epoch, release = _get_release(version)
+    if len(release) < 2:
+        return None
+    prefix = (epoch, release[:-1])
+    public = _public(spec)
+    return lambda key, raw: (
+        key is not None and _public(key) >= public and _matches_prefix(key, prefix)
+    )
+
+
+_COMPILERS = {
+    "==": _compile_equal,
+    "!=": _compile_not_equal,
+    "<=": _compile_less_equal,
+    ">=": _compile_greater_equal,
+    "<": _compile_less,
+    ">": _compile_greater,
+    "~=": _compile_compatible,
+}
+
+
+def _compile_specifier(operator, version):
+    if operator == "===":
+        return lambda key, raw: raw.strip().lower() == version.lower()
+    if version.endswith(".*"):
+        prefix = _get_release(version[:-2], suffixes=False)
+        if prefix is None or operator not in ("==", "!="):
+            return None
+        if operator == "==":
+            return lambda key, raw: _matches_prefix(key, prefix)
+        return lambda key, raw: key is not None and not _matches_prefix(key, prefix)
+    spec = parse_version(version)
+    if spec is None or operator not in _COMPILERS:
+        return None
+    if spec[5] and operator not in ("==", "!="):
+        # local versions are only allowed in equality specifiers
+        return None
+    return _COMPILERS[operator](spec, version)
+
+
+def _names_prerelease(operator, version):
+    if operator == "!=":
+        return False
+    key = parse_version(version[:-2] if version.endswith(".*") else version)
+    return key is not None and not _is_final(key)
+
+
+@lru_cache(maxsize=4096)
+def compile_specifiers(specifiers):
+    """
+    Compile version specifiers into a predicate.
+
+    Parameters
+    ----------
+    specifiers : tuple of tuple
+        `(operator, version)` pairs, as in `Requirement.specifiers`, e.g.
+        `(("~=", "1.26"), ("!=", "1.26.2"))`. Operators are `==`, `!=`, `<=`,
+        `>=`, `<`, `>`, `~=` and `===`, and `==`/`!=` accept `.*` wildcards.
+
+    Returns
+    -------
+    callable
+        `matches(version, prereleases=None)`, True if the version string
+        satisfies every specifier. Pre-releases only match when
+        `prereleases` is True, or when it is None and a specifier names a
+        pre-release.
+
+    Raises
+    ------
+    ValueError
+        If a specifier is not valid, e.g. `~=1` or `<=1.0+local`.
+
+    Notes
+    -----
+    - Compiled predicates are memoized, and version keys are cached by
+      `parse_version`, so checking many versions against the same
+      specifiers is a few tuple comparisons per version.
+    """
+
+    checks = []
+    for operator, version in specifiers:
+        check = _compile_specifier(operator, version)
+        if check is None:
+            raise ValueError(f"Invalid version specifier: {operator}{version}")
+        checks.append(check)
+    checks = tuple(checks)
+    allows_prereleases = any(
+        _names_prerelease(operator, version) for operator, version in specifiers
+    )
+
+    def matches(version, prereleases=None):
+        key = parse_version(version)
+        if prereleases is None:
+            prereleases = allows_prereleases
+        if not prereleases and key is not None and not _is_final(key):
+            return False
+        for check in checks:
+            if not check(key, version):
+                return False
+        return True
+
+    return matches
+
+
+def filter_versions(specifiers, versions, prereleases=None):
+    """
+    Get the versions satisfying version specifiers.
+
+    Parameters
+    ----------
+    specifiers : tuple of tuple
+        `(operator, version)` pairs, see `compile_specifiers`.
+    versions : iterable of str
+        Candidate version strings.
+    prereleases : bool or None, optional
+        Whether pre-releases are candidates, see `compile_specifiers`. When
+        None and only pre-releases match, they are returned.
+
+    Returns
+    -------
+    list of str
+        Matching versions, in the order of `versions`.
+
+    Raises
+    ------
+    ValueError
+        If a specifier is not valid.
+    """
+
+    matches = compile_specifiers(tuple(specifiers))
+    versions = list(versions)
+    matching = [version for version in versions if matches(version, prereleases)]
+    if not matching and prereleases is None:
+        # like pip, pre-releases are used when nothing else matches
+        matching = [version for version in versions if matches(version, True)]
+    return matching
@@ -0,0 +1,280 @@
+"""Resolution of upgrades without installing them.
+
+Instead of installing every upgrade before pinning, the installer backend is
+asked which versions it would install: `pip install --dry-run --report` writes
+a JSON report of the resolution, and `uv pip compile` a pinned requirements
+file. The resolved versions then take the place of the installed packages
+index, so pinning costs one resolve instead of a download and install, and
+the environment is left untouched.
+
+pip reports hold the full metadata of every resolved distribution, so they
+are parsed as a stream, one distribution at a time, with
+`json.JSONDecoder.raw_decode`.
+"""
+
+import json
+import os
+import sys
+import tempfile
+
+from pru.backend import resolve_backend
+from pru.core import verbose_subprocess
+from pru.instrument import phase
+from pru.parser import parse_requirements
+from pru.snapshot import InstalledPackage
+from pru.textio import read_lines, write_lines
+from pru.utils import canonicalize_name
+
+_CHUNK_SIZE = 2**16
+_WHITESPACE = " \t\n\r"
+
+
+class _JSONStream:
+    # JSON text read in chunks, decoded one value at a time
+
+    def __init__(self, f, chunk_size=_CHUNK_SIZE):
+        self._file = f
+        self._chunk_size = chunk_size
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._position = 0
+        self._eof = False
+
+    def _read(self):
+        chunk = self._file.read(self._chunk_size)
+        if not chunk:
+            self._eof = True
+            return False
+        self._buffer = self._buffer[self._position :] + chunk
+        self._position = 0
+        return True
+
+    def peek(self):
+        # next character that is not whitespace, or "" at the end
+        while True:
+            while (
+                self._position < len(self._buffer)
+                and self._buffer[self._position] in _WHITESPACE
+            ):
+                self._position += 1
+            if self._position < len(self._buffer):
+                return self._buffer[self._position]
+            if not self._read():
+                return ""
+
+    def expect(self, characters):
+        character = self.peek()
+        if not character or character not in characters:
+            raise ValueError(
+                f"Invalid JSON: expected one of {characters!r}, got {character!r}"
+            )
+        self._position += 1
+        return character
+
+    def decode(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._position)
+            except json.JSONDecodeError:
+                # the value may continue in the next chunk
+                if self._read():
+                    continue
+                raise
+            # so may a number ending with the buffer
+            if end == len(self._buffer) and not self._eof and self._read():
+                continue
+            self._position = end
+            return value
+
+    def iter_array(self):
+        self.expect("[")
+        if self.peek() == "]":
+            self.expect("]")
+            return
+        while True:
+            yield self.decode()
+            if self.expect(",]") == "]":
+                return
+
+
+def iter_report_packages(f, chunk_size=_CHUNK_SIZE):
+    """
+    Stream the distributions of a pip installation report.
+
+    Parameters
+    ----------
+    f : file-like
+        Text stream of a report written by `pip install --report`.
+    chunk_size : int, optional
+        Number of characters read at a time.
+
+    Yields
+    ------
+    InstalledPackage
+        Name, version and `Requires-Dist` dependencies of each distribution
+        pip would install, with a None path. Other members of the report are
+        skipped.
+
+    Raises
+    ------
+    ValueError
+        If the report is not valid JSON.
+    """
+
+    stream = _JSONStream(f, chunk_size)
+    stream.expect("{")
+    if stream.peek() == "}":
+        return
+    while True:
+        key = stream.decode()
+        stream.expect(":")
+        if key == "install":
+            for item in stream.iter_array():
+                metadata = item["metadata"]
+                yield InstalledPackage(
+                    metadata["name"],
+                    metadata["version"],
+                    None,
+                    tuple(metadata.get("requires_dist") or ()),
+                )
+        else:
+            stream.decode()
+        if stream.expect(",}") == "}":
+            return
+
+
+def _get_index_options(constraints, find_links, index_url, no_index):
+    options = []
+    for path in constraints:
+        options += ["--constraint", path]
+    if index_url is not None:
+        options += ["--index-url", index_url]
+    if no_index:
+        options.append("--no-index")
+    for directory in find_links or ():
+        options += ["--find-links", directory]
+    return options
+
+
+def _resolve_with_pip(names, options, python, directory, timeout, log_path):
+    report_path = os.path.join(directory, "report.json")
+    verbose_subprocess(
+        [
+            python,
+            "-m",
+            "pip",
+            "install",
+            "--dry-run",
+            "--ignore-installed",
+            "--quiet",
+            "--disable-pip-version-check",
+            "--report",
+            report_path,
+            *options,
+            *names,
+        ],
+        timeout=timeout,
+        log_path=log_path,
+        check=True,
+    )
+    with open(report_path, encoding="utf-8") as f:
+        return list(iter_report_packages(f))
+
+
+def _resolve_with_uv(names, options, python, directory, timeout, log_path):
+    input_path = os.path.join(directory, "requirements.in")
+    output_path = os.path.join(directory, "requirements.txt")
+    write_lines(input_path, [f"{name}\n" for name in names])
+    verbose_subprocess(
+        [
+            "uv",
+            "pip",
+            "compile",
+            "--quiet",
+            "--no-header",
+            "--no-annotate",
+            "--python",
+            python,
+            "--output-file",
+            output_path,
+            *options,
+            input_path,
+        ],
+        timeout=timeout,
+        log_path=log_path,
+        check=True,
+    )
+    return [
+        InstalledPackage(requirement.name, requirement.specifiers[0][1], None)
+        for requirement in parse_requirements(read_lines(output_path)[0])
+        if requirement.name is not None
+        and len(requirement.specifiers) == 1
+        and requirement.specifiers[0][0] == "=="
+    ]
+
+
+def resolve_versions(
+    names,
+    backend=None,
+    constraints=(),
+    find_links=None,
+    index_url=None,
+    no_index=False,
+    python=None,
+    timeout=None,
+    log_path=None,
+):
+    """
+    Resolve the latest versions of packages without installing them.
+
+    Parameters
+    ----------
+    names : list of str
+        Requirements to resolve, e.g. `["requests[socks]", "numpy<=1.26.3"]`.
+    backend : str or None, optional
+        Resolver backend: "pip" runs `pip install --dry-run --report`, "uv"
+        runs `uv pip compile`. If None, uses uv when available.
+    constraints : sequence of str, optional
+        Paths of constraints files applied to the resolution.
+    find_links : list of str or None, optional
+        Directories or URLs of distributions to resolve from.
+    index_url : str or None, optional
+        Base URL of the package index. If None, the backend default is used.
+    no_index : bool, optional
+        If True, the package index is not used, only `find_links`, so the
+        resolution runs offline.
+    python : str or None, optional
+        Interpreter whose environment markers and tags the resolution
+        targets. If None, uses the running interpreter.
+    timeout : float or None, optional
+        Seconds to wait for the resolver before killing it.
+    log_path : str or None, optional
+        Path to a JSON lines file receiving the resolver output events, see
+        `pru.core.verbose_subprocess`.
+
+    Returns
+    -------
+    dict
+        Index of {canonical_name: InstalledPackage} of every resolved
+        distribution, dependencies included, like
+        `pru.core.get_installed_packages_index`. Dependencies are only known
+        with pip.
+
+    Raises
+    ------
+    subprocess.CalledProcessError
+        If the resolution failed.
+    subprocess.TimeoutExpired
+        If the resolver did not finish within `timeout`.
+    """
+
+    backend = resolve_backend(backend)
+    if python is None:
+        python = sys.executable
+    options = _get_index_options(constraints, find_links, index_url, no_index)
+    resolve = _resolve_with_uv if backend == "uv" else _resolve_with_pip
+    with tempfile.TemporaryDirectory(prefix="pru-resolve-") as directory:
+        with phase("resolve", backend=backend):
+            packages = resolve(names, options, python, directory, timeout, log_path)
+    return {canonicalize_name(package.name): package for package in packages}
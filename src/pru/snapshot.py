@@ -0,0 +1,718 @@
+"""Persistent snapshot of the installed distributions.
+
+Reading the metadata of every installed distribution is the dominant cost of
+pinning on large environments. The snapshot stores, for each scanned
+site-packages directory, its mtime and the name, version, dependencies
+(`Requires-Dist`) and top-level modules (`top_level.txt` or `RECORD`) read
+from each `*.dist-info` / `*.egg-info` entry. On later runs a directory whose
+mtime did not change is reused as is, and a changed directory only re-reads
+the entries that were added or modified. Metadata reads are latency bound on
+network file systems, so directories are scanned, and their entries read, in
+thread pools.
+
+By default, the snapshot is stored next to the environment in
+`<sys.prefix>/.pru/snapshot.json`, or in the pru cache directory when the
+environment is not writable.
+"""
+
+import glob
+import hashlib
+import importlib
+import os
+import site
+import sys
+import time
+from collections import namedtuple
+from itertools import chain
+
+from pru.cache import (
+    get_cache_dir,
+    load_json_cache,
+    prune_cache_entries,
+    store_json_cache,
+    touch_cache_entries,
+)
+from pru.utils import canonicalize_name
+
+SNAPSHOT_VERSION = 4
+
+# Changes made within this window of a scan may share the same timestamp as
+# the scanned state, so such timestamps are not trusted on the next run.
+RACY_NS = 2 * 10**9
+
+InstalledPackage = namedtuple(
+    "InstalledPackage",
+    ["name", "version", "path", "requires", "top_level"],
+    defaults=((), ()),
+)
+
+_EXTENSION_SUFFIXES = (".so", ".pyd")
+
+# directories kept in a snapshot, the least recently scanned are dropped
+_MAX_DIRECTORIES = 256
+
+# entries read by each task of the thread pool
+_CHUNK_SIZE = 32
+
+# average time to load an entry above which the rest of a directory is read
+# in the thread pool, well above the cost of a read from the page cache
+_SLOW_ENTRY_SECONDS = 200e-6
+
+
+def get_environment_paths():
+    """
+    Get the directories of `sys.path` that may contain installed packages.
+
+    Returns
+    -------
+    list of str
+        Absolute, deduplicated paths of the existing `sys.path` directories,
+        in `sys.path` order.
+    """
+
+    paths = []
+    seen = set()
+    for entry in sys.path:
+        path = os.path.abspath(entry or os.curdir)
+        if path not in seen and os.path.isdir(path):
+            seen.add(path)
+            paths.append(path)
+    return paths
+
+
+def _get_site_directories():
+    directories = []
+    if site.ENABLE_USER_SITE:
+        directories.append(site.getusersitepackages())
+    # `site.getsitepackages` is missing from the `site` of old virtualenvs
+    directories.extend(getattr(site, "getsitepackages", list)())
+    return directories
+
+
+def _read_pth_paths(directory):
+    # path entries of the `.pth` files, without running their import lines
+    try:
+        names = sorted(name for name in os.listdir(directory) if name.endswith(".pth"))
+    except OSError:
+        return []
+    paths = []
+    for name in names:
+        try:
+            with open(os.path.join(directory, name), encoding="utf-8") as f:
+                lines = f.read().splitlines()
+        except (OSError, UnicodeDecodeError):
+            continue
+        for line in lines:
+            line = line.rstrip()
+            if line and not line.startswith(("#", "import ", "import\t")):
+                paths.append(os.path.join(directory, line))
+    return paths
+
+
+def refresh_environment_paths():
+    """
+    Make the packages installed since startup visible to this process.
+
+    An installer may create directories that did not exist when the
+    interpreter started, such as the user site-packages of a first
+    `pip install --user`, or register new directories in `.pth` files, e.g.
+    editable installs. A new interpreter would add them to `sys.path`, this
+    process does not, so its scans would miss the installed packages. The
+    import system caches of `importlib` are invalidated too, so
+    `importlib.metadata` and imports see the new files.
+
+    Returns
+    -------
+    list of str
+        Directories appended to `sys.path`, in the order the `site` module
+        would add them.
+
+    Notes
+    -----
+    - The import lines of `.pth` files are not run again.
+    - Nothing is added when Python runs without the `site` module (`-S`).
+    """
+
+    importlib.invalidate_caches()
+    if sys.flags.no_site:
+        # without the `site` module, `sys.path` is left as is
+        return []
+    known = {
+        os.path.normcase(os.path.abspath(entry or os.curdir)) for entry in sys.path
+    }
+    added = []
+    for directory in _get_site_directories():
+        if not os.path.isdir(directory):
+            continue
+        for path in [directory, *_read_pth_paths(directory)]:
+            key = os.path.normcase(os.path.abspath(path))
+            if key not in known and os.path.isdir(path):
+                known.add(key)
+                sys.path.append(path)
+                added.append(path)
+    return added
+
+
+def get_environment_site_packages(prefix):
+    """
+    Get the site-packages directories of an environment, without running it.
+
+    Parameters
+    ----------
+    prefix : str
+        Virtual environment or installation prefix, e.g. `.venv`.
+
+    Returns
+    -------
+    list of str
+        Absolute paths of `lib/python*/site-packages` (and `lib64`) on POSIX,
+        or of `Lib/site-packages` on Windows layouts.
+
+    Raises
+    ------
+    ValueError
+        If the prefix has no site-packages directory.
+    """
+
+    prefix = os.path.abspath(prefix)
+    patterns = (
+        os.path.join(prefix, "lib", "python*", "site-packages"),
+        os.path.join(prefix, "lib64", "python*", "site-packages"),
+        os.path.join(prefix, "Lib", "site-packages"),
+    )
+    paths = []
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern)):
+            # lib64 is often a symlink to lib
+            if os.path.isdir(path) and all(
+                not os.path.samefile(path, other) for other in paths
+            ):
+                paths.append(path)
+    if not paths:
+        raise ValueError(f"No site-packages directory found in {prefix}")
+    return paths
+
+
+def get_snapshot_path(prefix=None):
+    """
+    Get the path of the snapshot file of an environment.
+
+    Parameters
+    ----------
+    prefix : str or None, optional
+        Environment prefix. If None, uses `sys.prefix`.
+
+    Returns
+    -------
+    str
+        `<prefix>/.pru/snapshot.json` when the prefix is writable, otherwise
+        a file in the pru cache directory named after the prefix.
+    """
+
+    if prefix is None:
+        prefix = sys.prefix
+    prefix = os.path.abspath(prefix)
+    if os.access(prefix, os.W_OK):
+        return os.path.join(prefix, ".pru", "snapshot.json")
+    digest = hashlib.sha1(prefix.encode("utf-8")).hexdigest()[:16]
+    return get_cache_dir("snapshots", f"{digest}.json")
+
+
+def get_metadata_path(path):
+    """
+    Get the metadata file of a `.dist-info` or `.egg-info` entry.
+
+    Parameters
+    ----------
+    path : str
+        Path to a `.dist-info` directory, or an `.egg-info` directory or file.
+
+    Returns
+    -------
+    str
+        Path to `METADATA` or `PKG-INFO`. An `.egg-info` file is its own
+        metadata file.
+    """
+
+    if path.lower().endswith(".dist-info"):
+        return os.path.join(path, "METADATA")
+    if os.path.isdir(path):
+        return os.path.join(path, "PKG-INFO")
+    return path
+
+
+def _read_metadata(metadata_path):
+    name = None
+    version = None
+    requires = []
+    with open(metadata_path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            if line in ("\n", "\r\n"):
+                # end of the headers, the description follows, while blank
+                # lines of folded headers start with whitespace
+                break
+            key, sep, value = line.partition(":")
+            if not sep or line[0] in " \t":
+                continue
+            if key == "Requires-Dist":
+                requires.append(value.strip())
+            elif key == "Name" and name is None:
+                name = value.strip()
+            elif key == "Version" and version is None:
+                version = value.strip()
+    if not requires and os.path.basename(metadata_path) == "PKG-INFO":
+        requires = _read_egg_requires(os.path.dirname(metadata_path))
+    return name, version, requires
+
+
+def _read_egg_requires(path):
+    # `requires.txt` of `.egg-info` directories, with `[extra:marker]` sections
+    requires = []
+    marker = None
+    try:
+        f = open(os.path.join(path, "requires.txt"), "r", encoding="utf-8")
+    except OSError:
+        return requires
+    with f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("[") and line.endswith("]"):
+                extra, _, condition = line[1:-1].partition(":")
+                markers = [f"({condition})"] if condition else []
+                if extra:
+                    markers.append(f'extra == "{extra}"')
+                marker = " and ".join(markers) or None
+            elif marker is None:
+                requires.append(line)
+            else:
+                requires.append(f"{line} ; {marker}")
+    return requires
+
+
+def _get_record_top_level(record_path):
+    top_level = set()
+    with open(record_path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            path = line.rsplit(",", 2)[0].strip('"')
+            top, sep, _ = path.partition("/")
+            if not top or top.startswith("..") or top == "__pycache__":
+                continue
+            if sep:
+                if not top.endswith((".dist-info", ".data", ".egg-info")):
+                    top_level.add(top)
+            elif top.endswith(".py"):
+                top_level.add(top[:-3])
+            elif top.endswith(_EXTENSION_SUFFIXES):
+                top_level.add(top.split(".", 1)[0])
+    return top_level
+
+
+def read_top_level(path):
+    """
+    Read the top-level modules of an installed distribution.
+
+    Parameters
+    ----------
+    path : str
+        Path to a `.dist-info` directory, or an `.egg-info` directory or file.
+
+    Returns
+    -------
+    list of str
+        Sorted names of the importable top-level modules and packages, read
+        from `top_level.txt`, or else from the files listed in `RECORD`.
+    """
+
+    if not os.path.isdir(path):
+        return []
+    try:
+        with open(os.path.join(path, "top_level.txt"), encoding="utf-8") as f:
+            top_level = {line.strip() for line in f}
+    except OSError:
+        try:
+            top_level = _get_record_top_level(os.path.join(path, "RECORD"))
+        except OSError:
+            return []
+    return sorted(name for name in top_level if name.isidentifier())
+
+
+def read_distribution_metadata(path):
+    """
+    Read the name and version of an installed distribution.
+
+    Only the metadata headers are read, the long description is skipped.
+
+    Parameters
+    ----------
+    path : str
+        Path to a `.dist-info` directory, or an `.egg-info` directory or file.
+
+    Returns
+    -------
+    tuple
+        `(name, version)`, where each item is None if missing.
+    """
+
+    try:
+        name, version, _ = _read_metadata(get_metadata_path(path))
+    except OSError:
+        return None, None
+    return name, version
+
+
+def _scan_directory(path, cached, now, executor=None):
+    entries = _iter_directory(path, cached, now, executor)
+    while True:
+        try:
+            next(entries)
+        except StopIteration as stop:
+            return stop.value
+
+
+def _load_entry(path, previous, now):
+    metadata_path = get_metadata_path(path)
+    try:
+        entry_mtime = os.stat(metadata_path).st_mtime_ns
+    except OSError:
+        return None
+    if previous is not None and previous[0] == entry_mtime:
+        return previous
+
+    try:
+        name, version, requires = _read_metadata(metadata_path)
+    except OSError:
+        return None
+    top_level = read_top_level(path)
+    if now - entry_mtime < RACY_NS:
+        entry_mtime = None
+    return [entry_mtime, name, version, requires, top_level]
+
+
+def _map_entries(load, names, executor):
+    # `map` is lazy, so entries are streamed when there is no executor
+    if executor is None or len(names) <= _CHUNK_SIZE:
+        return map(load, names)
+
+    def load_chunk(chunk):
+        return [load(item) for item in chunk]
+
+    # threads only pay off when reads wait on I/O, e.g. on NFS, so the first
+    # chunk is timed to decide
+    start = time.perf_counter()
+    head = load_chunk(names[:_CHUNK_SIZE])
+    if time.perf_counter() - start < _CHUNK_SIZE * _SLOW_ENTRY_SECONDS:
+        return chain(head, map(load, names[_CHUNK_SIZE:]))
+    chunks = [
+        names[i : i + _CHUNK_SIZE] for i in range(_CHUNK_SIZE, len(names), _CHUNK_SIZE)
+    ]
+    return chain(head, chain.from_iterable(executor.map(load_chunk, chunks)))
+
+
+def _iter_directory(path, cached, now, executor=None):
+    # yields (entry_name, entry) as entries are read, returns the snapshot of
+    # the directory, or None if it cannot be listed
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    if cached is not None and cached["mtime"] == mtime:
+        yield from cached["entries"].items()
+        return cached
+
+    previous_entries = {} if cached is None else cached["entries"]
+    try:
+        with os.scandir(path) as iterator:
+            names = [
+                (entry.name, entry.path)
+                for entry in iterator
+                if entry.name.lower().endswith((".dist-info", ".egg-info"))
+            ]
+    except OSError:
+        return None
+
+    def load(item):
+        return _load_entry(item[1], previous_entries.get(item[0]), now)
+
+    loaded = _map_entries(load, names, executor)
+
+    entries = {}
+    is_racy = now - mtime < RACY_NS
+    for (name, _), entry in zip(names, loaded):
+        if entry is None:
+            continue
+        if entry[0] is None:
+            is_racy = True
+        entries[name] = entry
+        yield name, entry
+
+    return {"mtime": None if is_racy else mtime, "entries": entries}
+
+
+def _add_to_index(index, path, entries):
+    for entry_name in sorted(entries):
+        _, name, version, requires, top_level = entries[entry_name]
+        if name is None:
+            continue
+        key = canonicalize_name(name)
+        if key not in index:
+            index[key] = InstalledPackage(
+                name,
+                version,
+                os.path.join(path, entry_name),
+                tuple(requires),
+                tuple(top_level),
+            )
+
+
+def _scan_directories(paths, dirs, now, max_workers):
+    if max_workers == 1:
+        return [_scan_directory(path, dirs.get(path), now) for path in paths]
+
+    # imported here, so `pru --version` does not load concurrent.futures
+    from concurrent.futures import ThreadPoolExecutor
+
+    executor = ThreadPoolExecutor(max_workers)
+
+    def scan(path):
+        return _scan_directory(path, dirs.get(path), now, executor)
+
+    try:
+        if len(paths) < 2:
+            return [scan(path) for path in paths]
+        # directory tasks wait on entry reads, so they get their own pool
+        with ThreadPoolExecutor(len(paths)) as directory_executor:
+            return list(directory_executor.map(scan, paths))
+    finally:
+        executor.shutdown()
+
+
+def _iter_new_packages(path, entries, seen):
+    # yields the packages of `entries` not in `seen`, returns their snapshot
+    while True:
+        try:
+            entry_name, (_, name, version, requires, top_level) = next(entries)
+        except StopIteration as stop:
+            return stop.value
+        if name is None:
+            continue
+        key = canonicalize_name(name)
+        if key not in seen:
+            seen.add(key)
+            yield InstalledPackage(
+                name,
+                version,
+                os.path.join(path, entry_name),
+                tuple(requires),
+                tuple(top_level),
+            )
+
+
+def _load_snapshot(snapshot_path):
+    data = load_json_cache(snapshot_path)
+    if not isinstance(data, dict) or data.get("version") != SNAPSHOT_VERSION:
+        data = {"version": SNAPSHOT_VERSION, "dirs": {}, "used": {}}
+    return data
+
+
+def _get_snapshot_files(paths, snapshot_path):
+    # {directory: snapshot file}, see the `snapshot_path` of the scans
+    if isinstance(snapshot_path, dict):
+        default = get_snapshot_path()
+        return {path: snapshot_path.get(path, default) for path in paths}
+    if snapshot_path is None:
+        snapshot_path = get_snapshot_path()
+    return dict.fromkeys(paths, snapshot_path)
+
+
+def _load_snapshots(files, use_cache):
+    snapshots = {}
+    for snapshot_path in files.values():
+        if snapshot_path not in snapshots:
+            snapshots[snapshot_path] = (
+                _load_snapshot(snapshot_path)
+                if use_cache
+                else {"version": SNAPSHOT_VERSION, "dirs": {}, "used": {}}
+            )
+    return snapshots
+
+
+def _update_snapshot(dirs, path, cached, scanned):
+    # returns True if the snapshot of the directory changed
+    if scanned is None:
+        if cached is None:
+            return False
+        del dirs[path]
+        return True
+    if scanned is cached:
+        return False
+    dirs[path] = scanned
+    return True
+
+
+def _store_snapshots(snapshots, files, changed):
+    for snapshot_path, data in snapshots.items():
+        paths = [path for path, file in files.items() if file == snapshot_path]
+        _store_snapshot(snapshot_path, data, paths, snapshot_path in changed)
+
+
+def _store_snapshot(snapshot_path, data, paths, changed):
+    # the directories of other scans, e.g. of other working directories, are
+    # kept until they are unused for a while
+    used = data.setdefault("used", {})
+    scanned = [path for path in paths if path in data["dirs"]]
+    if touch_cache_entries(used, scanned) or changed:
+        prune_cache_entries(data["dirs"], used, _MAX_DIRECTORIES)
+        store_json_cache(snapshot_path, data)
+
+
+def scan_installed_packages(
+    paths=None, snapshot_path=None, use_cache=True, max_workers=None
+):
+    """
+    Scan installed distributions, reusing the on-disk snapshot.
+
+    Parameters
+    ----------
+    paths : list of str or None, optional
+        Directories to scan, in priority order. If None, uses
+        `get_environment_paths()`.
+    snapshot_path : str, dict or None, optional
+        Path to the snapshot file, or dictionary of {directory: path} of the
+        snapshot file of each directory, e.g. of the environment it belongs
+        to, with `get_snapshot_path()` for the other directories. If None,
+        uses `get_snapshot_path()`.
+    use_cache : bool, optional
+        If False, every directory is scanned from scratch and the snapshot
+        is neither read nor written.
+    max_workers : int or None, optional
+        Maximum number of threads reading metadata. If 1, everything is
+        read in the calling thread. If None, uses the `ThreadPoolExecutor`
+        default.
+
+    Returns
+    -------
+    dict
+        Dictionary of {canonical_name: InstalledPackage}. When a distribution
+        is found more than once, the first one in `paths` wins.
+
+    Notes
+    -----
+    - Only directories are scanned, zipped eggs on `sys.path` are ignored.
+    - Directories whose mtime is unchanged are reused without being listed.
+      Changed directories only re-read added or modified entries.
+    - Directories are scanned concurrently, and the entries of a changed
+      directory are read concurrently, so that the latency of network file
+      systems is paid once per batch instead of once per file.
+    - Directories that no longer exist are dropped from the snapshot, and
+      the directories of other scans once they are unused for
+      `pru.cache.MAX_AGE` seconds, or when the snapshot holds too many.
+    """
+
+    if paths is None:
+        paths = get_environment_paths()
+    paths = [os.path.abspath(path) for path in paths]
+    files = _get_snapshot_files(paths, snapshot_path)
+    snapshots = _load_snapshots(files, use_cache)
+    cached_dirs = {path: snapshots[files[path]]["dirs"].get(path) for path in paths}
+    now = time.time_ns()
+
+    scans = _scan_directories(paths, cached_dirs, now, max_workers)
+    changed = set()
+    index = {}
+    for path, scanned in zip(paths, scans):
+        dirs = snapshots[files[path]]["dirs"]
+        if _update_snapshot(dirs, path, cached_dirs[path], scanned):
+            changed.add(files[path])
+        if scanned is not None:
+            _add_to_index(index, path, scanned["entries"])
+
+    if use_cache:
+        _store_snapshots(snapshots, files, changed)
+    return index
+
+
+def iter_installed_packages(paths=None, snapshot_path=None, use_cache=True):
+    """
+    Iterate over installed distributions as they are discovered.
+
+    Unlike `scan_installed_packages`, each distribution is yielded as soon
+    as its metadata is read (or found unchanged in the snapshot), so
+    consumers can stream large environments without waiting for the scan
+    to finish.
+
+    Parameters
+    ----------
+    paths : list of str or None, optional
+        Directories to scan, in priority order. If None, uses
+        `get_environment_paths()`.
+    snapshot_path : str, dict or None, optional
+        Path to the snapshot file, or dictionary of {directory: path} of the
+        snapshot file of each directory, e.g. of the environment it belongs
+        to, with `get_snapshot_path()` for the other directories. If None,
+        uses `get_snapshot_path()`.
+    use_cache : bool, optional
+        If False, every directory is scanned from scratch and the snapshot
+        is neither read nor written.
+
+    Yields
+    ------
+    InstalledPackage
+        Each installed distribution once. When a distribution is found more
+        than once, the first one in `paths` is yielded.
+
+    Notes
+    -----
+    - Distributions are yielded in directory listing order.
+    - The snapshot is only updated when the iteration completes.
+    """
+
+    if paths is None:
+        paths = get_environment_paths()
+    paths = [os.path.abspath(path) for path in paths]
+    files = _get_snapshot_files(paths, snapshot_path)
+    snapshots = _load_snapshots(files, use_cache)
+    now = time.time_ns()
+
+    changed = set()
+    seen = set()
+    for path in paths:
+        dirs = snapshots[files[path]]["dirs"]
+        cached = dirs.get(path)
+        entries = _iter_directory(path, cached, now)
+        scanned = yield from _iter_new_packages(path, entries, seen)
+        if _update_snapshot(dirs, path, cached, scanned):
+            changed.add(files[path])
+
+    if use_cache:
+        _store_snapshots(snapshots, files, changed)
+
+
+def invalidate_snapshot(snapshot_path=None):
+    """
+    Invalidate the snapshot after the environment was modified.
+
+    The directory mtimes are dropped, so the next scan lists every directory
+    again. Entries are still reused when their metadata is unchanged.
+
+    Parameters
+    ----------
+    snapshot_path : str, dict or None, optional
+        Path to the snapshot file. If None, uses `get_snapshot_path()`. A
+        dictionary of {directory: path}, see `scan_installed_packages`,
+        invalidates all of its snapshot files and `get_snapshot_path()`.
+    """
+
+    if isinstance(snapshot_path, dict):
+        for path in {get_snapshot_path(), *snapshot_path.values()}:
+            invalidate_snapshot(path)
+        return
+    if snapshot_path is None:
+        snapshot_path = get_snapshot_path()
+    data = _load_snapshot(snapshot_path)
+    if not data["dirs"]:
+        return
+    for directory in data["dirs"].values():
+        directory["mtime"] = None
+    store_json_cache(snapshot_path, data)
@@ -0,0 +1,206 @@
+"""Encoding-preserving text I/O for requirements files.
+
+Requirements files are usually UTF-8, but tools on Windows write UTF-16 with
+a byte order mark (BOM), and some files use CRLF line endings. Files are
+opened once, their encoding is sniffed from the first bytes, and they are
+written back with the same encoding, BOM and line endings, so pinning a file
+only changes its pins.
+
+Bytes that are not valid UTF-8 are decoded with the `surrogateescape` error
+handler, so they are written back unchanged, and lone surrogates of UTF-16
+and UTF-32 files are kept with `surrogatepass`.
+"""
+
+import codecs
+import io
+from collections import namedtuple
+
+from pru.utils import atomic_write
+
+TextFormat = namedtuple("TextFormat", ["encoding", "bom", "newline"])
+
+# format of new files
+DEFAULT_FORMAT = TextFormat("utf-8", False, "\n")
+
+# longest BOMs first, since the UTF-32-LE BOM starts with the UTF-16-LE one
+_BOMS = (
+    (codecs.BOM_UTF32_LE, "utf-32-le"),
+    (codecs.BOM_UTF32_BE, "utf-32-be"),
+    (codecs.BOM_UTF8, "utf-8"),
+    (codecs.BOM_UTF16_LE, "utf-16-le"),
+    (codecs.BOM_UTF16_BE, "utf-16-be"),
+)
+
+
+def _get_errors(encoding):
+    return "surrogateescape" if encoding == "utf-8" else "surrogatepass"
+
+
+def sniff_encoding(head):
+    """
+    Guess the encoding of a text file from its first bytes.
+
+    Parameters
+    ----------
+    head : bytes
+        At least the first 4 bytes of the file, when it has that many.
+
+    Returns
+    -------
+    tuple
+        `(encoding, bom_size)`, where `bom_size` is the number of bytes of
+        the byte order mark, 0 without one. Without BOM, text with a NUL
+        byte in one of its first two bytes is UTF-16, anything else UTF-8.
+    """
+
+    for bom, encoding in _BOMS:
+        if head.startswith(bom):
+            return encoding, len(bom)
+    if len(head) >= 2:
+        if head[0] and not head[1]:
+            return "utf-16-le", 0
+        if not head[0] and head[1]:
+            return "utf-16-be", 0
+    return "utf-8", 0
+
+
+def _get_newline(newlines):
+    # `TextIOWrapper.newlines` is None, a string, or a tuple of every kind
+    if newlines is None:
+        return "\n"
+    if isinstance(newlines, str):
+        return newlines
+    return "\r\n" if "\r\n" in newlines else newlines[0]
+
+
+class TextReader:
+    """
+    Stream the lines of a text file, opened once.
+
+    The encoding is sniffed from the first bytes, and lines are decoded as
+    they are read, with line endings translated to "\\n".
+
+    Parameters
+    ----------
+    path : str
+        Path of the file.
+
+    Attributes
+    ----------
+    encoding : str
+        Encoding of the file.
+    bom : bool
+        True if the file starts with a byte order mark.
+    """
+
+    def __init__(self, path):
+        raw = open(path, "rb")
+        try:
+            self.encoding, bom_size = sniff_encoding(raw.peek(4)[:4])
+            raw.seek(bom_size)
+        except BaseException:
+            raw.close()
+            raise
+        self.bom = bom_size > 0
+        self._file = io.TextIOWrapper(
+            raw, encoding=self.encoding, errors=_get_errors(self.encoding)
+        )
+
+    def __iter__(self):
+        return iter(self._file)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def readlines(self):
+        """
+        Read every remaining line.
+
+        Returns
+        -------
+        list of str
+            Lines, ending with "\\n" except maybe the last one.
+        """
+
+        return self._file.readlines()
+
+    @property
+    def text_format(self):
+        """TextFormat: Format of the file, with the line ending read so far."""
+        return TextFormat(self.encoding, self.bom, _get_newline(self._file.newlines))
+
+    def close(self):
+        """Close the file."""
+        self._file.close()
+
+
+def read_lines(path):
+    """
+    Read the lines of a text file and its format.
+
+    Parameters
+    ----------
+    path : str
+        Path of the file.
+
+    Returns
+    -------
+    tuple
+        `(lines, text_format)`, where `lines` end with "\\n" (except maybe
+        the last one) and `text_format` is the `TextFormat` to write the
+        file back with. Files with mixed line endings are written back with
+        CRLF when they have any.
+    """
+
+    with TextReader(path) as reader:
+        lines = reader.readlines()
+        return lines, reader.text_format
+
+
+def iter_lines(path):
+    """
+    Iterate over the lines of a text file, without reading it all at once.
+
+    Parameters
+    ----------
+    path : str
+        Path of the file.
+
+    Yields
+    ------
+    str
+        Lines, ending with "\\n" except maybe the last one.
+    """
+
+    with TextReader(path) as reader:
+        yield from reader
+
+
+def write_lines(path, lines, text_format=None):
+    """
+    Write lines to a text file atomically, in a given format.
+
+    Parameters
+    ----------
+    path : str
+        Path of the file.
+    lines : list of str
+        Lines ending with "\\n", translated to the newline of the format.
+    text_format : TextFormat or None, optional
+        Encoding, BOM and line ending to write, usually from `read_lines`.
+        If None, uses `DEFAULT_FORMAT`.
+    """
+
+    if text_format is None:
+        text_format = DEFAULT_FORMAT
+    text = "".join(lines)
+    if text_format.newline != "\n":
+        text = text.replace("\n", text_format.newline)
+    data = text.encode(text_format.encoding, _get_errors(text_format.encoding))
+    if text_format.bom:
+        data = "\ufeff".encode(text_format.encoding) + data
+    atomic_write(path, data)
@@ -0,0 +1,87 @@
+import os
+import re
+
+_CANONICALIZE_RE = re.compile(r"[-_.]+")
+
+
+def canonicalize_name(name):
+    """
+    Normalize a package name following PEP 503.
+
+    Runs of `-`, `_` and `.` are collapsed into a single `-` and the result is
+    lowercased, so `Foo.Bar`, `foo_bar` and `FOO-bar` share one key.
+
+    Parameters
+    ----------
+    name : str
+        Package name as written in a requirements file or in metadata.
+
+    Returns
+    -------
+    str
+        Canonical package name.
+    """
+
+    return _CANONICALIZE_RE.sub("-", name).lower()
+
+
+def _create_temp_file(directory, name):
+    # unlike tempfile.mkstemp, which creates private files, the kernel
+    # applies the umask to the mode of the new file
+    flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0)
+    while True:
+        tmp_path = os.path.join(directory, f".{name}.{os.urandom(4).hex()}.tmp")
+        try:
+            return os.open(tmp_path, flags, 0o666), tmp_path
+        except FileExistsError:
+            continue
+
+
+def atomic_write(path, data, encoding=None, newline=None):
+    """
+    Write a file atomically.
+
+    The data is written to a temporary file in the same directory, which
+    then replaces `path` with a single rename, so concurrent readers see
+    either the old or the new content, never a partially written file.
+
+    Parameters
+    ----------
+    path : str
+        Path of the file to write.
+    data : str or bytes
+        Content of the file. Bytes are written as is.
+    encoding : str or None, optional
+        Encoding of text data, see `open`.
+    newline : str or None, optional
+        Newline translation of text data, see `open`.
+
+    Notes
+    -----
+    - An existing file keeps its permission bits. New files get the default
+      permissions of the process umask.
+    """
+
+    directory = os.path.dirname(os.path.abspath(path))
+    try:
+        mode = os.stat(path).st_mode & 0o7777
+    except OSError:
+        mode = None
+
+    fd, tmp_path = _create_temp_file(directory, os.path.basename(path))
+    try:
+        if isinstance(data, bytes):
+            f = os.fdopen(fd, "wb")
+        else:
+            f = os.fdopen(fd, "w", encoding=encoding, newline=newline)
+        with f:
+            f.write(data)
+        if mode is not None:
+            os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,529 @@
+"""Incremental re-pinning of requirements files.
+
+`watch_requirements` pins the requirements files once, then waits for
+changes of the files themselves and of the site-packages directories of the
+environment. Installing or removing a distribution adds or removes entries
+of a site-packages directory, which is all that needs to be watched: the
+environment snapshot then only re-reads the changed metadata. Events are
+debounced, so a bulk `pip install` causes a single rewrite, and only the
+lines of the packages whose installed version changed, or of the lines that
+were edited, are pinned again.
+
+Events come from inotify on Linux, through `ctypes`, and from polling the
+size and mtime of the watched directories and files elsewhere.
+"""
+
+import os
+import select
+import struct
+import sys
+import time
+
+from pru.core import PruSession
+from pru.snapshot import get_environment_paths
+from pru.utils import canonicalize_name
+
+# from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_IGNORED = 0x00008000
+
+# entries added or removed, e.g. `*.dist-info` directories
+_DIRECTORY_MASK = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO
+# files written in place, or replaced atomically by editors
+_FILE_MASK = _DIRECTORY_MASK | IN_CLOSE_WRITE | IN_MODIFY | IN_ATTRIB
+
+_EVENT_HEADER = struct.Struct("iIII")
+
+# seconds between checks of the stop event while idle
+_IDLE_INTERVAL = 0.5
+
+
+class InotifyWatcher:
+    """
+    Watch directories and files with inotify.
+
+    Files are watched through their parent directory, so files replaced by
+    a rename are still followed.
+
+    Raises
+    ------
+    OSError
+        If inotify is not available.
+    """
+
+    def __init__(self):
+        # imported here, so importing pru does not load ctypes
+        import ctypes
+        import ctypes.util
+
+        self._ctypes = ctypes
+        libc_name = ctypes.util.find_library("c")
+        if not sys.platform.startswith("linux") or libc_name is None:
+            raise OSError("inotify is not available")
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        self._masks = {}
+        self._descriptors = {}
+        self.directories = set()
+        self.files = set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Release the inotify file descriptor."""
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+    def _watch(self, directory, mask):
+        mask |= self._masks.get(directory, 0)
+        if self._masks.get(directory) == mask:
+            return
+        descriptor = self._libc.inotify_add_watch(
+            self._fd, os.fsencode(directory), mask
+        )
+        if descriptor < 0:
+            errno = self._ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), directory)
+        self._masks[directory] = mask
+        self._descriptors[descriptor] = directory
+
+    def add_directory(self, directory):
+        """
+        Watch entries added to or removed from a directory.
+
+        Parameters
+        ----------
+        directory : str
+            Absolute path of the directory.
+        """
+
+        self._watch(directory, _DIRECTORY_MASK)
+        self.directories.add(directory)
+
+    def add_file(self, path):
+        """
+        Watch changes of a file.
+
+        Parameters
+        ----------
+        path : str
+            Absolute path of the file.
+        """
+
+        self._watch(os.path.dirname(path), _FILE_MASK)
+        self.files.add(path)
+
+    def wait(self, timeout):
+        """
+        Wait for changes.
+
+        Parameters
+        ----------
+        timeout : float
+            Maximum number of seconds to wait.
+
+        Returns
+        -------
+        set of str
+            Watched directories and files that changed, empty on timeout.
+        """
+
+        changes = set()
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        while readable:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            changes.update(self._parse_events(data))
+            readable, _, _ = select.select([self._fd], [], [], 0)
+        return changes
+
+    def _parse_events(self, data):
+        position = 0
+        while position < len(data):
+            descriptor, mask, _, length = _EVENT_HEADER.unpack_from(data, position)
+            position += _EVENT_HEADER.size
+            name = os.fsdecode(data[position : position + length].rstrip(b"\0"))
+            position += length
+            directory = self._descriptors.get(descriptor)
+            if directory is None:
+                continue
+            if mask & IN_IGNORED:
+                # the directory was removed
+                del self._descriptors[descriptor]
+                self._masks.pop(directory, None)
+                continue
+            if directory in self.directories and mask & _DIRECTORY_MASK:
+                yield directory
+            path = os.path.join(directory, name)
+            if path in self.files:
+                yield path
+
+
+class PollingWatcher:
+    """
+    Watch directories and files by polling their size and mtime.
+
+    Parameters
+    ----------
+    interval : float, optional
+        Seconds between two polls.
+    """
+
+    def __init__(self, interval=1.0):
+        self.interval = interval
+        self._stats = {}
+        self.directories = set()
+        self.files = set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Stop watching, nothing to release."""
+
+    @staticmethod
+    def _stat(path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return (stat.st_size, stat.st_mtime_ns)
+
+    def add_directory(self, directory):
+        """
+        Watch entries added to or removed from a directory.
+
+        Parameters
+        ----------
+        directory : str
+            Absolute path of the directory.
+        """
+
+        self._stats[directory] = self._stat(directory)
+        self.directories.add(directory)
+
+    def add_file(self, path):
+        """
+        Watch changes of a file.
+
+        Parameters
+        ----------
+        path : str
+            Absolute path of the file.
+        """
+
+        if path not in self.files:
+            self._stats[path] = self._stat(path)
+            self.files.add(path)
+
+    def wait(self, timeout):
+        """
+        Wait for changes.
+
+        Parameters
+        ----------
+        timeout : float
+            Maximum number of seconds to wait.
+
+        Returns
+        -------
+        set of str
+            Watched directories and files that changed, empty on timeout.
+        """
+
+        deadline = time.monotonic() + timeout
+        while True:
+            changes = set()
+            for path, previous in self._stats.items():
+                current = self._stat(path)
+                if current != previous:
+                    self._stats[path] = current
+                    changes.add(path)
+            remaining = deadline - time.monotonic()
+            if changes or remaining <= 0:
+                return changes
+            time.sleep(min(self.interval, remaining))
+
+
+def create_watcher(polling=False, interval=1.0):
+    """
+    Create the best available watcher.
+
+    Parameters
+    ----------
+    polling : bool, optional
+        If True, always poll.
+    interval : float, optional
+        Seconds between two polls of a `PollingWatcher`.
+
+    Returns
+    -------
+    InotifyWatcher or PollingWatcher
+        An inotify watcher on Linux, a polling watcher otherwise.
+    """
+
+    if not polling:
+        try:
+            return InotifyWatcher()
+        except OSError:
+            pass
+    return PollingWatcher(interval)
+
+
+def wait_for_changes(watcher, debounce=0.5, stop_event=None):
+    """
+    Wait for changes, until no more change happens for a while.
+
+    Parameters
+    ----------
+    watcher : InotifyWatcher or PollingWatcher
+        Watcher of the directories and files.
+    debounce : float, optional
+        Seconds without any change ending the wait, once a change happened.
+    stop_event : threading.Event or None, optional
+        Event stopping the wait when set.
+
+    Returns
+    -------
+    set of str or None
+        Changed directories and files, or None if `stop_event` was set.
+    """
+
+    changes = set()
+    while not changes:
+        if stop_event is not None and stop_event.is_set():
+            return None
+        changes = watcher.wait(_IDLE_INTERVAL)
+    while True:
+        more = watcher.wait(debounce)
+        if not more:
+            return changes
+        changes |= more
+
+
+def get_changed_packages(previous, current):
+    """
+    Compare two installed packages indexes.
+
+    Parameters
+    ----------
+    previous, current : dict
+        Installed packages indexes as returned by
+        `get_installed_packages_index`.
+
+    Returns
+    -------
+    set of str
+        Canonical names of the packages installed, removed, or installed
+        with another version.
+    """
+
+    return {
+        key
+        for key in previous.keys() | current.keys()
+        if getattr(previous.get(key), "version", None)
+        != getattr(current.get(key), "version", None)
+    }
+
+
+def get_edited_packages(previous, current):
+    """
+    Get the packages of the edited lines of requirements files.
+
+    Parameters
+    ----------
+    previous : dict
+        Dictionary of {path: lines} of the files before the edit.
+    current : dict
+        Dictionary of {path: RequirementsFile} of the files after the edit.
+
+    Returns
+    -------
+    set of str
+        Canonical names of the requirements whose lines are new.
+    """
+
+    names = set()
+    for path, requirements_file in current.items():
+        lines = set(previous.get(path, ()))
+        for requirement in requirements_file.requirements:
+            start, end = requirement.span
+            if requirement.name is not None and not lines.issuperset(
+                requirements_file.lines[start:end]
+            ):
+                names.add(canonicalize_name(requirement.name))
+    return names
+
+
+def get_site_packages_dirs(paths):
+    """
+    Get the directories holding installed distributions.
+
+    Parameters
+    ----------
+    paths : iterable of str
+        Directories scanned for installed packages, e.g. `sys.path`.
+
+    Returns
+    -------
+    list of str
+        Absolute paths of the directories holding at least one
+        `*.dist-info` or `*.egg-info` entry, so source directories on
+        `sys.path` are not watched.
+    """
+
+    directories = []
+    for path in paths:
+        try:
+            with os.scandir(path) as entries:
+                if any(
+                    entry.name.endswith((".dist-info", ".egg-info"))
+                    for entry in entries
+                ):
+                    directories.append(os.path.abspath(path))
+        except OSError:
+            continue
+    return directories
+
+
+def _watch_files(watcher, files):
+    for path in files:
+        watcher.add_file(os.path.abspath(path))
+
+
+class _Repinner:
+    # last seen lines and index, to find what changed since the last pinning
+
+    def __init__(self, session, requirements_path, recursive):
+        self.session = session
+        self.requirements_path = requirements_path
+        self.recursive = recursive
+        self.files = self.load_files()
+        self.lines = {path: f.lines for path, f in self.files.items()}
+        self.index = session.index
+
+    def load_files(self):
+        return self.session.load_requirements_files(
+            self.requirements_path, self.recursive
+        )
+
+    def get_affected_packages(self, watcher, changes):
+        packages = set()
+        if not changes.isdisjoint(watcher.directories):
+            self.session.invalidate()
+            packages |= get_changed_packages(self.index, self.session.index)
+            self.index = self.session.index
+        if not changes.isdisjoint(watcher.files):
+            self.session.invalidate_files(
+                path for path in self.lines if os.path.abspath(path) in changes
+            )
+            self.files = self.load_files()
+            packages |= get_edited_packages(self.lines, self.files)
+            self.lines = {path: f.lines for path, f in self.files.items()}
+            # includes may have changed
+            _watch_files(watcher, self.files)
+        return packages
+
+    def repin(self, packages):
+        plans = self.session.plan_requirements_versions(
+            self.requirements_path, recursive=self.recursive, packages=packages
+        )
+        report = self.session.write_requirements_plans(plans)
+        # written lines are already pinned, so the events of the writes find
+        # no edited line
+        for plan in plans:
+            if plan.path in self.lines:
+                self.lines[plan.path] = plan.lines
+        return report if any(plan.pending for plan in plans) else None
+
+
+def watch_requirements(
+    requirements_path=None,
+    recursive=False,
+    debounce=0.5,
+    paths=None,
+    polling=False,
+    interval=1.0,
+    callback=None,
+    stop_event=None,
+    snapshot_path=None,
+):
+    """
+    Pin requirements files, then pin them again whenever something changes.
+
+    Parameters
+    ----------
+    requirements_path : str, list of str, or None, optional
+        Path to the requirements file, a glob pattern, or a list of them. If
+        None, defaults to "requirements.txt".
+    recursive : bool, optional
+        If True, also pin and watch every file included with `-r` or `-c`.
+    debounce : float, optional
+        Seconds without any change before pinning, so that the many changes
+        of a bulk install cause a single rewrite.
+    paths : list of str or None, optional
+        Site-packages directories to watch. If None, uses
+        `pru.snapshot.get_environment_paths()`.
+    polling : bool, optional
+        If True, poll instead of using inotify.
+    interval : float, optional
+        Seconds between two polls when polling.
+    callback : callable or None, optional
+        Called with the `{path: number_of_changed_pins}` report of the first
+        pinning, and of every pinning writing at least one file.
+    stop_event : threading.Event or None, optional
+        Event stopping the watch when set. If None, watches forever.
+    snapshot_path : str, dict or None, optional
+        Snapshot file of the watched directories, see
+        `pru.core.get_installed_packages_index`.
+
+    Notes
+    -----
+    - Only the lines of packages whose installed version changed, and the
+      edited lines, are pinned again. Lines of removed packages are kept.
+    - Files written by the watch are seen as edited, but their lines are
+      already pinned, so they are not written again.
+    """
+
+    if paths is None:
+        paths = get_environment_paths()
+    session = PruSession(paths=paths, snapshot_path=snapshot_path)
+    with create_watcher(polling, interval) as watcher:
+        # watched first, so no change is missed while pinning
+        for directory in get_site_packages_dirs(paths):
+            watcher.add_directory(directory)
+        report = session.replace_requirements_packages_versions(
+            requirements_path, recursive=recursive
+        )
+        repinner = _Repinner(session, requirements_path, recursive)
+        _watch_files(watcher, repinner.files)
+        if callback is not None:
+            callback(report)
+
+        while True:
+            changes = wait_for_changes(watcher, debounce, stop_event)
+            if changes is None:
+                return
+            packages = repinner.get_affected_packages(watcher, changes)
+            report = repinner.repin(packages) if packages else None
+            if report is not None and callback is not None:
+                callback(report)
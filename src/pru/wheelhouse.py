@@ -0,0 +1,211 @@
+"""Content-addressed local wheelhouse.
+
+Before an upgrade, the distributions of every package can be downloaded
+concurrently with `pip download`, one process per package, into a wheelhouse
+shared by all runs and environments. The installer then runs offline with
+`--no-index --find-links`, so repeated upgrades of the same set of packages
+are bounded by local disk speed instead of the network.
+
+Layout of a wheelhouse directory:
+
+- `objects/sha256/<2 hex>/<sha256>`: one file per distinct content.
+- `files/<filename>`: hard links (or copies) of the objects under their
+  distribution file names, used as the `--find-links` directory.
+- `tmp/`: download directories of running prefetches.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+from subprocess import CalledProcessError
+
+from pru.cache import get_cache_dir
+from pru.core import run_subprocesses
+from pru.hashes import hash_file
+
+
+def get_wheelhouse_dir(wheelhouse=None):
+    """
+    Get the wheelhouse directory.
+
+    Parameters
+    ----------
+    wheelhouse : str or None, optional
+        Wheelhouse directory. If None, uses the `PRU_WHEELHOUSE` environment
+        variable, or `get_cache_dir("wheelhouse")`, shared by every
+        environment of the user.
+
+    Returns
+    -------
+    str
+        Absolute path of the wheelhouse. The directory is not created.
+    """
+
+    if wheelhouse is None:
+        wheelhouse = os.environ.get("PRU_WHEELHOUSE") or get_cache_dir("wheelhouse")
+    return os.path.abspath(wheelhouse)
+
+
+def get_find_links_dir(wheelhouse=None):
+    """
+    Get the `--find-links` directory of a wheelhouse.
+
+    Parameters
+    ----------
+    wheelhouse : str or None, optional
+        Wheelhouse directory, see `get_wheelhouse_dir`.
+
+    Returns
+    -------
+    str
+        Path of the directory holding the distribution files by name.
+    """
+
+    return os.path.join(get_wheelhouse_dir(wheelhouse), "files")
+
+
+def _link_or_copy(source, destination):
+    # link under a temporary name first, so the file appears atomically
+    tmp_path = f"{destination}.{os.getpid()}.tmp"
+    try:
+        os.link(source, tmp_path)
+    except OSError:
+        shutil.copyfile(source, tmp_path)
+    os.replace(tmp_path, destination)
+
+
+def add_to_wheelhouse(path, wheelhouse=None):
+    """
+    Move a distribution file into a wheelhouse.
+
+    Parameters
+    ----------
+    path : str
+        Path of the downloaded distribution file. The file is moved.
+    wheelhouse : str or None, optional
+        Wheelhouse directory, see `get_wheelhouse_dir`.
+
+    Returns
+    -------
+    str
+        sha256 digest of the file content.
+    """
+
+    wheelhouse = get_wheelhouse_dir(wheelhouse)
+    digest = hash_file(path)
+    object_dir = os.path.join(wheelhouse, "objects", "sha256", digest[:2])
+    object_path = os.path.join(object_dir, digest)
+    os.makedirs(object_dir, exist_ok=True)
+    if os.path.exists(object_path):
+        os.remove(path)
+    else:
+        os.replace(path, object_path)
+
+    files_dir = get_find_links_dir(wheelhouse)
+    os.makedirs(files_dir, exist_ok=True)
+    file_path = os.path.join(files_dir, os.path.basename(path))
+    try:
+        same = os.path.samefile(file_path, object_path)
+    except OSError:
+        same = False
+    if not same:
+        _link_or_copy(object_path, file_path)
+    return digest
+
+
+def prefetch_wheels(
+    names,
+    wheelhouse=None,
+    max_workers=None,
+    download_args=(),
+    timeout=None,
+    log_path=None,
+):
+    """
+    Download distributions of packages and their dependencies concurrently.
+
+    Parameters
+    ----------
+    names : list of str
+        Package names, with optional extras, e.g. `["requests[socks]"]`.
+    wheelhouse : str or None, optional
+        Wheelhouse directory, see `get_wheelhouse_dir`.
+    max_workers : int or None, optional
+        Maximum number of concurrent downloads. If None, uses the number of
+        CPUs.
+    download_args : sequence of str, optional
+        Extra `pip download` arguments, e.g. `["--index-url", url]` or
+        `["--no-index", "--find-links", directory]`.
+    timeout : float or None, optional
+        Seconds to wait for each download before killing it.
+    log_path : str or None, optional
+        Path to a JSON lines file receiving the download output events, see
+        `run_subprocesses`.
+
+    Returns
+    -------
+    dict
+        Dictionary of {filename: sha256} of the downloaded files.
+
+    Raises
+    ------
+    subprocess.CalledProcessError
+        If a download failed. Files of successful downloads are kept.
+    subprocess.TimeoutExpired
+        If a download did not finish within `timeout`.
+
+    Notes
+    -----
+    - Downloads run with `python -m pip download` of the running interpreter,
+      whatever the installer backend, so wheels match this environment.
+    - Files already in the wheelhouse are offered to pip with
+      `--find-links`, so they are not downloaded again.
+    """
+
+    wheelhouse = get_wheelhouse_dir(wheelhouse)
+    files_dir = get_find_links_dir(wheelhouse)
+    tmp_dir = os.path.join(wheelhouse, "tmp")
+    os.makedirs(files_dir, exist_ok=True)
+    os.makedirs(tmp_dir, exist_ok=True)
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+
+    destinations = [tempfile.mkdtemp(dir=tmp_dir) for _ in names]
+    try:
+        commands = [
+            [
+                sys.executable,
+                "-m",
+                "pip",
+                "download",
+                "--quiet",
+                "--disable-pip-version-check",
+                "--dest",
+                destination,
+                "--find-links",
+                files_dir,
+                *download_args,
+                name,
+            ]
+            for name, destination in zip(names, destinations)
+        ]
+        results = run_subprocesses(
+            commands, max_workers=max_workers, timeout=timeout, log_path=log_path
+        )
+
+        digests = {}
+        for destination in destinations:
+            for filename in sorted(os.listdir(destination)):
+                path = os.path.join(destination, filename)
+                digests[filename] = add_to_wheelhouse(path, wheelhouse)
+    finally:
+        for destination in destinations:
+            shutil.rmtree(destination, ignore_errors=True)
+
+    for command, result in zip(commands, results):
+        if isinstance(result, BaseException):
+            raise result
+        if result != 0:
+            raise CalledProcessError(result, command)
+    return digests